@@ -31,6 +31,9 @@ ADMIN_ROLE_NAME = None
 SERVICE_ADMIN_ROLE_ID = None
 SERVICE_ADMIN_ROLE_NAME = None
 SHOULD_HASH_PASSWORD = None
+#Number of passwords hashed or verified at once, off the eventlet hub.
+#0 hashes them inline.
+HASH_PASSWORD_CONCURRENCY = 4
 
 
 def configure_backends(options):
@@ -52,3 +55,7 @@ def configure_backends(options):
     if "hash-password" in options\
         and ast.literal_eval(options["hash-password"]) == True:
         SHOULD_HASH_PASSWORD = options["hash-password"]
+
+    global HASH_PASSWORD_CONCURRENCY
+    if "hash-password-concurrency" in options:
+        HASH_PASSWORD_CONCURRENCY = int(options["hash-password-concurrency"])
@@ -18,6 +18,8 @@
 
 # pylint: disable=W0603, R0921
 
+from keystone.models import Role
+
 
 #Base APIs
 class BaseUserAPI(object):
@@ -45,6 +47,14 @@ class BaseUserAPI(object):
     def get_page_markers(self, marker, limit):
         raise NotImplementedError
 
+    def get_page_with_markers(self, marker, limit):
+        """ Returns (page, prev, next): a page and the markers of the pages
+        around it. Backends that can get them together should override
+        this and the other *_with_markers methods.
+        """
+        (prev, next) = self.get_page_markers(marker, limit)
+        return (self.get_page(marker, limit), prev, next)
+
     def user_roles_by_tenant(self, user_id, tenant_id):
         raise NotImplementedError
 
@@ -78,6 +88,10 @@ class BaseUserAPI(object):
     def users_get_page_markers(self, marker, limit):
         raise NotImplementedError
 
+    def users_get_page_with_markers(self, marker, limit):
+        (prev, next) = self.users_get_page_markers(marker, limit)
+        return (self.users_get_page(marker, limit), prev, next)
+
     def users_get_by_tenant_get_page(self, tenant_id, role_id, marker, limit):
         raise NotImplementedError
 
@@ -85,6 +99,13 @@ class BaseUserAPI(object):
         role_id, marker, limit):
         raise NotImplementedError
 
+    def users_get_by_tenant_get_page_with_markers(self, tenant_id, role_id,
+            marker, limit):
+        (prev, next) = self.users_get_by_tenant_get_page_markers(tenant_id,
+            role_id, marker, limit)
+        return (self.users_get_by_tenant_get_page(tenant_id, role_id, marker,
+            limit), prev, next)
+
     def check_password(self, user, password):
         raise NotImplementedError
 
@@ -111,6 +132,116 @@ class BaseTokenAPI(object):
     def get_all(self):
         raise NotImplementedError
 
+    def get_all_for_user(self, user_id):
+        """ Returns all of a user's tokens, scoped or not """
+        raise NotImplementedError
+
+    def delete_all_for_user(self, user_id):
+        """ Deletes all of a user's tokens
+
+        Returns the ids of the tokens deleted.
+        """
+        raise NotImplementedError
+
+    def delete_expired(self, limit=None):
+        """ Deletes up to limit tokens that have expired
+
+        Returns the number of tokens deleted.
+        """
+        raise NotImplementedError
+
+    def get_validation_info(self, id):
+        """ Returns everything needed to validate a token
+
+        Returns a (token, user, tenant, user_tenant, roles) tuple where
+        tenant is the tenant the token is scoped to, user_tenant is the
+        user's default tenant and roles is the list of Role models (with
+        tenant_id set for tenant roles) granted to the user globally and on
+        the token's tenant. Tenant roles are listed before global roles.
+
+        Returns None if the token or its user does not exist.
+
+        This default implementation is assembled from the other backends;
+        backends that can fetch it all in one go should override it.
+        """
+        token = self.get(id)
+        if not token:
+            return None
+        user = USER.get(token.user_id)
+        if not user:
+            return None
+
+        tenant = None
+        if token.tenant_id:
+            tenant = TENANT.get(token.tenant_id)
+        user_tenant = None
+        if user.tenant_id:
+            user_tenant = TENANT.get(user.tenant_id)
+
+        refs = []
+        if token.tenant_id:
+            refs.extend(ROLE.ref_get_all_tenant_roles(user.id,
+                token.tenant_id))
+        refs.extend(ROLE.ref_get_all_global_roles(user.id))
+        roles = []
+        for ref in refs:
+            role = ROLE.get(ref.role_id)
+            roles.append(Role(id=ref.role_id, name=role.name,
+                description=role.desc, tenant_id=ref.tenant_id))
+
+        return (token, user, tenant, user_tenant, roles)
+
+    def get_validation_info_multi(self, ids):
+        """ Returns everything needed to validate several tokens
+
+        Returns a dict mapping the ids of the tokens found (whose users
+        exist) to tuples as returned by get_validation_info.
+
+        This default implementation calls get_validation_info for each
+        token; backends that can fetch them together should override it.
+        """
+        infos = {}
+        for id in set(ids):
+            info = self.get_validation_info(id)
+            if info:
+                infos[id] = info
+        return infos
+
+
+class BaseRevocationAPI(object):
+    """ Append-only record of revocations, which services poll to evict
+    what they cached about revoked tokens, users and tenants """
+
+    def __init__(self, *args, **kw):
+        pass
+
+    def create(self, values):
+        """ Records a revocation of a token (token_id), of everything of a
+        user (user_id) or of everything scoped to a tenant (tenant_id)
+
+        Returns it, with its id: a sequence number greater than that of
+        every revocation recorded before.
+        """
+        raise NotImplementedError
+
+    def get_since(self, since, limit=None):
+        """ Returns up to limit revocations with an id greater than since,
+        in order """
+        raise NotImplementedError
+
+    def get_first_id(self):
+        """ Returns the id of the oldest revocation still recorded, or None
+        if there are none """
+        raise NotImplementedError
+
+    def delete_before(self, created, limit=None):
+        """ Deletes up to limit revocations recorded before created, always
+        keeping the latest one (so that ids are never reused)
+
+        Returns the number of revocations deleted.
+        """
+        raise NotImplementedError
+
 
 class BaseTenantAPI(object):
     def __init__(self, *args, **kw):
@@ -134,12 +265,22 @@ class BaseTenantAPI(object):
     def tenants_for_user_get_page_markers(self, user, marker, limit):
         raise NotImplementedError
 
+    def tenants_for_user_get_page_with_markers(self, user, marker, limit):
+        (prev, next) = self.tenants_for_user_get_page_markers(user, marker,
+            limit)
+        return (self.tenants_for_user_get_page(user, marker, limit), prev,
+            next)
+
     def get_page(self, marker, limit):
         raise NotImplementedError
 
     def get_page_markers(self, marker, limit):
         raise NotImplementedError
 
+    def get_page_with_markers(self, marker, limit):
+        (prev, next) = self.get_page_markers(marker, limit)
+        return (self.get_page(marker, limit), prev, next)
+
     def is_empty(self, id):
         raise NotImplementedError
 
@@ -205,6 +346,16 @@ class BaseRoleAPI(object):
     def ref_get_page_markers(self, user_id, tenant_id, marker, limit):
         raise NotImplementedError
 
+    def get_page_with_markers(self, marker, limit):
+        (prev, next) = self.get_page_markers(marker, limit)
+        return (self.get_page(marker, limit), prev, next)
+
+    def ref_get_page_with_markers(self, marker, limit, user_id, tenant_id):
+        (prev, next) = self.ref_get_page_markers(user_id, tenant_id, marker,
+            limit)
+        return (self.ref_get_page(marker, limit, user_id, tenant_id), prev,
+            next)
+
     def ref_get_by_user(self, user_id, role_id, tenant_id):
         raise NotImplementedError
 
@@ -243,6 +394,17 @@ class BaseEndpointTemplateAPI(object):
     def get_by_service_get_page_markers(self, service_id, marker, limit):
         raise NotImplementedError
 
+    def get_page_with_markers(self, marker, limit):
+        (prev, next) = self.get_page_markers(marker, limit)
+        return (self.get_page(marker, limit), prev, next)
+
+    def get_by_service_get_page_with_markers(self, service_id, marker,
+            limit):
+        (prev, next) = self.get_by_service_get_page_markers(service_id,
+            marker, limit)
+        return (self.get_by_service_get_page(service_id, marker, limit),
+            prev, next)
+
     def endpoint_get_by_tenant_get_page(self, tenant_id, marker, limit):
         raise NotImplementedError
 
@@ -250,6 +412,13 @@ class BaseEndpointTemplateAPI(object):
             limit):
         raise NotImplementedError
 
+    def endpoint_get_by_tenant_get_page_with_markers(self, tenant_id, marker,
+            limit):
+        (prev, next) = self.endpoint_get_by_tenant_get_page_markers(
+            tenant_id, marker, limit)
+        return (self.endpoint_get_by_tenant_get_page(tenant_id, marker,
+            limit), prev, next)
+
     def endpoint_get_by_endpoint_template(self, endpoint_template_id):
         raise NotImplementedError
 
@@ -291,6 +460,10 @@ class BaseServiceAPI(object):
     def get_page_markers(self, marker, limit):
         raise NotImplementedError
 
+    def get_page_with_markers(self, marker, limit):
+        (prev, next) = self.get_page_markers(marker, limit)
+        return (self.get_page(marker, limit), prev, next)
+
     def delete(self, id):
         raise NotImplementedError
 
@@ -318,6 +491,7 @@ ENDPOINT_TEMPLATE = BaseEndpointTemplateAPI()
 ROLE = BaseRoleAPI()
 TENANT = BaseTenantAPI()
 TOKEN = BaseTokenAPI()
+REVOCATION = BaseRevocationAPI()
 USER = BaseUserAPI()
 SERVICE = BaseServiceAPI()
 CREDENTIALS = BaseCredentialsAPI()
@@ -337,6 +511,9 @@ def set_value(variable_name, value):
     elif variable_name == 'token':
         global TOKEN
         TOKEN = value
+    elif variable_name == 'revocation':
+        global REVOCATION
+        REVOCATION = value
     elif variable_name == 'user':
         global USER
         USER = value
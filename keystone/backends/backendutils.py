@@ -1,9 +1,62 @@
+from eventlet import semaphore, tpool
+
 from keystone.backends import models
 import keystone.backends as backends
 # pylint: disable=E0611
 from passlib.hash import sha512_crypt as sc
 
 
+class HashPool(object):
+    """Runs password hashing in eventlet's pool of native threads
+
+    sha512_crypt takes thousands of rounds; run inline it would stall every
+    other greenthread. At most concurrency hashes run at once, the other
+    callers wait their turn. waiting is the number of callers currently
+    queued. A concurrency of 0 runs everything inline.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.waiting = 0
+        self.max_waiting = 0
+        self.executed = 0
+        if concurrency > 0:
+            self._semaphore = semaphore.Semaphore(concurrency)
+
+    def execute(self, func, *args):
+        self.executed += 1
+        if self.concurrency <= 0:
+            return func(*args)
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return tpool.execute(func, *args)
+        finally:
+            self._semaphore.release()
+
+    def stats(self):
+        """Returns a dict of counters, handy for logging and tests"""
+        return {'concurrency': self.concurrency, 'waiting': self.waiting,
+                'max_waiting': self.max_waiting, 'executed': self.executed}
+
+
+_HASH_POOL = None
+
+
+def get_hash_pool():
+    """Returns the HashPool sized by the hash-password-concurrency option"""
+    global _HASH_POOL  # pylint: disable=W0603
+    if _HASH_POOL is None or \
+            _HASH_POOL.concurrency != backends.HASH_PASSWORD_CONCURRENCY:
+        _HASH_POOL = HashPool(backends.HASH_PASSWORD_CONCURRENCY)
+    return _HASH_POOL
+
+
 def __get_hashed_password(password):
     if password != None and len(password) > 0:
         return __make_password(password)
@@ -29,7 +82,7 @@ def check_password(raw_password, enc_password):
     if not raw_password:
         return False
     if backends.SHOULD_HASH_PASSWORD:
-        return sc.verify(raw_password, enc_password)
+        return get_hash_pool().execute(sc.verify, raw_password, enc_password)
     else:
         return enc_password == raw_password
 
@@ -47,4 +100,4 @@ def __make_password(raw_password):
 #Refer http://packages.python.org/passlib/lib/passlib.hash.sha512_crypt.html
 #Using the default properties as of now.Salt gets generated automatically.
 def __get_hexdigest(raw_password):
-    return sc.encrypt(raw_password)
+    return get_hash_pool().execute(sc.encrypt, raw_password)
@@ -1,6 +1,9 @@
 import ldap
 import logging
 
+from keystone.common import cache
+from keystone.common import config
+from keystone.common import pool
 from .. import fakeldap
 from .tenant import TenantAPI
 from .user import UserAPI
@@ -8,6 +11,18 @@ from .role import RoleAPI
 
 LOG = logging.getLogger('keystone.backends.ldap.api')
 
+try:
+    from ldap.controls import SimplePagedResultsControl
+    from ldap.controls.sss import SSSRequestControl
+except ImportError:
+    # python-ldap before 2.4 has no server side sorting control
+    SimplePagedResultsControl = SSSRequestControl = None
+
+# Open paged searches kept to carry on from, and for how many seconds. With
+# a pool, they hold at most half of its connections.
+PAGE_CURSORS = 100
+PAGE_CURSOR_TTL = 60
+
 
 def py2ldap(val):
     if isinstance(val, str):
@@ -86,6 +101,96 @@ class LDAPWrapper(object):
         LOG.debug("LDAP delete: dn=%s", dn)
         return self.conn.delete_s(dn)
 
+    def unbind_s(self):
+        LOG.debug("LDAP unbind")
+        return self.conn.unbind_s()
+
+    def paged_search(self, dn, scope, query, sort_attr, page_size):
+        """Yields the results of a search sorted case-sensitively by
+        sort_attr, asking the server for page_size of them at a time
+        (RFC 2891 and RFC 2696)"""
+        if SSSRequestControl is None:
+            raise NotImplementedError("python-ldap can't sort results")
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("LDAP paged search: dn=%s, scope=%s, query=%s, "
+                      "sort=%s, size=%s", dn, fakeldap.scope_names[scope],
+                      query, sort_attr, page_size)
+        # the attribute's own ordering (caseIgnoreOrderingMatch for cn and
+        # uid) would not be the order in which Python compares the ids
+        sort = SSSRequestControl(criticality=True, ordering_rules=[
+                                 '%s:caseExactOrderingMatch' % sort_attr])
+        paging = SimplePagedResultsControl(True, size=page_size, cookie='')
+        while True:
+            msgid = self.conn.search_ext(dn, scope, query,
+                                         serverctrls=[sort, paging])
+            (_type, res, _msgid, ctrls) = self.conn.result3(msgid)
+            for (res_dn, attrs) in res:
+                yield (res_dn, dict([(typ, map(ldap2py, values))
+                                     for typ, values in attrs.iteritems()]))
+            cookies = [ctrl.cookie for ctrl in ctrls if ctrl.controlType ==
+                       SimplePagedResultsControl.controlType]
+            if not cookies or not cookies[0]:
+                return
+            paging.cookie = cookies[0]
+
+
+class LDAPConnectionPool(pool.ConnectionPool):
+    """A bounded pool of bound LDAP connections (see
+    keystone.common.pool.ConnectionPool)
+
+    Idle connections are checked with a root DSE search, and dropped along
+    with the others if the server went away.
+    """
+
+    server_down_errors = (ldap.SERVER_DOWN,)
+
+    def is_healthy(self, conn):
+        try:
+            conn.search_s('', ldap.SCOPE_BASE, '(objectClass=*)')
+        except (ldap.SERVER_DOWN, ldap.TIMEOUT):
+            return False
+        except ldap.LDAPError:
+            # the server answered, even if it will not show its root DSE
+            pass
+        return True
+
+    def close_connection(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    def timed_out(self):
+        return ldap.TIMEOUT("No LDAP connection free after %s seconds" %
+                            (self.timeout,))
+
+
+class PooledConnection(object):
+    """Looks like a single LDAP connection, but runs every operation on a
+    connection from the pool, so callers never hold one between calls"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def simple_bind_s(self, user, password):
+        # pooled connections are bound when they are opened
+        pass
+
+    def add_s(self, dn, attrs):
+        return self.pool.call('add_s', dn, attrs)
+
+    def search_s(self, dn, scope, query):
+        return self.pool.call('search_s', dn, scope, query)
+
+    def modify_s(self, dn, modlist):
+        return self.pool.call('modify_s', dn, modlist)
+
+    def delete_s(self, dn):
+        return self.pool.call('delete_s', dn)
+
+    def unbind_s(self):
+        pass
+
 
 class API(object):
     apis = ['tenant', 'user', 'role']
@@ -98,7 +203,29 @@ class API(object):
         self.user = UserAPI(self, options)
         self.role = RoleAPI(self, options)
 
-    def get_connection(self, user=None, password=None):
+        self.pool = None
+        pool_size = config.get_option(options, 'ldap_pool_size', type='int',
+                                      default=10)
+        if pool_size > 0:
+            self.pool = LDAPConnectionPool(self._connect, size=pool_size,
+                max_lifetime=config.get_option(options,
+                    'ldap_pool_max_lifetime', type='int', default=600),
+                check_interval=config.get_option(options,
+                    'ldap_pool_check_interval', type='int', default=30),
+                timeout=config.get_option(options, 'ldap_pool_timeout',
+                    type='int', default=30))
+
+        self.paged_search = config.get_option(options, 'ldap_paged_search',
+                                              type='bool', default=True)
+        max_cursors = PAGE_CURSORS
+        if self.pool is not None:
+            max_cursors = min(max_cursors, self.pool.size // 2)
+        self.cursors = cache.LRUCache(maxsize=max_cursors,
+                                      ttl=PAGE_CURSOR_TTL,
+                                      on_evict=lambda _key, cursor:
+                                      cursor.close())
+
+    def _connect(self, user=None, password=None):
         if self.LDAP_URL.startswith('fake://'):
             conn = fakeldap.initialize(self.LDAP_URL)
         else:
@@ -109,3 +236,33 @@ class API(object):
             password = self.LDAP_PASSWORD
         conn.simple_bind_s(user, password)
         return conn
+
+    def get_connection(self, user=None, password=None):
+        """Returns a connection bound as user, or as the configured
+        ldap_user. The latter are served from the pool, if there is one"""
+        if self.pool is None or user is not None or password is not None:
+            return self._connect(user, password)
+        return PooledConnection(self.pool)
+
+    def checkout_connection(self):
+        """Returns (connection, release) for a connection bound as the
+        configured ldap_user and held across calls, taken from the pool if
+        there is one. release(reusable) gives it back; pass False if it
+        was left in the middle of something, such as a paged search."""
+        if self.pool is None:
+            conn = self._connect()
+
+            def release(_reusable):
+                try:
+                    conn.unbind_s()
+                except ldap.LDAPError:
+                    pass
+            return (conn, release)
+        item = self.pool.get()
+        return (item[0], lambda reusable: self.pool.put(item,
+                                                        broken=not reusable))
+
+    def get_pool_stats(self):
+        """Returns the connection pool's counters, or None if not pooled"""
+        if self.pool is not None:
+            return self.pool.stats()
@@ -2,6 +2,8 @@ import ast
 import ldap
 from itertools import izip, count
 
+from keystone.common import paging
+
 
 def _get_redirect(cls, method):
     # pylint: disable=W0613
@@ -119,10 +121,69 @@ class BaseLdapAPI(object):
         return map(self._ldap_res_to_model, self._ldap_get_all(filter))
 
     def get_page(self, marker, limit):
-        return self._get_page(marker, limit, self.get_all())
+        return self.get_page_with_markers(marker, limit)[0]
 
     def get_page_markers(self, marker, limit):
-        return self._get_page_markers(marker, limit, self.get_all())
+        return self.get_page_with_markers(marker, limit)[1:]
+
+    def get_page_with_markers(self, marker, limit):
+        """Returns (page, prev, next) from one search
+
+        Where the server can sort and page results, only a page worth of
+        entries is fetched at a time, and the search is kept open so that
+        the page after this one is read from where this one stopped.
+        """
+        if self.api.paged_search:
+            try:
+                return self._get_paged(marker, limit)
+            except (ldap.UNAVAILABLE_CRITICAL_EXTENSION,
+                    ldap.INAPPROPRIATE_MATCHING, NotImplementedError,
+                    paging.ResultsOutOfOrder):
+                # the server rejected the sorting or paging control, or
+                # does not sort like Python compares ids, or python-ldap
+                # has no controls; anything else (the server going
+                # away...) is raised and paging is tried again next time
+                self.api.paged_search = False
+        lst = self.get_all()
+        return (self._get_page(marker, limit, lst),) + \
+                self._get_page_markers(marker, limit, lst)
+
+    def _get_paged(self, marker, limit):
+        query = '(objectClass=%s)' % (self.object_class,)
+        key = (self.tree_dn, query, limit, marker)
+        # give back the connections of searches nobody carried on from
+        self.api.cursors.purge()
+        cursor = self.api.cursors.get(key)
+        if cursor is not None:
+            # nobody else may carry on from this cursor
+            self.api.cursors.delete(key)
+            try:
+                (page, prev, nxt) = cursor.page(marker)
+            except ldap.LDAPError:
+                # most likely the server dropped the search; start over
+                cursor.close()
+                cursor = None
+            except Exception:
+                cursor.close()
+                raise
+        if cursor is None:
+            (conn, release) = self.api.checkout_connection()
+            cursor = paging.PageCursor(conn.paged_search(self.tree_dn,
+                    ldap.SCOPE_ONELEVEL, query, self.id_attr, limit + 2),
+                self._dn_to_id, limit, release)
+            try:
+                (page, prev, nxt) = cursor.page(marker)
+            except ldap.NO_SUCH_OBJECT:
+                cursor.close()
+                return ([], None, None)
+            except Exception:
+                cursor.close()
+                raise
+        if nxt is None:
+            cursor.close()
+        else:
+            self.api.cursors.set(key[:-1] + (nxt,), cursor)
+        return ([self._ldap_res_to_model(res) for res in page], prev, nxt)
 
     # pylint: disable=W0141
     @staticmethod
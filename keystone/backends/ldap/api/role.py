@@ -1,13 +1,13 @@
 import ldap
 
-from keystone.backends.api import BaseTenantAPI
+from keystone.backends.api import BaseRoleAPI
 from keystone.common import exception
 
 from keystone import models
 from .base import  BaseLdapAPI
 
 
-class RoleAPI(BaseLdapAPI, BaseTenantAPI):
+class RoleAPI(BaseLdapAPI, BaseRoleAPI):
     DEFAULT_TREE_DN = 'ou=Groups,dc=example,dc=com'
     DEFAULT_STRUCTURAL_CLASSES = ['groupOfNames']
     options_name = 'role'
@@ -51,22 +51,88 @@ def _match_query(query, attrs):
     The characters &, |, and ! are supported in the query. No syntax checking
     is performed, so malformed querys will not work correctly.
     """
+    return _compile_query(query).match(attrs)
+
+
+# Compiled queries, by query string. Cleared once it holds more than
+# FILTER_CACHE_SIZE queries.
+FILTER_CACHE_SIZE = 1000
+_filters = {}
+
+
+def _compile_query(query):
+    """Returns the _Filter for query, parsing it only the first time."""
+    try:
+        return _filters[query]
+    except KeyError:
+        pass
+    if len(_filters) >= FILTER_CACHE_SIZE:
+        _filters.clear()
+    _filters[query] = _parse_query(query)
+    return _filters[query]
+
+
+def _parse_query(query):
     # cut off the parentheses
     inner = query[1:-1]
     if inner.startswith('&'):
         # cut off the &
         l, r = _paren_groups(inner[1:])
-        return _match_query(l, attrs) and _match_query(r, attrs)
+        return _Filter('&', _compile_query(l), _compile_query(r))
     if inner.startswith('|'):
         # cut off the |
         l, r = _paren_groups(inner[1:])
-        return _match_query(l, attrs) or _match_query(r, attrs)
+        return _Filter('|', _compile_query(l), _compile_query(r))
     if inner.startswith('!'):
         # cut off the ! and the nested parentheses
-        return not _match_query(query[2:-1], attrs)
+        return _Filter('!', _compile_query(query[2:-1]))
 
     (k, _sep, v) = inner.partition('=')
-    return _match(k, v, attrs)
+    return _Filter('=', k, v)
+
+
+class _Filter(object):
+    """A parsed query.
+
+    match() tells whether an attribute dictionary matches it, and
+    candidates() narrows down the entries of an IndexedShelve that can.
+
+    """
+
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = args
+
+    def match(self, attrs):
+        if self.op == '&':
+            return self.args[0].match(attrs) and self.args[1].match(attrs)
+        if self.op == '|':
+            return self.args[0].match(attrs) or self.args[1].match(attrs)
+        if self.op == '!':
+            return not self.args[0].match(attrs)
+        return _match(self.args[0], self.args[1], attrs)
+
+    def candidates(self, store):
+        """Returns a set holding the keys of every entry of store that may
+        match, or None if the indexes can't tell."""
+        if self.op == '&':
+            (l, r) = [f.candidates(store) for f in self.args]
+            if l is None or r is None:
+                return r if l is None else l
+            return l & r if len(l) < len(r) else r & l
+        if self.op == '|':
+            (l, r) = [f.candidates(store) for f in self.args]
+            if l is None or r is None:
+                return None
+            return l | r
+        if self.op == '!':
+            return None
+        (key, value) = self.args
+        if value == "*":
+            return store.having(key)
+        if key != "objectclass":
+            return store.lookup(key, value)
+        return set().union(*[store.lookup(key, v) for v in _subs(value)])
 
 
 def _paren_groups(source):
@@ -123,7 +189,103 @@ def _subs(value):
 server_fail = False
 
 
-class FakeShelve(dict):
+# Splits a DN into its first RDN and its parent's DN
+_DN_SPLIT = re.compile(r'(?<!\\),')
+
+
+class IndexedShelve(dict):
+    """An in-memory store that keeps indexes of its entries.
+
+    Besides the entries, keyed by 'ldap:' and the DN, it keeps the keys of
+    each DN's children and descendants, and of the entries having each
+    attribute and each attribute value. Entries must be stored again
+    whenever they are changed, as FakeLDAP does, to update the indexes.
+
+    """
+
+    def __init__(self):
+        super(IndexedShelve, self).__init__()
+        self._children = {}
+        self._descendants = {}
+        self._values = {}
+        self._attrs = {}
+        # what each key was indexed under, to unindex it
+        self._indexed = {}
+
+    def __setitem__(self, key, attrs):
+        if key in self:
+            self._unindex(key)
+        super(IndexedShelve, self).__setitem__(key, attrs)
+        self._index(key, attrs)
+
+    def __delitem__(self, key):
+        super(IndexedShelve, self).__delitem__(key)
+        self._unindex(key)
+
+    def clear(self):
+        super(IndexedShelve, self).clear()
+        for index in (self._children, self._descendants, self._values,
+                      self._attrs, self._indexed):
+            index.clear()
+
+    def _index(self, key, attrs):
+        values = set()
+        for (k, vs) in attrs.iteritems():
+            self._attrs.setdefault(k, set()).add(key)
+            for v in vs:
+                try:
+                    self._values.setdefault((k, v), set()).add(key)
+                except TypeError:
+                    # unhashable, so never equal to a query's string
+                    continue
+                values.add((k, v))
+        self._indexed[key] = (frozenset(attrs), values)
+
+        parents = _DN_SPLIT.split(key[len('ldap:'):], 1)[1:]
+        if parents:
+            self._children.setdefault(parents[0], set()).add(key)
+        while parents:
+            self._descendants.setdefault(parents[0], set()).add(key)
+            parents = _DN_SPLIT.split(parents[0], 1)[1:]
+
+    def _unindex(self, key):
+        def discard(index, name):
+            keys = index.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[name]
+
+        (attrs, values) = self._indexed.pop(key)
+        for k in attrs:
+            discard(self._attrs, k)
+        for value in values:
+            discard(self._values, value)
+        parents = _DN_SPLIT.split(key[len('ldap:'):], 1)[1:]
+        if parents:
+            discard(self._children, parents[0])
+        while parents:
+            discard(self._descendants, parents[0])
+            parents = _DN_SPLIT.split(parents[0], 1)[1:]
+
+    def children(self, dn):
+        """Returns the keys of the entries right under dn."""
+        return self._children.get(dn, set())
+
+    def descendants(self, dn):
+        """Returns the keys of all the entries under dn."""
+        return self._descendants.get(dn, set())
+
+    def lookup(self, attr, value):
+        """Returns the keys of the entries having value for attr."""
+        return self._values.get((attr, value), set())
+
+    def having(self, attr):
+        """Returns the keys of the entries having attr."""
+        return self._attrs.get(attr, set())
+
+
+class FakeShelve(IndexedShelve):
     @classmethod
     def get_instance(cls):
         try:
@@ -216,7 +378,8 @@ class FakeLDAP(object):
         key = "%s%s" % (self.__prefix, dn)
         LOG.debug("FakeLDAP modify item: dn=%s attrs=%s" % (dn, attrs))
         try:
-            entry = self.db[key]
+            # changed on a copy, so that nothing changes if any of it fails
+            entry = dict([(k, list(v)) for k, v in self.db[key].iteritems()])
         except KeyError:
             LOG.error("FakeLDAP modify item failed: dn '%s' not found." % dn)
             raise ldap.NO_SUCH_OBJECT
@@ -278,6 +441,8 @@ class FakeLDAP(object):
                 LOG.debug("FakeLDAP search fail: dn not found for SCOPE_BASE")
                 raise ldap.NO_SUCH_OBJECT
             results = [(dn, item_dict)]
+        elif isinstance(self.db, IndexedShelve):
+            results = self._indexed_search(dn, scope, query)
         elif scope == ldap.SCOPE_SUBTREE:
             results = [(k[len(self.__prefix):], v)
                        for k, v in self.db.iteritems()
@@ -294,7 +459,7 @@ class FakeLDAP(object):
         objects = []
         for dn, attrs in results:
             # filter the objects by query
-            if not query or _match_query(query, attrs):
+            if not query or _compile_query(query).match(attrs):
                 # filter the attributes by fields
                 attrs = dict([(k, v) for k, v in attrs.iteritems()
                               if not fields or k in fields])
@@ -303,6 +468,50 @@ class FakeLDAP(object):
         LOG.debug("FakeLDAP search result: %s" % (objects,))
         return objects
 
+    def _indexed_search(self, dn, scope, query):
+        """Finds the entries in scope using the indexes of self.db.
+
+        The query is only used to narrow down the entries, search_s still
+        has to match them against it.
+
+        """
+        if scope == ldap.SCOPE_SUBTREE:
+            keys = self.db.descendants(dn)
+        elif scope == ldap.SCOPE_ONELEVEL:
+            keys = self.db.children(dn)
+        else:
+            LOG.error("FakeLDAP search fail: unknown scope %s" % (scope,))
+            raise NotImplementedError("Search scope %s not implemented." %
+                                                                    (scope,))
+        if query and keys:
+            candidates = _compile_query(query).candidates(self.db)
+            if candidates is not None:
+                if len(candidates) < len(keys):
+                    keys = [k for k in candidates if k in keys]
+                else:
+                    keys = [k for k in keys if k in candidates]
+        return [(k[len(self.__prefix):], self.db[k]) for k in keys]
+
+    def paged_search(self, dn, scope, query, sort_attr, page_size):
+        """Yield the results of search_s sorted by sort_attr.
+
+        Emulates LDAPWrapper.paged_search: the sorting is done here,
+        case-sensitively like the caseExactOrderingMatch it asks for, and
+        page_size is only checked.
+
+        """
+        if page_size <= 0:
+            raise ldap.PROTOCOL_ERROR
+
+        def key(result):
+            rdn = ldap.dn.str2dn(result[0])[0][0]
+            if rdn[0] == sort_attr:
+                return rdn[1]
+            return result[1].get(sort_attr, [None])[0]
+
+        for result in sorted(self.search_s(dn, scope, query), key=key):
+            yield result
+
     @property
     def __prefix(self):  # pylint: disable=R0201
         """Get the prefix to use for all keys."""
@@ -45,7 +45,8 @@ def configure_backend(options):
 class Memcache_Server():
     def __init__(self, hosts):
         self.hosts = hosts
-        self.server = memcache.Client([self.hosts])
+        # cache_cas makes gets() remember the ids that cas() checks
+        self.server = memcache.Client([self.hosts], cache_cas=True)
 
     def set(self, key, value, expiry=CACHE_TIME):
         """
@@ -68,6 +69,45 @@ class Memcache_Server():
         """
         self.server.delete(key.encode('utf-8'))
 
+    def get_multi(self, keys):
+        """
+        This method is used to retrieve several values at
+        once. Returns a dict of the keys that were found
+        """
+        keys = dict([(key.encode('utf-8'), key) for key in keys])
+        return dict([(keys[key], value) for key, value in
+                     self.server.get_multi(keys.keys()).iteritems()])
+
+    def delete_multi(self, keys):
+        """
+        This method is used to delete several values at
+        once from the memcached server
+        """
+        self.server.delete_multi([key.encode('utf-8') for key in keys])
+
+    def add(self, key, value, expiry=CACHE_TIME):
+        """
+        This method is used to set a value only if the key
+        is not in the memcache server yet. Returns whether
+        it was set
+        """
+        return self.server.add(key.encode('utf-8'), value, expiry)
+
+    def gets(self, key):
+        """
+        This method is used to retrieve a value that is
+        then updated with cas()
+        """
+        return self.server.gets(key.encode('utf-8'))
+
+    def cas(self, key, value, expiry=CACHE_TIME):
+        """
+        This method is used to set a value retrieved with
+        gets(), only if nobody changed it since. Returns
+        whether it was set
+        """
+        return self.server.cas(key.encode('utf-8'), value, expiry)
+
 
 def register_models(options):
     """Register Models and create properties"""
@@ -14,9 +14,58 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+from datetime import datetime
+import logging
+
 from keystone.backends.memcache import MEMCACHE_SERVER
 from keystone.backends.api import BaseTokenAPI
 
+LOG = logging.getLogger('keystone.backends.memcache.api.token')
+
+# Attempts at updating a user's token set before giving up
+CAS_RETRIES = 10
+
+
+def _user_tokens_key(user_id):
+    """The key of the {token id: expiry} dict of a user's tokens
+
+    Unlike the keys of _token_keys, it holds a "/", which tenant and token
+    ids cannot: they are path segments of the API's URLs.
+    """
+    return "tokens/%s" % user_id
+
+
+def _token_keys(token):
+    """The keys a token is stored under"""
+    if token.tenant_id is not None:
+        return [token.id, "%s::%s" % (token.tenant_id, token.user_id)]
+    else:
+        return [token.id, "U%s" % token.user_id]
+
+
+def _update_user_tokens(user_id, update):
+    """Applies update to the user's token set, atomically
+
+    update is given the {token id: expiry} dict, without expired tokens,
+    and changes it in place.
+    """
+    key = _user_tokens_key(user_id)
+    for _i in range(CAS_RETRIES):
+        tokens = MEMCACHE_SERVER.gets(key)
+        if tokens is None:
+            tokens = {}
+            update(tokens)
+            if not tokens or MEMCACHE_SERVER.add(key, tokens):
+                return
+        else:
+            now = datetime.now()
+            tokens = dict([(id, expires) for id, expires in tokens.iteritems()
+                           if expires is None or expires >= now])
+            update(tokens)
+            if MEMCACHE_SERVER.cas(key, tokens):
+                return
+    LOG.warning("Gave up updating the token set of user %s", user_id)
+
 
 # pylint: disable=W0223
 class TokenAPI(BaseTokenAPI):
@@ -26,13 +75,12 @@ class TokenAPI(BaseTokenAPI):
     def create(self, token):
         if not hasattr(token, 'tenant_id'):
             token.tenant_id = None
-        if token.tenant_id is not None:
-            tenant_user_key = "%s::%s" % (token.tenant_id, token.user_id)
-        else:
-            tenant_user_key = "U%s" % token.user_id
 
-        MEMCACHE_SERVER.set(token.id, token)
-        MEMCACHE_SERVER.set(tenant_user_key, token)
+        for key in _token_keys(token):
+            MEMCACHE_SERVER.set(key, token)
+        _update_user_tokens(token.user_id,
+                            lambda tokens: tokens.__setitem__(token.id,
+                                                              token.expires))
 
     def get(self, id):
         token = MEMCACHE_SERVER.get(id)
@@ -44,15 +92,9 @@ class TokenAPI(BaseTokenAPI):
     def delete(self, id):
         token = self.get(id)
         if token is not None:
-            MEMCACHE_SERVER.delete(id)
-            if token is not None and not hasattr(token, 'tenant_id'):
-                token.tenant_id = None
-            if token.tenant_id is not None:
-                MEMCACHE_SERVER.delete("%s::%s" % (token.tenant_id,
-                                                   token.user_id))
-            else:
-                MEMCACHE_SERVER.delete(token.id)
-                MEMCACHE_SERVER.delete("U%s" % token.user_id)
+            MEMCACHE_SERVER.delete_multi(_token_keys(token))
+            _update_user_tokens(token.user_id,
+                                lambda tokens: tokens.pop(id, None))
 
     def get_for_user(self, user_id):
         token = MEMCACHE_SERVER.get("U%s" % user_id)
@@ -69,6 +111,32 @@ class TokenAPI(BaseTokenAPI):
             token.tenant_id = None
         return  token
 
+    def get_all_for_user(self, user_id):
+        ids = MEMCACHE_SERVER.get(_user_tokens_key(user_id)) or {}
+        tokens = MEMCACHE_SERVER.get_multi(ids.keys()).values()
+        for token in tokens:
+            if not hasattr(token, 'tenant_id'):
+                token.tenant_id = None
+        return tokens
+
+    def delete_all_for_user(self, user_id):
+        deleted = []
+
+        def delete(tokens):
+            # tokens created meanwhile make cas() fail, and are deleted
+            # on the next try
+            keys = set()
+            for token in MEMCACHE_SERVER.get_multi(tokens.keys()).values():
+                if not hasattr(token, 'tenant_id'):
+                    token.tenant_id = None
+                keys.update(_token_keys(token))
+            MEMCACHE_SERVER.delete_multi(keys)
+            deleted.extend(id for id in tokens if id not in deleted)
+            tokens.clear()
+
+        _update_user_tokens(user_id, delete)
+        return deleted
+
 
 def get():
     return TokenAPI()
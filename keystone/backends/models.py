@@ -23,6 +23,7 @@ Tenant = None
 User = None
 Credentials = None
 Token = None
+Revocation = None
 EndpointTemplates = None
 Service = None
 
@@ -50,6 +51,9 @@ def set_value(variable_name, value):
     elif variable_name == 'Token':
         global Token
         Token = value
+    elif variable_name == 'Revocation':
+        global Revocation
+        Revocation = value
     elif variable_name == 'EndpointTemplates':
         global EndpointTemplates
         EndpointTemplates = value
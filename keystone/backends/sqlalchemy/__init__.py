@@ -19,11 +19,17 @@
 from sqlalchemy.orm import joinedload, aliased, sessionmaker
 
 import ast
+import itertools
+import os
+import time
 
-from sqlalchemy import create_engine
-from sqlalchemy.pool import StaticPool
+from eventlet import corolocal, semaphore, tpool
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
 
 from keystone import utils
+from keystone.common import config
 from keystone.backends.sqlalchemy import models
 import keystone.backends.api as top_api
 import keystone.backends.models as top_models
@@ -31,29 +37,175 @@ import keystone.backends.models as top_models
 
 _DRIVER = None
 
+# Number of id<->uid translations the user and tenant APIs keep in memory
+ID_CACHE_SIZE = 10000
+
+# Seconds such a translation is trusted for; other worker processes are not
+# told when a user or tenant is deleted and re-created, or its uid changes
+ID_CACHE_TTL = 60
+
+# Seconds a greenthread's reads go to the primary rather than a replica
+# after it wrote
+READ_AFTER_WRITE_WINDOW = 5
+
+_LOCAL = corolocal.local()
+
+
+class GreenQueuePool(QueuePool):
+    """A QueuePool that greenthreads can wait on
+
+    QueuePool waits for a free connection on a native lock, which would
+    stall the whole eventlet hub, including the greenthread that is about
+    to return a connection. Here callers first wait their turn on a green
+    semaphore sized to the pool, so QueuePool itself never has to wait.
+
+    Checkouts and the time spent waiting for them are counted; see stats().
+    """
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, timeout=30,
+                 **kw):
+        QueuePool.__init__(self, creator, pool_size=pool_size,
+                           max_overflow=max_overflow, timeout=timeout, **kw)
+        self._slots = None
+        if max_overflow > -1:
+            self._slots = semaphore.Semaphore(pool_size + max_overflow)
+            # held while connecting, which may yield to other greenthreads
+            self._overflow_lock = semaphore.Semaphore(1)
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _do_get(self):
+        if self._slots is not None:
+            if not self._slots.acquire(blocking=False):
+                start = time.time()
+                acquired = self._slots.acquire(timeout=self._timeout)
+                waited = time.time() - start
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+                if not acquired:
+                    raise exc.TimeoutError(
+                        "QueuePool limit of size %d overflow %d reached, "
+                        "connection timed out, timeout %d" %
+                        (self.size(), self._max_overflow, self._timeout))
+        try:
+            conn = QueuePool._do_get(self)
+        except:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        self.checkouts += 1
+        return conn
+
+    def _do_return_conn(self, conn):
+        try:
+            QueuePool._do_return_conn(self, conn)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self):
+        """Returns a dict of counters, handy for logging and tests"""
+        return {'size': self.size(), 'checkedout': self.checkedout(),
+                'overflow': self.overflow(), 'checkouts': self.checkouts,
+                'waits': self.waits, 'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time}
+
+
+def _tpool_creator(connection_str, connect_args):
+    """Returns a pool creator whose DB-API connections run every call,
+    and every call on their cursors, in eventlet's native thread pool
+
+    For C drivers such as MySQLdb, whose sockets eventlet cannot patch.
+    """
+    url = make_url(connection_str)
+    dialect_cls = url.get_dialect()
+    dialect = dialect_cls(dbapi=dialect_cls.dbapi())
+    (cargs, cparams) = dialect.create_connect_args(url)
+    cparams.update(connect_args)
+
+    def connect():
+        connection = tpool.execute(dialect.dbapi.connect, *cargs, **cparams)
+        return tpool.Proxy(connection, autowrap_names=('cursor',))
+    return connect
+
+
+def _create_engine(connection_str, options):
+    url = make_url(connection_str)
+    if url.drivername.startswith('sqlite') and \
+            url.database in (None, '', ':memory:'):
+        # in-memory sqlite
+        return create_engine(
+            connection_str,
+            connect_args={'check_same_thread': False},
+            poolclass=StaticPool)
+
+    connect_args = {}
+    if url.drivername.startswith('sqlite'):
+        # connections move between threads with sql_use_tpool
+        connect_args['check_same_thread'] = False
+    kwargs = {}
+    if config.get_option(options, 'sql_use_tpool', type='bool',
+                         default=False):
+        kwargs['creator'] = _tpool_creator(connection_str, connect_args)
+    return create_engine(
+        connection_str,
+        connect_args=connect_args,
+        poolclass=GreenQueuePool,
+        pool_size=config.get_option(options, 'sql_pool_size',
+                                    type='int', default=5),
+        max_overflow=config.get_option(options, 'sql_max_overflow',
+                                       type='int', default=10),
+        pool_timeout=config.get_option(options, 'sql_pool_timeout',
+                                       type='int', default=30),
+        echo_pool=config.get_option(options, 'sql_echo_pool',
+                                    type='bool', default=False),
+        pool_recycle=3600,
+        **kwargs)
+
+
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    """Sends the current greenthread's reads to the primary for a while"""
+    if not statement.lstrip()[:6].upper() == 'SELECT':
+        _LOCAL.last_write = time.time()
+
+
+def _wrote_recently():
+    last_write = getattr(_LOCAL, 'last_write', None)
+    return last_write is not None and \
+            time.time() - last_write < READ_AFTER_WRITE_WINDOW
+
 
 class Driver():
     def __init__(self, options):
         self.session = None
         self._engine = None
+        self._read_engines = []
+        self._pid = os.getpid()
         connection_str = options['sql_connection']
         model_list = ast.literal_eval(options["backend_entities"])
 
-        self._init_engine(connection_str)
+        self._init_engine(connection_str, options)
+        self._init_read_engines(options)
         self._init_models(model_list)
         self._init_session_maker()
 
-    def _init_engine(self, connection_str):
-        if connection_str == "sqlite://":
-            # in-memory sqlite
-            self._engine = create_engine(
-                connection_str,
-                connect_args={'check_same_thread': False},
-                poolclass=StaticPool)
-        else:
-            self._engine = create_engine(
-                connection_str,
-                pool_recycle=3600)
+    def _init_engine(self, connection_str, options):
+        self._engine = _create_engine(connection_str, options)
+
+    def _init_read_engines(self, options):
+        """Creates an engine per sql_read_connection replica"""
+        self._read_engines = []
+        for connection_str in options.get('sql_read_connection',
+                                          '').split(','):
+            if connection_str.strip():
+                self._read_engines.append(
+                    _create_engine(connection_str.strip(), options))
+        if self._read_engines:
+            event.listen(self._engine, 'before_cursor_execute',
+                         _note_write)
 
     def _init_models(self, model_list):
         tables = []
@@ -83,11 +235,36 @@ class Driver():
             bind=self._engine,
             autocommit=True,
             expire_on_commit=False)
+        self._read_sessions = itertools.cycle([
+            sessionmaker(bind=engine, autocommit=True,
+                         expire_on_commit=False)
+            for engine in self._read_engines])
+
+    def get_session(self, read=False):
+        """Creates a pre-configured database session
 
-    def get_session(self):
-        """Creates a pre-configured database session"""
+        With read=True the session may be on a read replica, taken in turn.
+        Reads stay on the primary for a while after the greenthread (and so
+        the request) wrote, so that they see what was written.
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+        if read and self._read_engines and not _wrote_recently():
+            return self._read_sessions.next()()
         return self.session()
 
+    def _after_fork(self):
+        """Gives a forked worker a connection pool of its own
+
+        The parent's pooled connections are abandoned, not closed: closing
+        them here would close them for the parent too.
+        """
+        self._pid = os.getpid()
+        for engine in [self._engine] + self._read_engines:
+            if not isinstance(engine.pool, StaticPool):
+                # a StaticPool holds an in-memory database; keep sharing it
+                engine.pool = engine.pool.recreate()
+
     def reset(self):
         """Unregister models and reset DB engine.
 
@@ -108,9 +285,65 @@ def configure_backend(options):
     _DRIVER = Driver(options)
 
 
-def get_session():
+def get_session(read=False):
+    """Creates a session on the primary database, or one that may be on a
+    read replica if read is True"""
     global _DRIVER
-    return _DRIVER.get_session()
+    return _DRIVER.get_session(read)
+
+
+def on_replica(session):
+    """Whether a session from get_session(read=True) is on a read replica,
+    which may not have caught up with the primary yet"""
+    return _DRIVER is not None and session.bind is not _DRIVER._engine
+
+
+def get_pool_stats():
+    """Returns the connection pool's counters, or None if it keeps none"""
+    if _DRIVER is None or _DRIVER._engine is None:
+        return None
+    pool = _DRIVER._engine.pool
+    if hasattr(pool, 'stats'):
+        return pool.stats()
+
+
+def get_page_and_markers(query, key, marker, limit, descending=True):
+    """Returns (rows, prev, next) for one page of a query, ordered by key
+
+    The page starts at the row whose key is marker (or at the first row if
+    marker is None) and holds up to limit rows. next is the key the
+    following page starts at and prev the key the preceding one starts at;
+    either is None if there is no such page.
+
+    Takes two queries: one for limit + 1 rows from the marker on, the extra
+    row being the start of the next page, and a probe of up to limit keys
+    before the marker in reverse order, the last of which starts the
+    previous page.
+    """
+    limit = int(limit)
+    if descending:
+        (forward, backward) = (key.desc(), key)
+    else:
+        (forward, backward) = (key, key.desc())
+
+    page = query
+    if marker is not None:
+        page = page.filter(key <= marker if descending else key >= marker)
+    rows = page.order_by(forward).limit(limit + 1).all()
+    next_marker = None
+    if len(rows) > limit:
+        next_marker = getattr(rows[limit], key.key)
+        rows = rows[:limit]
+
+    prev_marker = None
+    if marker is not None:
+        keys = query.with_entities(key).\
+            filter(key > marker if descending else key < marker).\
+            order_by(backward).limit(limit).all()
+        if keys:
+            prev_marker = keys[-1][0]
+
+    return (rows, prev_marker, next_marker)
 
 
 def unregister_models():
@@ -82,7 +82,7 @@ class CredentialsAPI(api.BaseCredentialsAPI):
 
     def get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.Credentials).filter_by(id=id).first()
 
@@ -90,7 +90,7 @@ class CredentialsAPI(api.BaseCredentialsAPI):
 
     def get_by_access(self, access, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.Credentials).\
                          filter_by(type="EC2", key=access).first()
@@ -15,7 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from keystone.backends.sqlalchemy import get_session, models, aliased
+from keystone.backends.sqlalchemy import get_session, models, \
+    get_page_and_markers
 from keystone.backends import api
 
 
@@ -62,7 +63,7 @@ class EndpointTemplateAPI(api.BaseEndpointTemplateAPI):
 
     def get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.EndpointTemplates).\
             filter_by(id=id).first()
@@ -71,217 +72,76 @@ class EndpointTemplateAPI(api.BaseEndpointTemplateAPI):
 
     def get_all(self, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         return session.query(models.EndpointTemplates).all()
 
     def get_by_service(self, service_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.EndpointTemplates).\
             filter_by(service_id=service_id).all()
 
     def get_by_service_get_page(self, service_id, marker, limit, session=None):
-        if not session:
-            session = get_session()
+        return self.get_by_service_get_page_with_markers(service_id, marker,
+            limit, session)[0]
 
-        if marker:
-            return session.query(models.EndpointTemplates).\
-                    filter("id>:marker").params(\
-                    marker='%s' % marker).filter_by(\
-                    service_id=service_id).order_by(\
-                    models.EndpointTemplates.id.desc()).limit(limit).all()
-        else:
-            return session.query(models.EndpointTemplates).filter_by(\
-                                service_id=service_id).order_by(\
-                                models.EndpointTemplates.id.desc()).\
-                                limit(limit).all()
-
-    # pylint: disable=R0912
     def get_by_service_get_page_markers(self, service_id, marker, \
         limit, session=None):
+        return self.get_by_service_get_page_with_markers(service_id, marker,
+            limit, session)[1:]
+
+    def get_by_service_get_page_with_markers(self, service_id, marker,
+            limit, session=None):
         if not session:
-            session = get_session()
-        first = session.query(models.EndpointTemplates).filter_by(\
-                            service_id=service_id).order_by(\
-                            models.EndpointTemplates.id).first()
-        last = session.query(models.EndpointTemplates).filter_by(\
-                            service_id=service_id).order_by(\
-                            models.EndpointTemplates.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(models.EndpointTemplates).\
-            filter("id > :marker").\
-            filter_by(service_id=service_id).\
-            params(marker='%s' % marker).\
-            order_by(models.EndpointTemplates.id).\
-            limit(limit).\
-            all()
-        prev_page = session.query(models.EndpointTemplates).\
-            filter("id < :marker").\
-            filter_by(service_id=service_id).\
-            params(marker='%s' % marker).\
-            order_by(models.EndpointTemplates.id.desc()).\
-            limit(int(limit)).\
-            all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+            session = get_session(read=True)
+
+        query = session.query(models.EndpointTemplates).\
+            filter_by(service_id=service_id)
+        return get_page_and_markers(query, models.EndpointTemplates.id,
+            marker, limit)
 
     def get_page(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
+        return self.get_page_with_markers(marker, limit, session)[0]
 
-        if marker:
-            return session.query(models.EndpointTemplates).\
-                    filter("id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    models.EndpointTemplates.id.desc()).limit(limit).all()
-        else:
-            return session.query(models.EndpointTemplates).order_by(\
-                                models.EndpointTemplates.id.desc()).\
-                                limit(limit).all()
-
-    # pylint: disable=R0912
     def get_page_markers(self, marker, limit, session=None):
+        return self.get_page_with_markers(marker, limit, session)[1:]
+
+    def get_page_with_markers(self, marker, limit, session=None):
         if not session:
-            session = get_session()
-        first = session.query(models.EndpointTemplates).order_by(\
-                            models.EndpointTemplates.id).first()
-        last = session.query(models.EndpointTemplates).order_by(\
-                            models.EndpointTemplates.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(models.EndpointTemplates).\
-            filter("id > :marker").\
-            params(marker='%s' % marker).\
-            order_by(models.EndpointTemplates.id).\
-            limit(limit).\
-            all()
-        prev_page = session.query(models.EndpointTemplates).\
-            filter("id < :marker").\
-            params(marker='%s' % marker).\
-            order_by(models.EndpointTemplates.id.desc()).\
-            limit(int(limit)).\
-            all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+            session = get_session(read=True)
+
+        return get_page_and_markers(session.query(models.EndpointTemplates),
+            models.EndpointTemplates.id, marker, limit)
 
     def endpoint_get_by_tenant_get_page(self, tenant_id, marker, limit,
             session=None):
+        return self.endpoint_get_by_tenant_get_page_with_markers(tenant_id,
+            marker, limit, session)[0]
+
+    def endpoint_get_by_tenant_get_page_markers(self, tenant_id, marker, limit,
+            session=None):
+        return self.endpoint_get_by_tenant_get_page_with_markers(tenant_id,
+            marker, limit, session)[1:]
+
+    def endpoint_get_by_tenant_get_page_with_markers(self, tenant_id, marker,
+            limit, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if isinstance(api.TENANT, models.Tenant):
             tenant_id = api.TENANT.uid_to_id(tenant_id)
 
-        if marker:
-            results = session.query(models.Endpoints).\
-                filter(models.Endpoints.tenant_id == tenant_id).\
-                filter("id >= :marker").params(
-                marker='%s' % marker).order_by(
-                models.Endpoints.id).limit(limit).all()
-        else:
-            results = session.query(models.Endpoints).\
-                filter(models.Endpoints.tenant_id == tenant_id).\
-                order_by(models.Endpoints.id).limit(limit).all()
+        query = session.query(models.Endpoints).\
+            filter(models.Endpoints.tenant_id == tenant_id)
+        (results, prev, next) = get_page_and_markers(query,
+            models.Endpoints.id, marker, limit, descending=False)
 
         if isinstance(api.TENANT, models.Tenant):
             for result in results:
                 result.tenant_id = api.TENANT.id_to_uid(result.tenant_id)
 
-        return results
-
-    # pylint: disable=R0912
-    def endpoint_get_by_tenant_get_page_markers(self, tenant_id, marker, limit,
-            session=None):
-        if not session:
-            session = get_session()
-
-        if isinstance(api.TENANT, models.Tenant):
-            tenant_id = api.TENANT.uid_to_id(tenant_id)
-
-        tba = aliased(models.Endpoints)
-        first = session.query(tba).\
-            filter(tba.tenant_id == tenant_id).\
-            order_by(tba.id).first()
-        last = session.query(tba).\
-            filter(tba.tenant_id == tenant_id).\
-            order_by(tba.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(tba).\
-            filter(tba.tenant_id == tenant_id).\
-            filter("id>=:marker").params(
-            marker='%s' % marker).order_by(
-            tba.id).limit(int(limit)).all()
-
-        prev_page = session.query(tba).\
-                        filter(tba.tenant_id == tenant_id).\
-                        filter("id < :marker").params(
-                        marker='%s' % marker).order_by(
-                        tba.id).limit(int(limit) + 1).all()
-        next_len = len(next_page)
-        prev_len = len(prev_page)
-
-        if next_len == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if prev_len == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if first.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if marker == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+        return (results, prev, next)
 
     def endpoint_add(self, values):
         if isinstance(api.TENANT, models.Tenant):
@@ -298,7 +158,7 @@ class EndpointTemplateAPI(api.BaseEndpointTemplateAPI):
 
     def endpoint_get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.Endpoints).\
             filter_by(id=id).first()
@@ -311,7 +171,7 @@ class EndpointTemplateAPI(api.BaseEndpointTemplateAPI):
 
     def endpoint_get_by_tenant(self, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if isinstance(api.TENANT, models.Tenant):
             tenant_id = api.TENANT.uid_to_id(tenant_id)
@@ -328,7 +188,7 @@ class EndpointTemplateAPI(api.BaseEndpointTemplateAPI):
     def endpoint_get_by_endpoint_template(
         self, endpoint_template_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.Endpoints).\
             filter_by(endpoint_template_id=endpoint_template_id).all()
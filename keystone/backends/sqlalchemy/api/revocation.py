@@ -0,0 +1,91 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+
+from sqlalchemy import func
+
+from keystone.backends.sqlalchemy import get_session, models
+from keystone.backends import api
+from keystone.models import Revocation
+
+
+# pylint: disable=E1103,W0221
+class RevocationAPI(api.BaseRevocationAPI):
+    def __init__(self, *args, **kw):
+        super(RevocationAPI, self).__init__(*args, **kw)
+
+    @staticmethod
+    def to_model(ref):
+        """ Returns Keystone model object based on SQLAlchemy model"""
+        if ref:
+            return Revocation(id=ref.id, token_id=ref.token_id,
+                              user_id=ref.user_id, tenant_id=ref.tenant_id,
+                              created=ref.created)
+
+    @staticmethod
+    def to_model_list(refs):
+        return [RevocationAPI.to_model(ref) for ref in refs]
+
+    def create(self, values, session=None):
+        revocation_ref = models.Revocation()
+        revocation_ref.update(values)
+        if revocation_ref.created is None:
+            revocation_ref.created = datetime.now()
+        revocation_ref.save(session)
+        return RevocationAPI.to_model(revocation_ref)
+
+    def get_since(self, since, limit=None, session=None):
+        if not session:
+            session = get_session(read=True)
+
+        query = session.query(models.Revocation).\
+            filter(models.Revocation.id > since).\
+            order_by(models.Revocation.id)
+        if limit:
+            query = query.limit(limit)
+        return RevocationAPI.to_model_list(query)
+
+    def get_first_id(self, session=None):
+        if not session:
+            session = get_session(read=True)
+
+        return session.query(func.min(models.Revocation.id)).scalar()
+
+    def delete_before(self, created, limit=None, session=None):
+        if not session:
+            session = get_session()
+
+        with session.begin():
+            last_id = session.query(func.max(models.Revocation.id)).scalar()
+            query = session.query(models.Revocation.id).\
+                filter(models.Revocation.created < created).\
+                filter(models.Revocation.id < last_id).\
+                order_by(models.Revocation.id)
+            if limit:
+                query = query.limit(limit)
+            ids = [row.id for row in query]
+            if ids:
+                session.query(models.Revocation).\
+                    filter(models.Revocation.id.in_(ids)).\
+                    delete(synchronize_session=False)
+
+        return len(ids)
+
+
+def get():
+    return RevocationAPI()
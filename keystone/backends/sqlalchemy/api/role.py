@@ -15,7 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from keystone.backends.sqlalchemy import get_session, models
+from keystone.backends.sqlalchemy import get_session, models, \
+    get_page_and_markers
 from keystone.backends import api
 
 
@@ -40,41 +41,43 @@ class RoleAPI(api.BaseRoleAPI):
 
     def get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Role).filter_by(id=id).first()
 
     def get_by_name(self, name, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Role).filter_by(name=name).first()
 
     def get_by_service(self, service_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         result = session.query(models.Role).\
             filter_by(service_id=service_id).all()
         return result
 
     def get_all(self, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Role).all()
 
     def get_page(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
+        return self.get_page_with_markers(marker, limit, session)[0]
 
-        if marker:
-            return session.query(models.Role).filter("id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    models.Role.id.desc()).limit(limit).all()
-        else:
-            return session.query(models.Role).order_by(\
-                                models.Role.id.desc()).limit(limit).all()
+    def get_page_with_markers(self, marker, limit, session=None):
+        if not session:
+            session = get_session(read=True)
+        return get_page_and_markers(session.query(models.Role),
+            models.Role.id, marker, limit)
 
     def ref_get_page(self, marker, limit, user_id, tenant_id, session=None):
+        return self.ref_get_page_with_markers(marker, limit, user_id,
+            tenant_id, session)[0]
+
+    def ref_get_page_with_markers(self, marker, limit, user_id, tenant_id,
+            session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.USER, 'uid_to_id'):
             user_id = api.USER.uid_to_id(user_id)
@@ -87,13 +90,11 @@ class RoleAPI(api.BaseRoleAPI):
             query = query.filter_by(tenant_id=tenant_id)
         else:
             query = query.filter("tenant_id is null")
-        if marker:
-            results = query.filter("id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    models.UserRoleAssociation.id.desc()).limit(limit).all()
-        else:
-            results = query.order_by(\
-                    models.UserRoleAssociation.id.desc()).limit(limit).all()
+        (results, prev, next) = get_page_and_markers(query,
+            models.UserRoleAssociation.id, marker, limit)
+
+        if hasattr(api.TENANT, 'ids_to_uids'):
+            api.TENANT.ids_to_uids([result.tenant_id for result in results])
 
         for result in results:
             if hasattr(api.USER, 'uid_to_id'):
@@ -101,11 +102,11 @@ class RoleAPI(api.BaseRoleAPI):
             if hasattr(api.TENANT, 'uid_to_id'):
                 result.tenant_id = api.TENANT.id_to_uid(result.tenant_id)
 
-        return results
+        return (results, prev, next)
 
     def ref_get_all_global_roles(self, user_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.USER, 'uid_to_id'):
             user_id = api.USER.uid_to_id(user_id)
@@ -123,7 +124,7 @@ class RoleAPI(api.BaseRoleAPI):
 
     def ref_get_all_tenant_roles(self, user_id, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.USER, 'uid_to_id'):
             user_id = api.USER.uid_to_id(user_id)
@@ -143,7 +144,7 @@ class RoleAPI(api.BaseRoleAPI):
 
     def ref_get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.UserRoleAssociation).filter_by(id=id).\
             first()
@@ -164,109 +165,26 @@ class RoleAPI(api.BaseRoleAPI):
             role_ref = self.ref_get(id, session)
             session.delete(role_ref)
 
-    # pylint: disable=R0912
     def get_page_markers(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
-        first = session.query(models.Role).order_by(\
-                            models.Role.id).first()
-        last = session.query(models.Role).order_by(\
-                            models.Role.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(models.Role).filter("id > :marker").params(\
-                        marker='%s' % marker).order_by(\
-                        models.Role.id).limit(limit).all()
-        prev_page = session.query(models.Role).filter("id < :marker").params(\
-                        marker='%s' % marker).order_by(\
-                        models.Role.id.desc()).limit(int(limit)).all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+        return self.get_page_with_markers(marker, limit, session)[1:]
 
-    # pylint: disable=R0912
     def ref_get_page_markers(self, user_id, tenant_id, marker,
             limit, session=None):
-        if not session:
-            session = get_session()
-
-        if hasattr(api.USER, 'uid_to_id'):
-            user_id = api.USER.uid_to_id(user_id)
-        if hasattr(api.TENANT, 'uid_to_id'):
-            tenant_id = api.TENANT.uid_to_id(tenant_id)
-
-        query = session.query(models.UserRoleAssociation).filter_by(\
-                                            user_id=user_id)
-        if tenant_id:
-            query = query.filter_by(tenant_id=tenant_id)
-        else:
-            query = query.filter("tenant_id is null")
-        first = query.order_by(\
-                            models.UserRoleAssociation.id).first()
-        last = query.order_by(\
-                            models.UserRoleAssociation.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = query.\
-            filter("id > :marker").\
-            params(marker='%s' % marker).\
-            order_by(models.UserRoleAssociation.id).\
-            limit(limit).\
-            all()
-        prev_page = query.\
-            filter("id < :marker").\
-            params(marker='%s' % marker).\
-            order_by(models.UserRoleAssociation.id.desc()).\
-            limit(int(limit)).\
-            all()
-
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+        return self.ref_get_page_with_markers(marker, limit, user_id,
+            tenant_id, session)[1:]
 
     def ref_get_by_role(self, role_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         results = session.query(models.UserRoleAssociation).\
             filter_by(role_id=role_id).all()
 
+        if hasattr(api.USER, 'ids_to_uids'):
+            api.USER.ids_to_uids([result.user_id for result in results])
+        if hasattr(api.TENANT, 'ids_to_uids'):
+            api.TENANT.ids_to_uids([result.tenant_id for result in results])
+
         for result in results:
             if hasattr(api.USER, 'uid_to_id'):
                 result.user_id = api.USER.id_to_uid(result.user_id)
@@ -277,7 +195,7 @@ class RoleAPI(api.BaseRoleAPI):
 
     def ref_get_by_user(self, user_id, role_id, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.USER, 'uid_to_id'):
             user_id = api.USER.uid_to_id(user_id)
@@ -15,7 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from keystone.backends.sqlalchemy import get_session, models
+from keystone.backends.sqlalchemy import get_session, models, \
+    get_page_and_markers
 from keystone.backends import api
 
 
@@ -33,17 +34,17 @@ class ServiceAPI(api.BaseServiceAPI):
 
     def get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Service).filter_by(id=id).first()
 
     def get_by_name(self, name, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Service).filter_by(name=name).first()
 
     def get_by_name_and_type(self, name, type, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Service).\
         filter_by(name=name).\
         filter_by(type=type).\
@@ -51,58 +52,20 @@ class ServiceAPI(api.BaseServiceAPI):
 
     def get_all(self, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
         return session.query(models.Service).all()
 
     def get_page(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
-        if marker:
-            return session.query(models.Service).filter("id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    models.Service.id.desc()).limit(limit).all()
-        else:
-            return session.query(models.Service).order_by(\
-                                models.Service.id.desc()).limit(limit).all()
+        return self.get_page_with_markers(marker, limit, session)[0]
 
     def get_page_markers(self, marker, limit, session=None):
+        return self.get_page_with_markers(marker, limit, session)[1:]
+
+    def get_page_with_markers(self, marker, limit, session=None):
         if not session:
-            session = get_session()
-        first = session.query(models.Service).order_by(\
-                            models.Service.id).first()
-        last = session.query(models.Service).order_by(\
-                            models.Service.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(models.Service).\
-                        filter("id > :marker").params(\
-                        marker='%s' % marker).order_by(\
-                        models.Service.id).limit(limit).all()
-        prev_page = session.query(models.Service).\
-                        filter("id < :marker").params(\
-                        marker='%s' % marker).order_by(\
-                        models.Service.id.desc()).limit(int(limit)).all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+            session = get_session(read=True)
+        return get_page_and_markers(session.query(models.Service),
+            models.Service.id, marker, limit)
 
     def delete(self, id, session=None):
         if not session:
@@ -17,8 +17,12 @@
 
 import uuid
 
-from keystone.backends.sqlalchemy import get_session, models, aliased
+from sqlalchemy import or_
+
+from keystone.backends.sqlalchemy import get_session, models, \
+    joinedload, get_page_and_markers, ID_CACHE_SIZE, ID_CACHE_TTL
 from keystone.backends import api
+from keystone.common.cache import LRUCache
 from keystone.models import Tenant
 
 
@@ -26,6 +30,8 @@ from keystone.models import Tenant
 class TenantAPI(api.BaseTenantAPI):
     def __init__(self, *args, **kw):
         super(TenantAPI, self).__init__(*args, **kw)
+        # Maps ('id', pk) -> uid and ('uid', uid) -> pk
+        self.id_cache = LRUCache(maxsize=ID_CACHE_SIZE, ttl=ID_CACHE_TTL)
 
     # pylint: disable=W0221
     @staticmethod
@@ -68,6 +74,7 @@ class TenantAPI(api.BaseTenantAPI):
         if tenant_ref.uid is None:
             tenant_ref.uid = uuid.uuid4().hex
         tenant_ref.save()
+        self._uncache_ids(id=tenant_ref.id, uid=tenant_ref.uid)
         return TenantAPI.to_model(tenant_ref)
 
     def get(self, id, session=None):
@@ -81,7 +88,7 @@ class TenantAPI(api.BaseTenantAPI):
             For PK lookups from within the sqlalchemy backend,
             use ``_get_by_id()`` instead.
         """
-        session = session or get_session()
+        session = session or get_session(read=True)
 
         result = session.query(models.Tenant).filter_by(uid=id).first()
 
@@ -101,20 +108,68 @@ class TenantAPI(api.BaseTenantAPI):
 
         return session.query(models.Tenant).filter_by(id=id).first()
 
-    @staticmethod
-    def id_to_uid(id, session=None):
-        session = session or get_session()
-        tenant = session.query(models.Tenant).filter_by(id=id).first()
-        return tenant.uid if tenant else None
-
-    @staticmethod
-    def uid_to_id(uid, session=None):
-        session = session or get_session()
-        tenant = session.query(models.Tenant).filter_by(uid=uid).first()
-        return tenant.id if tenant else None
+    def _cache_ids(self, id, uid):
+        self.id_cache.set(('id', id), uid)
+        self.id_cache.set(('uid', uid), id)
+
+    def _uncache_ids(self, id=None, uid=None):
+        if id is not None:
+            self.id_cache.delete(('id', id))
+        if uid is not None:
+            self.id_cache.delete(('uid', uid))
+
+    def id_to_uid(self, id, session=None):
+        if id is None:
+            return None
+        uid = self.id_cache.get(('id', id))
+        if uid is None:
+            session = session or get_session()
+            tenant = session.query(models.Tenant).filter_by(id=id).first()
+            if not tenant:
+                return None
+            uid = tenant.uid
+            self._cache_ids(tenant.id, uid)
+        return uid
+
+    def uid_to_id(self, uid, session=None):
+        if uid is None:
+            return None
+        id = self.id_cache.get(('uid', uid))
+        if id is None:
+            session = session or get_session()
+            tenant = session.query(models.Tenant).filter_by(uid=uid).first()
+            if not tenant:
+                return None
+            id = tenant.id
+            self._cache_ids(id, tenant.uid)
+        return id
+
+    def ids_to_uids(self, ids, session=None):
+        """Translates a list of PKs, querying only for uncached ones
+
+        Returns a dict of id -> uid; unknown ids are left out.
+        """
+        result = {}
+        missing = set()
+        for id in ids:
+            if id is None:
+                continue
+            uid = self.id_cache.get(('id', id))
+            if uid is None:
+                missing.add(id)
+            else:
+                result[id] = uid
+        if missing:
+            session = session or get_session()
+            rows = session.query(models.Tenant.id, models.Tenant.uid).\
+                filter(models.Tenant.id.in_(missing)).all()
+            for (id, uid) in rows:
+                self._cache_ids(id, uid)
+                result[id] = uid
+        return result
 
     def get_by_name(self, name, session=None):
-        session = session or get_session()
+        session = session or get_session(read=True)
 
         result = session.query(models.Tenant).filter_by(name=name).first()
 
@@ -122,141 +177,56 @@ class TenantAPI(api.BaseTenantAPI):
 
     def get_all(self, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         results = session.query(models.Tenant).all()
 
         return TenantAPI.to_model_list(results)
 
     def tenants_for_user_get_page(self, user, marker, limit, session=None):
-        if not session:
-            session = get_session()
-
-        if hasattr(api.USER, 'uid_to_id'):
-            user.id = api.USER.uid_to_id(user.id)
-        if hasattr(api.TENANT, 'uid_to_id'):
-            user.tenant_id = api.TENANT.uid_to_id(user.tenant_id)
-
-        ura = aliased(models.UserRoleAssociation)
-        tenant = aliased(models.Tenant)
-        q1 = session.query(tenant).join((ura, ura.tenant_id == tenant.id)).\
-            filter(ura.user_id == user.id)
-        q2 = session.query(tenant).filter(tenant.id == user.tenant_id)
-        q3 = q1.union(q2)
-        if marker:
-            results = q3.filter("tenant.id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    tenant.id.desc()).limit(limit).all()
-        else:
-            results = q3.order_by(tenant.id.desc()).limit(limit).all()
+        return self.tenants_for_user_get_page_with_markers(user, marker,
+            limit, session)[0]
 
-        return TenantAPI.to_model_list(results)
-
-    # pylint: disable=R0912
     def tenants_for_user_get_page_markers(self, user, marker, limit,
             session=None):
+        return self.tenants_for_user_get_page_with_markers(user, marker,
+            limit, session)[1:]
+
+    def tenants_for_user_get_page_with_markers(self, user, marker, limit,
+            session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
+        user_id = user.id
+        tenant_id = user.tenant_id
         if hasattr(api.USER, 'uid_to_id'):
-            user.id = api.USER.uid_to_id(user.id)
+            user_id = api.USER.uid_to_id(user_id)
         if hasattr(api.TENANT, 'uid_to_id'):
-            user.tenant_id = api.TENANT.uid_to_id(user.tenant_id)
-
-        ura = aliased(models.UserRoleAssociation)
-        tenant = aliased(models.Tenant)
-        q1 = session.query(tenant).join((ura, ura.tenant_id == tenant.id)).\
-            filter(ura.user_id == user.id)
-        q2 = session.query(tenant).filter(tenant.id == user.tenant_id)
-        q3 = q1.union(q2)
-
-        first = q3.order_by(\
-                            tenant.id).first()
-        last = q3.order_by(\
-                            tenant.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = q3.filter(tenant.id > marker).order_by(\
-                        tenant.id).limit(limit).all()
-        prev_page = q3.filter(tenant.id > marker).order_by(\
-                        tenant.id.desc()).limit(int(limit)).all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+            tenant_id = api.TENANT.uid_to_id(tenant_id)
 
-    def get_page(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
+        # tenants the user has a role on, plus the user's default tenant
+        assigned = session.query(models.UserRoleAssociation.tenant_id).\
+            filter(models.UserRoleAssociation.user_id == user_id)
+        query = session.query(models.Tenant).\
+            filter(or_(models.Tenant.id.in_(assigned.subquery()),
+                       models.Tenant.id == tenant_id))
+        (results, prev, next) = get_page_and_markers(query, models.Tenant.id,
+            marker, limit)
 
-        if marker:
-            return session.query(models.Tenant).filter("id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    models.Tenant.id.desc()).limit(limit).all()
-        else:
-            return session.query(models.Tenant).order_by(\
-                                models.Tenant.id.desc()).limit(limit).all()
+        return (TenantAPI.to_model_list(results), prev, next)
+
+    def get_page(self, marker, limit, session=None):
+        return self.get_page_with_markers(marker, limit, session)[0]
 
-    # pylint: disable=R0912
     def get_page_markers(self, marker, limit, session=None):
+        return self.get_page_with_markers(marker, limit, session)[1:]
+
+    def get_page_with_markers(self, marker, limit, session=None):
         if not session:
-            session = get_session()
-        first = session.query(models.Tenant).order_by(\
-                            models.Tenant.id).first()
-        last = session.query(models.Tenant).order_by(\
-                            models.Tenant.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(models.Tenant).\
-            filter("id > :marker").\
-            params(marker='%s' % marker).\
-            order_by(models.Tenant.id).\
-            limit(limit).\
-            all()
-        prev_page = session.query(models.Tenant).\
-            filter("id < :marker").\
-            params(marker='%s' % marker).\
-            order_by(models.Tenant.id.desc()).\
-            limit(int(limit)).\
-            all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+            session = get_session(read=True)
+
+        return get_page_and_markers(session.query(models.Tenant),
+            models.Tenant.id, marker, limit)
 
     def is_empty(self, id, session=None):
         if not session:
@@ -286,8 +256,11 @@ class TenantAPI(api.BaseTenantAPI):
 
         with session.begin():
             tenant_ref = self._get_by_id(id, session)
+            old_uid = tenant_ref.uid
             tenant_ref.update(data)
             tenant_ref.save(session=session)
+            if 'uid' in data:
+                self._uncache_ids(id=id, uid=old_uid)
             return self.get(id, session)
 
     def delete(self, id, session=None):
@@ -300,34 +273,43 @@ class TenantAPI(api.BaseTenantAPI):
         with session.begin():
             tenant_ref = self._get_by_id(id, session)
             session.delete(tenant_ref)
+        self._uncache_ids(id=id, uid=tenant_ref.uid)
 
     def get_all_endpoints(self, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.TENANT, 'uid_to_id'):
             tenant_id = self.uid_to_id(tenant_id)
 
-        endpoint_templates = aliased(models.EndpointTemplates)
-        q = session.query(endpoint_templates).\
-            filter(endpoint_templates.is_global == True)
+        endpoint_templates = models.EndpointTemplates
+        is_global = endpoint_templates.is_global == True
         if tenant_id:
-            ep = aliased(models.Endpoints)
-            q1 = session.query(endpoint_templates).join((ep,
-                ep.endpoint_template_id == endpoint_templates.id)).\
-                filter(ep.tenant_id == tenant_id)
-            q = q.union(q1)
-        return q.all()
+            tenant_templates = session.query(
+                models.Endpoints.endpoint_template_id).\
+                filter(models.Endpoints.tenant_id == tenant_id)
+            criteria = or_(is_global,
+                           endpoint_templates.id.in_(tenant_templates))
+        else:
+            criteria = is_global
+        # load each template's service in the same query
+        return session.query(endpoint_templates).\
+            options(joinedload('service')).\
+            filter(criteria).\
+            order_by(endpoint_templates.id).all()
 
     def get_role_assignments(self, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.TENANT, 'uid_to_id'):
-            tenant_id = TenantAPI.uid_to_id(tenant_id)
+            tenant_id = self.uid_to_id(tenant_id)
 
         results = session.query(models.UserRoleAssociation).\
-            filter_by(tenant_id=tenant_id)
+            filter_by(tenant_id=tenant_id).all()
+
+        if hasattr(api.USER, 'ids_to_uids'):
+            api.USER.ids_to_uids([result.user_id for result in results])
 
         for result in results:
             if hasattr(api.USER, 'uid_to_id'):
@@ -15,9 +15,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from keystone.backends.sqlalchemy import get_session, models
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import and_, or_
+
+from keystone.backends.sqlalchemy import get_session, models, aliased, \
+    on_replica
 from keystone.backends import api
-from keystone.models import Token
+from keystone.backends.sqlalchemy.api.role import RoleAPI
+from keystone.backends.sqlalchemy.api.tenant import TenantAPI
+from keystone.backends.sqlalchemy.api.user import UserAPI
+from keystone.models import Role, Token, User
+
+# Tokens looked up per query by get_validation_info_multi (this keeps
+# within SQLite's limit of 999 parameters per statement)
+VALIDATION_BATCH_SIZE = 500
 
 
 # pylint: disable=E1103,W0221
@@ -61,6 +74,11 @@ class TokenAPI(api.BaseTokenAPI):
 
     @staticmethod
     def to_model_list(refs):
+        refs = list(refs)
+        if hasattr(api.USER, 'ids_to_uids'):
+            api.USER.ids_to_uids([ref.user_id for ref in refs])
+        if hasattr(api.TENANT, 'ids_to_uids'):
+            api.TENANT.ids_to_uids([ref.tenant_id for ref in refs])
         return [TokenAPI.to_model(ref) for ref in refs]
 
     def create(self, values):
@@ -73,9 +91,13 @@ class TokenAPI(api.BaseTokenAPI):
 
     def get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.Token).filter_by(id=id).first()
+        if result is None and on_replica(session):
+            # the token may have just been issued on the primary
+            result = get_session().query(models.Token).filter_by(id=id).\
+                first()
 
         return TokenAPI.to_model(result)
 
@@ -84,12 +106,12 @@ class TokenAPI(api.BaseTokenAPI):
             session = get_session()
 
         with session.begin():
-            token_ref = self.get(id, session)
-            session.delete(token_ref)
+            session.query(models.Token).filter_by(id=id).\
+                delete(synchronize_session=False)
 
     def get_for_user(self, user_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.USER, 'uid_to_id'):
             user_id = api.USER.uid_to_id(user_id)
@@ -100,6 +122,8 @@ class TokenAPI(api.BaseTokenAPI):
         return TokenAPI.to_model(result)
 
     def get_for_user_by_tenant(self, user_id, tenant_id, session=None):
+        # the token found is handed out again, so it must not be one just
+        # revoked on the primary
         if not session:
             session = get_session()
 
@@ -115,12 +139,160 @@ class TokenAPI(api.BaseTokenAPI):
 
     def get_all(self, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         results = session.query(models.Token).all()
 
         return TokenAPI.to_model_list(results)
 
+    def get_all_for_user(self, user_id, session=None):
+        if not session:
+            session = get_session(read=True)
+
+        if hasattr(api.USER, 'uid_to_id'):
+            user_id = api.USER.uid_to_id(user_id)
+
+        results = session.query(models.Token).filter_by(user_id=user_id).all()
+
+        return TokenAPI.to_model_list(results)
+
+    def delete_all_for_user(self, user_id, session=None):
+        if not session:
+            session = get_session()
+
+        if hasattr(api.USER, 'uid_to_id'):
+            user_id = api.USER.uid_to_id(user_id)
+
+        with session.begin():
+            ids = [row.id for row in session.query(models.Token.id).
+                   filter_by(user_id=user_id)]
+            if ids:
+                session.query(models.Token).\
+                    filter(models.Token.id.in_(ids)).\
+                    delete(synchronize_session=False)
+
+        return ids
+
+    def delete_expired(self, limit=None, session=None):
+        if not session:
+            session = get_session()
+
+        with session.begin():
+            query = session.query(models.Token.id).\
+                filter(models.Token.expires < datetime.now())
+            if limit:
+                query = query.limit(limit)
+            ids = [row.id for row in query]
+            if ids:
+                session.query(models.Token).\
+                    filter(models.Token.id.in_(ids)).\
+                    delete(synchronize_session=False)
+
+        return len(ids)
+
+    @staticmethod
+    def _backends_are_local():
+        """ Whether users, tenants and roles also live in this database """
+        return (isinstance(api.USER, UserAPI) and
+                isinstance(api.TENANT, TenantAPI) and
+                isinstance(api.ROLE, RoleAPI))
+
+    @staticmethod
+    def _query_validation_rows(session, criterion):
+        """ Queries the tokens matching criterion, with their user, tenants
+        and roles; one row per role, tenant roles first """
+        scoped_tenant = aliased(models.Tenant)
+        user_tenant = aliased(models.Tenant)
+        ref = models.UserRoleAssociation
+        return session.query(models.Token, models.User, scoped_tenant,
+                             user_tenant, ref, models.Role).\
+            join((models.User, models.User.id == models.Token.user_id)).\
+            outerjoin((scoped_tenant,
+                       scoped_tenant.id == models.Token.tenant_id)).\
+            outerjoin((user_tenant,
+                       user_tenant.id == models.User.tenant_id)).\
+            outerjoin((ref, and_(
+                ref.user_id == models.User.id,
+                or_(ref.tenant_id == None,
+                    ref.tenant_id == models.Token.tenant_id)))).\
+            outerjoin((models.Role, models.Role.id == ref.role_id)).\
+            filter(criterion).\
+            order_by(models.Token.id, ref.tenant_id == None, ref.id).\
+            all()
+
+    @staticmethod
+    def _validation_info(rows):
+        """ Assembles the validation info of a token from its rows """
+        (dtoken, duser, dtenant, dusertenant) = rows[0][:4]
+        tenant = TenantAPI.to_model(dtenant)
+        user_tenant_ref = TenantAPI.to_model(dusertenant)
+
+        token = Token(id=dtoken.id, user_id=duser.uid, expires=dtoken.expires,
+                      tenant_id=tenant.id if tenant else None)
+        user = User(id=duser.uid, password=duser.password, name=duser.name,
+            tenant_id=user_tenant_ref.id if user_tenant_ref else None,
+            email=duser.email, enabled=bool(duser.enabled))
+
+        roles = []
+        for row in rows:
+            (drole_ref, drole) = row[4:]
+            if drole_ref is None or drole is None:
+                continue
+            roles.append(Role(id=drole_ref.role_id, name=drole.name,
+                description=drole.desc,
+                tenant_id=token.tenant_id if drole_ref.tenant_id else None))
+
+        return (token, user, tenant, user_tenant_ref, roles)
+
+    def get_validation_info(self, id, session=None):
+        """ Fetches the token, its user, tenants and roles in one query
+
+        Only possible when users, tenants and roles also live in this
+        database; otherwise falls back to the generic implementation.
+        """
+        if not TokenAPI._backends_are_local():
+            return super(TokenAPI, self).get_validation_info(id)
+
+        if not session:
+            session = get_session(read=True)
+
+        rows = TokenAPI._query_validation_rows(session,
+                                               models.Token.id == id)
+        if not rows and on_replica(session):
+            # the token may have just been issued on the primary
+            rows = TokenAPI._query_validation_rows(get_session(),
+                                                   models.Token.id == id)
+        if not rows:
+            return None
+        return TokenAPI._validation_info(rows)
+
+    def get_validation_info_multi(self, ids, session=None):
+        """ Fetches the tokens, their users, tenants and roles with one
+        query per VALIDATION_BATCH_SIZE tokens """
+        if not TokenAPI._backends_are_local():
+            return super(TokenAPI, self).get_validation_info_multi(ids)
+
+        if not session:
+            session = get_session(read=True)
+
+        ids = list(set(ids))
+        infos = TokenAPI._get_validation_infos(session, ids)
+        if len(infos) < len(ids) and on_replica(session):
+            # some may have just been issued on the primary
+            infos.update(TokenAPI._get_validation_infos(get_session(),
+                [id for id in ids if id not in infos]))
+        return infos
+
+    @staticmethod
+    def _get_validation_infos(session, ids):
+        infos = {}
+        for i in range(0, len(ids), VALIDATION_BATCH_SIZE):
+            rows = TokenAPI._query_validation_rows(session,
+                models.Token.id.in_(ids[i:i + VALIDATION_BATCH_SIZE]))
+            for (id, token_rows) in groupby(rows, lambda row: row[0].id):
+                infos[id] = TokenAPI._validation_info(list(token_rows))
+        return infos
+
 
 def get():
     return TokenAPI()
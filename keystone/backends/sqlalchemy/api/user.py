@@ -18,9 +18,10 @@
 import uuid
 
 import keystone.backends.backendutils as utils
-from keystone.backends.sqlalchemy import get_session, models, aliased, \
-    joinedload
+from keystone.backends.sqlalchemy import get_session, models, \
+    joinedload, get_page_and_markers, ID_CACHE_SIZE, ID_CACHE_TTL
 from keystone.backends import api
+from keystone.common.cache import LRUCache
 from keystone.models import User
 
 
@@ -28,6 +29,8 @@ from keystone.models import User
 class UserAPI(api.BaseUserAPI):
     def __init__(self, *args, **kw):
         super(UserAPI, self).__init__(*args, **kw)
+        # Maps ('id', pk) -> uid and ('uid', uid) -> pk
+        self.id_cache = LRUCache(maxsize=ID_CACHE_SIZE, ttl=ID_CACHE_TTL)
 
     @staticmethod
     def transpose(ref):
@@ -64,12 +67,16 @@ class UserAPI(api.BaseUserAPI):
 
     @staticmethod
     def to_model_list(refs):
+        refs = list(refs)
+        if hasattr(api.TENANT, 'ids_to_uids'):
+            # translate all tenant ids in one query
+            api.TENANT.ids_to_uids([ref.tenant_id for ref in refs])
         return [UserAPI.to_model(ref) for ref in refs]
 
     # pylint: disable=W0221
     def get_all(self, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         results = session.query(models.User)
 
@@ -83,11 +90,12 @@ class UserAPI(api.BaseUserAPI):
         if user_ref.uid is None:
             user_ref.uid = uuid.uuid4().hex
         user_ref.save()
+        self._uncache_ids(id=user_ref.id, uid=user_ref.uid)
         return UserAPI.to_model(user_ref)
 
     def get(self, id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.User).filter_by(uid=id).first()
 
@@ -105,21 +113,69 @@ class UserAPI(api.BaseUserAPI):
 
         return session.query(models.User).filter_by(id=id).first()
 
-    @staticmethod
-    def id_to_uid(id, session=None):
-        session = session or get_session()
-        user = session.query(models.User).filter_by(id=id).first()
-        return user.uid if user else None
+    def _cache_ids(self, id, uid):
+        self.id_cache.set(('id', id), uid)
+        self.id_cache.set(('uid', uid), id)
 
-    @staticmethod
-    def uid_to_id(uid, session=None):
-        session = session or get_session()
-        user = session.query(models.User).filter_by(uid=uid).first()
-        return user.id if user else None
+    def _uncache_ids(self, id=None, uid=None):
+        if id is not None:
+            self.id_cache.delete(('id', id))
+        if uid is not None:
+            self.id_cache.delete(('uid', uid))
+
+    def id_to_uid(self, id, session=None):
+        if id is None:
+            return None
+        uid = self.id_cache.get(('id', id))
+        if uid is None:
+            session = session or get_session()
+            user = session.query(models.User).filter_by(id=id).first()
+            if not user:
+                return None
+            uid = user.uid
+            self._cache_ids(user.id, uid)
+        return uid
+
+    def uid_to_id(self, uid, session=None):
+        if uid is None:
+            return None
+        id = self.id_cache.get(('uid', uid))
+        if id is None:
+            session = session or get_session()
+            user = session.query(models.User).filter_by(uid=uid).first()
+            if not user:
+                return None
+            id = user.id
+            self._cache_ids(id, user.uid)
+        return id
+
+    def ids_to_uids(self, ids, session=None):
+        """Translates a list of PKs, querying only for uncached ones
+
+        Returns a dict of id -> uid; unknown ids are left out.
+        """
+        result = {}
+        missing = set()
+        for id in ids:
+            if id is None:
+                continue
+            uid = self.id_cache.get(('id', id))
+            if uid is None:
+                missing.add(id)
+            else:
+                result[id] = uid
+        if missing:
+            session = session or get_session()
+            rows = session.query(models.User.id, models.User.uid).\
+                filter(models.User.id.in_(missing)).all()
+            for (id, uid) in rows:
+                self._cache_ids(id, uid)
+                result[id] = uid
+        return result
 
     def get_by_name(self, name, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.User).filter_by(name=name).first()
 
@@ -127,64 +183,26 @@ class UserAPI(api.BaseUserAPI):
 
     def get_by_email(self, email, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         result = session.query(models.User).filter_by(email=email).first()
 
         return UserAPI.to_model(result)
 
     def get_page(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
-
-        if marker:
-            results = session.query(models.User).filter("id>:marker").params(\
-                    marker='%s' % marker).order_by(\
-                    models.User.id.desc()).limit(limit).all()
-        else:
-            results = session.query(models.User).order_by(\
-                                models.User.id.desc()).limit(limit).all()
+        return self.get_page_with_markers(marker, limit, session)[0]
 
-        return UserAPI.to_model_list(results)
-
-    # pylint: disable=R0912
     def get_page_markers(self, marker, limit, session=None):
+        return self.get_page_with_markers(marker, limit, session)[1:]
+
+    def get_page_with_markers(self, marker, limit, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
-        first = session.query(models.User).order_by(\
-                            models.User.id).first()
-        last = session.query(models.User).order_by(\
-                            models.User.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(models.User).filter("id > :marker").params(\
-                        marker='%s' % marker).order_by(\
-                        models.User.id).limit(limit).all()
-        prev_page = session.query(models.User).filter("id < :marker").params(\
-                        marker='%s' % marker).order_by(\
-                        models.User.id.desc()).limit(int(limit)).all()
-        if len(next_page) == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if len(prev_page) == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if prev_page.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if next_page.id == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+        (results, prev, next) = get_page_and_markers(
+            session.query(models.User), models.User.id, marker, limit)
+
+        return (UserAPI.to_model_list(results), prev, next)
 
     def user_roles_by_tenant(self, user_id, tenant_id, session=None):
         if not session:
@@ -218,6 +236,8 @@ class UserAPI(api.BaseUserAPI):
             utils.set_hashed_password(values)
             user_ref.update(values)
             user_ref.save(session=session)
+        if 'uid' in values:
+            self._uncache_ids(id=user_ref.id, uid=id)
 
     def delete(self, id, session=None):
         if not session:
@@ -226,10 +246,11 @@ class UserAPI(api.BaseUserAPI):
         with session.begin():
             user_ref = session.query(models.User).filter_by(uid=id).first()
             session.delete(user_ref)
+        self._uncache_ids(id=user_ref.id, uid=id)
 
     def get_by_tenant(self, id, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         uid = id
 
@@ -273,7 +294,7 @@ class UserAPI(api.BaseUserAPI):
 
     def users_get_by_tenant(self, user_id, tenant_id, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.USER, 'uid_to_id'):
             user_id = api.USER.uid_to_id(user_id)
@@ -311,102 +332,54 @@ class UserAPI(api.BaseUserAPI):
         return UserAPI.to_model(result)
 
     def users_get_page(self, marker, limit, session=None):
-        if not session:
-            session = get_session()
+        return self.users_get_page_with_markers(marker, limit, session)[0]
 
-        user = aliased(models.User)
-        if marker:
-            results = session.query(user).\
-                                filter("id>=:marker").params(
-                                marker='%s' % marker).order_by(
-                                "id").limit(limit).all()
-        else:
-            results = session.query(user).\
-                                order_by("id").limit(limit).all()
-
-        return UserAPI.to_model_list(results)
-
-    # pylint: disable=R0912
     def users_get_page_markers(self, marker, limit, session=None):
+        return self.users_get_page_with_markers(marker, limit, session)[1:]
+
+    def users_get_page_with_markers(self, marker, limit, session=None):
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
-        user = aliased(models.User)
-        first = session.query(user).\
-                        order_by(user.id).first()
-        last = session.query(user).\
-                            order_by(user.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = session.query(user).\
-                        filter("id > :marker").params(\
-                        marker='%s' % marker).order_by(user.id).\
-                        limit(int(limit)).all()
-        prev_page = session.query(user).\
-                        filter("id < :marker").params(
-                        marker='%s' % marker).order_by(
-                        user.id.desc()).limit(int(limit)).all()
-        next_len = len(next_page)
-        prev_len = len(prev_page)
-
-        if next_len == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if prev_len == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if first.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if marker == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+        (results, prev, next) = get_page_and_markers(
+            session.query(models.User), models.User.id, marker, limit,
+            descending=False)
+
+        return (UserAPI.to_model_list(results), prev, next)
 
     def users_get_by_tenant_get_page(self, tenant_id, role_id, marker, limit,
             session=None):
+        return self.users_get_by_tenant_get_page_with_markers(tenant_id,
+            role_id, marker, limit, session)[0]
+
+    def users_get_by_tenant_get_page_markers(self, tenant_id, \
+            role_id, marker, limit, session=None):
+        return self.users_get_by_tenant_get_page_with_markers(tenant_id,
+            role_id, marker, limit, session)[1:]
+
+    def users_get_by_tenant_get_page_with_markers(self, tenant_id, role_id,
+            marker, limit, session=None):
         # This is broken.  If a user has more than one role per project
         # shit hits the fan because we're limiting the wrong model.
-        # Also the user lookup is nasty and potentially injectiable.
         if not session:
-            session = get_session()
+            session = get_session(read=True)
 
         if hasattr(api.TENANT, 'uid_to_id'):
             tenant_id = api.TENANT.uid_to_id(tenant_id)
 
-        user = aliased(models.UserRoleAssociation)
-        query = session.query(user).\
-            filter("tenant_id = :tenant_id").\
-            params(tenant_id='%s' % tenant_id)
-
+        query = session.query(models.UserRoleAssociation).\
+            filter(models.UserRoleAssociation.tenant_id == tenant_id)
         if role_id:
             query = query.filter(
-                user.role_id == role_id)
-
-        if marker:
-            rv = query.filter("id>=:marker").\
-                         params(marker='%s' % marker).\
-                         order_by("id").\
-                         limit(limit).\
-                         all()
-        else:
-            rv = query.\
-                         order_by("id").\
-                         limit(limit).\
-                         all()
+                models.UserRoleAssociation.role_id == role_id)
+        (rv, prev, next) = get_page_and_markers(query,
+            models.UserRoleAssociation.id, marker, limit, descending=False)
 
-        user_ids = set([str(assoc.user_id) for assoc in rv])
-        users = session.query(models.User).\
-                      filter("id in ('%s')" % "','".join(user_ids)).\
-                      all()
+        user_ids = set([assoc.user_id for assoc in rv])
+        users = []
+        if user_ids:
+            users = session.query(models.User).\
+                filter(models.User.id.in_(user_ids)).all()
 
         for usr in users:
             usr.tenant_roles = set()
@@ -414,61 +387,7 @@ class UserAPI(api.BaseUserAPI):
                 if role.tenant_id == tenant_id:
                     usr.tenant_roles.add(role.role_id)
 
-        return UserAPI.to_model_list(users)
-
-    # pylint: disable=R0912
-    def users_get_by_tenant_get_page_markers(self, tenant_id, \
-            role_id, marker, limit, session=None):
-        if not session:
-            session = get_session()
-
-        if hasattr(api.TENANT, 'uid_to_id'):
-            tenant_id = api.TENANT.uid_to_id(tenant_id)
-
-        user = aliased(models.UserRoleAssociation)
-        query = session.query(user).\
-                        filter(user.tenant_id == tenant_id)
-        if role_id:
-            query = query.filter(
-                user.role_id == role_id)
-        first = query.\
-            order_by(user.id).first()
-        last = query.\
-            order_by(user.id.desc()).first()
-        if first is None:
-            return (None, None)
-        if marker is None:
-            marker = first.id
-        next_page = query.\
-            filter("id > :marker").params(\
-            marker='%s' % marker).order_by(user.id).\
-            limit(int(limit)).all()
-        prev_page = query.\
-            filter("id < :marker").params(
-            marker='%s' % marker).order_by(
-            user.id.desc()).limit(int(limit)).all()
-        next_len = len(next_page)
-        prev_len = len(prev_page)
-
-        if next_len == 0:
-            next_page = last
-        else:
-            for t in next_page:
-                next_page = t
-        if prev_len == 0:
-            prev_page = first
-        else:
-            for t in prev_page:
-                prev_page = t
-        if first.id == marker:
-            prev_page = None
-        else:
-            prev_page = prev_page.id
-        if marker == last.id:
-            next_page = None
-        else:
-            next_page = next_page.id
-        return (prev_page, next_page)
+        return (UserAPI.to_model_list(users), prev, next)
 
     def check_password(self, user, password):
         return utils.check_password(password, user.password)
@@ -0,0 +1,41 @@
+"""
+Adds indexes on tokens, so that looking up a user's latest token and
+purging expired tokens do not scan the whole table
+"""
+# pylint: disable=C0103
+
+
+import sqlalchemy
+
+
+meta = sqlalchemy.MetaData()
+
+
+# define the previous state of tokens
+
+token = {}
+token['id'] = sqlalchemy.Column('id', sqlalchemy.String(255),
+    primary_key=True, unique=True)
+token['user_id'] = sqlalchemy.Column('user_id', sqlalchemy.Integer)
+token['tenant_id'] = sqlalchemy.Column('tenant_id', sqlalchemy.Integer)
+token['expires'] = sqlalchemy.Column('expires', sqlalchemy.DateTime)
+tokens = sqlalchemy.Table('tokens', meta, *token.values())
+
+user_tenant_expires_index = sqlalchemy.Index(
+    'ix_tokens_user_id_tenant_id_expires',
+    token['user_id'], token['tenant_id'], token['expires'])
+expires_index = sqlalchemy.Index('ix_tokens_expires', token['expires'])
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+
+    user_tenant_expires_index.create(migrate_engine)
+    expires_index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+
+    expires_index.drop(migrate_engine)
+    user_tenant_expires_index.drop(migrate_engine)
@@ -0,0 +1,37 @@
+"""
+Adds the revocations table, an append-only record of revoked tokens, users
+and tenants that services poll to evict what they have cached
+"""
+# pylint: disable=C0103
+
+
+import sqlalchemy
+
+
+meta = sqlalchemy.MetaData()
+
+
+revocation = {}
+revocation['id'] = sqlalchemy.Column('id', sqlalchemy.Integer,
+    primary_key=True, autoincrement=True)
+revocation['token_id'] = sqlalchemy.Column('token_id',
+    sqlalchemy.String(255))
+revocation['user_id'] = sqlalchemy.Column('user_id', sqlalchemy.String(255))
+revocation['tenant_id'] = sqlalchemy.Column('tenant_id',
+    sqlalchemy.String(255))
+revocation['created'] = sqlalchemy.Column('created', sqlalchemy.DateTime,
+    index=True)
+revocations = sqlalchemy.Table('revocations', meta, *revocation.values(),
+    sqlite_autoincrement=True)
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+
+    revocations.create()
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+
+    revocations.drop()
@@ -15,7 +15,7 @@
 # limitations under the License.
 
 from sqlalchemy import Column, String, Integer, ForeignKey, \
-    UniqueConstraint, Boolean, DateTime
+    UniqueConstraint, Boolean, DateTime, Index
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, object_mapper
@@ -161,10 +161,25 @@ class Credentials(Base, KeystoneBase):
 class Token(Base, KeystoneBase):
     __tablename__ = 'tokens'
     __api__ = 'token'
+    __table_args__ = (
+        Index('ix_tokens_user_id_tenant_id_expires',
+              'user_id', 'tenant_id', 'expires'), {})
     id = Column(String(255), primary_key=True, unique=True)
     user_id = Column(Integer)
     tenant_id = Column(Integer)
-    expires = Column(DateTime)
+    expires = Column(DateTime, index=True)
+
+
+class Revocation(Base, KeystoneBase):
+    __tablename__ = 'revocations'
+    __api__ = 'revocation'
+    # ids are never reused, even after the latest rows are deleted
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    token_id = Column(String(255))
+    user_id = Column(String(255))
+    tenant_id = Column(String(255))
+    created = Column(DateTime, index=True)
 
 
 class EndpointTemplates(Base, KeystoneBase):
@@ -181,3 +196,5 @@ class EndpointTemplates(Base, KeystoneBase):
     version_id = Column(String(20))
     version_list = Column(String(2000))
     version_info = Column(String(500))
+
+    service = relationship('Service')
@@ -14,10 +14,10 @@
 
 """Python HTTP clients for accessing Keystone's Service and Admin APIs."""
 
-import httplib
 import json
 
 import keystone.common.exception
+from keystone.common.bufferedhttp import http_request
 
 
 class ServiceClient(object):
@@ -52,17 +52,12 @@ class ServiceClient(object):
         :returns: httplib.HTTPResponse object
 
         """
-        if (self.is_ssl):
-            connection = httplib.HTTPSConnection(self.auth_address,
-                                                 cert_file=self.cert_file)
-        else:
-            connection = httplib.HTTPConnection(self.auth_address)
-        connection.request(verb, path, body=body, headers=headers)
-
-        response = connection.getresponse()
-        response.body = response.read()
+        (response, data) = http_request(self.host, self.port, verb, path,
+                                        headers=headers, body=body,
+                                        ssl=self.is_ssl,
+                                        cert_file=self.cert_file)
+        response.body = data
         status_int = int(response.status)
-        connection.close()
 
         if status_int < 200 or status_int >= 300:
             msg = "Client received HTTP %d" % status_int
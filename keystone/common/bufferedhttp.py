@@ -17,7 +17,9 @@
 Monkey Patch httplib.HTTPResponse to buffer reads of headers. This can improve
 performance when making large numbers of small HTTP requests.  This module
 also provides helper functions to make HTTP connections using
-BufferedHTTPResponse.
+BufferedHTTPResponse, and a pool of keep-alive connections (see
+http_request) so that repeated calls to the same server do not pay for a
+new TCP/SSL handshake every time.
 
 .. warning::
 
@@ -27,14 +29,25 @@ BufferedHTTPResponse.
 """
 
 from urllib import quote
+import errno
 import logging
+import select
+import socket
+import threading
 import time
 
 # pylint: disable=E0611
-from eventlet.green.httplib import CONTINUE, HTTPConnection, HTTPMessage, \
-    HTTPResponse, HTTPSConnection, _UNKNOWN
+from eventlet.green.httplib import BadStatusLine, CONTINUE, HTTPConnection, \
+    HTTPException, HTTPMessage, HTTPResponse, HTTPSConnection, _UNKNOWN
 
 DEFAULT_TIMEOUT = 30
+# Idle connections kept per (host, port, ssl, key, cert) by the default pool
+DEFAULT_POOL_SIZE = 10
+# Seconds after which an idle pooled connection is closed instead of reused
+DEFAULT_IDLE_TIMEOUT = 60
+# Methods that http_request sends again if the server closed a reused
+# connection instead of answering
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
 
 
 # pylint: disable=R0902
@@ -159,14 +172,7 @@ def http_connect_raw(ipaddr, port, method, path, headers=None,
     :param cert_file: Certificate file (Keystore)
     :returns: HTTPConnection object
     """
-    if timeout is None:
-        timeout = DEFAULT_TIMEOUT
-    if ssl:
-        conn = HTTPSConnection('%s:%s' % (ipaddr, port), key_file=key_file,
-                               cert_file=cert_file, timeout=timeout)
-    else:
-        conn = BufferedHTTPConnection('%s:%s' % (ipaddr, port),
-                                      timeout=timeout)
+    conn = _new_connection(ipaddr, port, ssl, key_file, cert_file, timeout)
     if query_string:
         path += '?' + query_string
     conn.path = path
@@ -178,3 +184,182 @@ def http_connect_raw(ipaddr, port, method, path, headers=None,
     # pylint: disable=E1103
     conn.endheaders()
     return conn
+
+
+def _new_connection(ipaddr, port, ssl=False, key_file=None, cert_file=None,
+                    timeout=None):
+    if timeout is None:
+        timeout = DEFAULT_TIMEOUT
+    if ssl:
+        return HTTPSConnection('%s:%s' % (ipaddr, port), key_file=key_file,
+                               cert_file=cert_file, timeout=timeout)
+    else:
+        return BufferedHTTPConnection('%s:%s' % (ipaddr, port),
+                                      timeout=timeout)
+
+
+def _dropped(conn):
+    """Whether the server closed an idle connection (it has nothing else to
+    say until it gets a request)"""
+    if conn.sock is None:
+        return False
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (select.error, socket.error, ValueError):
+        return True
+
+
+def _not_processed(error):
+    """Whether a request that failed with error never reached the server:
+    the connection was reset, or closed before any of the response was
+    read. A timeout tells nothing, the server may still be at it."""
+    if isinstance(error, socket.timeout):
+        return False
+    if isinstance(error, BadStatusLine):
+        return not error.line.strip("'") or \
+            error.line.startswith('No status line received')
+    return isinstance(error, socket.error) and \
+        getattr(error, 'errno', None) in (errno.ECONNRESET, errno.EPIPE)
+
+
+class HTTPConnectionPool(object):
+    """Keeps idle keep-alive connections around for reuse
+
+    Connections are keyed by (host, port, ssl, key_file, cert_file). At most
+    max_size idle connections are kept per key, and connections that have
+    been idle for more than idle_timeout seconds are closed rather than
+    reused. A connection belongs to whoever checked it out until it is put
+    back, so the pool can be shared between threads and greenthreads.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.created = 0
+        self.reused = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, ipaddr, port, ssl=False, key_file=None, cert_file=None,
+            timeout=None):
+        """Returns an idle connection to the server, or a new one"""
+        key = (ipaddr, port, ssl, key_file, cert_file)
+        while True:
+            now = time.time()
+            conn = None
+            with self._lock:
+                idle = self._idle.get(key, [])
+                expired = [c for c, used in idle
+                           if now - used > self.idle_timeout]
+                idle[:] = [(c, used) for c, used in idle
+                           if now - used <= self.idle_timeout]
+                if idle:
+                    conn = idle.pop()[0]
+            for stale in expired:
+                stale.close()
+            if conn is None or not _dropped(conn):
+                break
+            conn.close()
+
+        with self._lock:
+            if conn is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if conn is None:
+            conn = _new_connection(ipaddr, port, ssl, key_file, cert_file,
+                                   timeout)
+        else:
+            conn.timeout = timeout if timeout is not None else \
+                DEFAULT_TIMEOUT
+            if conn.sock:
+                conn.sock.settimeout(conn.timeout)
+        conn.pool_key = key
+        return conn
+
+    def put(self, conn):
+        """Returns a connection whose response has been fully read"""
+        with self._lock:
+            idle = self._idle.setdefault(conn.pool_key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def clear(self):
+        """Closes all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.itervalues():
+            for conn, _used in conns:
+                conn.close()
+
+
+POOL = HTTPConnectionPool()
+
+
+# pylint: disable=R0913
+def http_request(ipaddr, port, method, path, headers=None, body=None,
+                 query_string=None, ssl=False, key_file=None, cert_file=None,
+                 timeout=None, pool=None):
+    """
+    Helper function to make a request over a pooled keep-alive connection.
+    The response is read in full before the connection goes back to the
+    pool. If the server closed a reused connection instead of answering
+    (it may have timed it out in the meantime), a request whose method is
+    in IDEMPOTENT_METHODS is sent again on another connection; anything
+    else, including a timeout, is raised.
+
+    :param ipaddr: IPv4 address to connect to
+    :param port: port to connect to
+    :param method: HTTP method to request ('GET', 'PUT', 'POST', etc.)
+    :param path: request path
+    :param headers: dictionary of headers
+    :param body: request body
+    :param query_string: request query string
+    :param ssl: set True if SSL should be used (default: False)
+    :param key_file: Private key file (not needed if cert_file has private key)
+    :param cert_file: Certificate file (Keystore)
+    :param pool: HTTPConnectionPool to use (default: the shared POOL)
+    :returns: (HTTPResponse object, response body)
+    """
+    if pool is None:
+        pool = POOL
+    headers = dict(headers or {})
+    if body is not None and 'Content-Length' not in headers:
+        headers['Content-Length'] = str(len(body))
+    if query_string:
+        path += '?' + query_string
+
+    while True:
+        conn = pool.get(ipaddr, port, ssl, key_file, cert_file, timeout)
+        reused = conn.sock is not None
+        try:
+            # pylint: disable=W0201
+            conn._connected_time = time.time()
+            conn.path = path
+            conn.putrequest(method, path)
+            # pylint: disable=E1103
+            for header, value in headers.iteritems():
+                conn.putheader(header, value)
+            conn.endheaders()
+            if body is not None:
+                conn.send(body)
+            resp = conn.getresponse()
+        except (socket.error, HTTPException) as e:
+            conn.close()
+            if reused and method in IDEMPOTENT_METHODS and \
+                    _not_processed(e):
+                continue
+            raise
+        try:
+            data = resp.read()
+        except (socket.error, HTTPException):
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            pool.put(conn)
+        return (resp, data)
@@ -0,0 +1,181 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2010-2011 OpenStack, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Small in-process caches.
+
+LRUCache is a bounded mapping that evicts the least recently used entry
+once it is full, and can optionally expire entries after a fixed time.
+It is safe to share between threads and greenthreads: nothing inside the
+lock can yield.
+
+SingleFlight coalesces concurrent calls for the same key, so a burst of
+greenthreads missing the same cache entry results in one backend call.
+"""
+
+import collections
+import sys
+import threading
+import time
+
+from eventlet import event
+
+
+class LRUCache(object):
+    """A bounded, thread-safe least recently used cache
+
+    maxsize -- maximum number of entries kept
+    ttl -- optional number of seconds after which an entry expires
+    on_evict -- optional callable, called with the key and value of each
+                entry dropped because the cache was full, it expired or
+                another value was set for its key (outside the lock).
+                Expired entries are found when they are looked up, or by
+                purge().
+    """
+
+    def __init__(self, maxsize=1000, ttl=None, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default"""
+        with self._lock:
+            try:
+                (expires, value) = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.time():
+                self.misses += 1
+                evicted = [(key, value)]
+            else:
+                # re-insert to mark as most recently used
+                self._data[key] = (expires, value)
+                self.hits += 1
+                return value
+        self._evicted(evicted)
+        return default
+
+    def set(self, key, value, ttl=None):
+        """Caches value under key. ttl overrides the cache's default"""
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+        evicted = []
+        with self._lock:
+            replaced = self._data.pop(key, None)
+            if replaced is not None and replaced[1] is not value:
+                evicted.append((key, replaced[1]))
+            self._data[key] = (expires, value)
+            while len(self._data) > self.maxsize:
+                (old_key, (_expires, old_value)) = \
+                    self._data.popitem(last=False)
+                evicted.append((old_key, old_value))
+                self.evictions += 1
+        self._evicted(evicted)
+
+    def purge(self):
+        """Drops the entries that have expired"""
+        now = time.time()
+        with self._lock:
+            evicted = [(key, value) for key, (expires, value) in
+                       self._data.iteritems()
+                       if expires is not None and expires <= now]
+            for (key, _value) in evicted:
+                del self._data[key]
+        self._evicted(evicted)
+
+    def _evicted(self, evicted):
+        if self.on_evict is not None:
+            for (key, value) in evicted:
+                self.on_evict(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Returns a list of the (key, value) pairs that have not expired,
+        least recently used first. Neither counted nor marked as used"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (expires, value) in
+                    self._data.iteritems()
+                    if expires is None or expires > now]
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Returns a dict of counters, handy for logging and tests"""
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+
+class SingleFlight(object):
+    """Runs at most one call per key at a time
+
+    Greenthreads calling do() with a key that is already in flight wait for
+    that call and share its result, or re-raise its exception, instead of
+    making their own. coalesced counts the calls that were saved.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                leader = True
+                call = self._calls[key] = event.Event()
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            (result, exc_info) = call.wait()
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            return result
+
+        result, exc_info = None, None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except BaseException:
+            exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.send((result, exc_info))
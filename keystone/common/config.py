@@ -87,6 +87,11 @@ for a config file.""")
                      default="0.0.0.0", dest="bind_host",
                      help="specifies host address to listen on "\
                             "(default is all or 0.0.0.0)")
+    group.add_option('--workers', default=None, dest="workers",
+                     metavar="N",
+                     help="number of worker processes to fork and serve "\
+                            "requests from (default is 0, serve from the "\
+                            "main process)")
     # This one is handled by keystone/tools/tracer.py (if loaded)
     group.add_option('-t', '--trace-calls', default=False,
                      dest="trace_calls",
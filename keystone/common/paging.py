@@ -0,0 +1,144 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 OpenStack, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pages through the results of a search the server sorted by id.
+
+PageCursor knows nothing about the protocol spoken: it reads (dn, attrs)
+results from any iterator (see LDAPWrapper.paged_search in
+keystone.backends.ldap.api).
+"""
+
+import collections
+
+
+class ResultsOutOfOrder(Exception):
+    """The server did not sort the ids the way Python compares them"""
+    pass
+
+
+class PageCursor(object):
+    """Reads the results of a sorted search one page at a time
+
+    Gives the same pages and markers as BaseLdapAPI._get_page and
+    _get_page_markers (keystone.backends.ldap.api.base), but only keeps
+    the entries of the current page and the ids of the ones just before
+    it. After each page, it is left where the next page (the one starting
+    at the next marker) begins.
+
+    release(reusable) is called by close() to give back the connection the
+    search runs on; it is reusable once all results were read.
+
+    Markers are compared with the ids as Python does, so the results must
+    come in that order; ResultsOutOfOrder is raised on reading one that
+    does not.
+    """
+
+    def __init__(self, results, dn_to_id, limit, release):
+        self.results = results
+        self.release = release
+        self.dn_to_id = dn_to_id
+        self.limit = limit
+        # index of the next entry to read, and entries put back
+        self.index = 0
+        self.pending = collections.deque()
+        # (index, id) of the last entries read, enough to find prev after
+        # putting back the two read past a page
+        self.recent = collections.deque(maxlen=limit + 3)
+        self.exhausted = False
+        # id of the last result read from the server
+        self.last_id = None
+
+    def _read(self):
+        if self.pending:
+            res = self.pending.popleft()
+            id = self.dn_to_id(res[0])
+        else:
+            try:
+                res = self.results.next()
+            except StopIteration:
+                self.exhausted = True
+                return None
+            id = self.dn_to_id(res[0])
+            if self.last_id is not None and id < self.last_id:
+                raise ResultsOutOfOrder("%r came after %r" %
+                                        (id, self.last_id))
+            self.last_id = id
+        entry = (self.index, id, res)
+        self.index += 1
+        self.recent.append(entry[:2])
+        return entry
+
+    def _read_page(self, first):
+        entries = [first]
+        while len(entries) < self.limit + 2:
+            entry = self._read()
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries
+
+    def _put_back(self, entries):
+        for entry in reversed(entries):
+            self.pending.appendleft(entry[2])
+            self.index -= 1
+            self.recent.pop()
+
+    def _id_at(self, index):
+        for (i, id) in self.recent:
+            if i == index:
+                return id
+
+    def page(self, marker):
+        """Returns (page, prev, next), the page as a list of (dn, attrs)"""
+        limit = self.limit
+        if marker is None:
+            first = self._read()
+            entries = self._read_page(first) if first is not None else []
+            page = [res for (_i, _id, res) in entries[:limit]]
+            if len(entries) <= limit + 1:
+                return (page, None, None)
+            self._put_back(entries[limit:])
+            return (page, None, entries[limit][1])
+
+        # the first entry at or after the marker, else the last one
+        last = None
+        while True:
+            entry = self._read()
+            if entry is None:
+                break
+            last = entry
+            if entry[1] >= marker:
+                break
+        if last is None or (self.exhausted and self.index < limit):
+            return ([], None, None)
+        i = last[0]
+        prv = self._id_at(i - limit) if i > limit else None
+        if self.exhausted:
+            return ([], prv, None)
+
+        entries = self._read_page(last)
+        page = [res for (_i, id, res) in entries if id > marker][:limit]
+        if self.exhausted and self.index < limit:
+            return (page, None, None)
+        if self.exhausted and i + limit >= self.index - 1:
+            return (page, prv, None)
+        self._put_back(entries[limit:])
+        return (page, prv, entries[limit][1])
+
+    def close(self):
+        self.release(self.exhausted)
@@ -0,0 +1,174 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 OpenStack, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A bounded pool of connections to a server, shared by greenthreads.
+
+ConnectionPool knows nothing about the protocol spoken: subclasses say how
+to check that an idle connection still works, how to close one, which
+errors mean the server went away and what to raise when no connection
+frees up in time (see keystone.backends.ldap.api.LDAPConnectionPool).
+"""
+
+import collections
+import os
+import time
+
+from eventlet import semaphore
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """A bounded pool of connections
+
+    At most size connections are open at once; greenthreads that find them
+    all in use wait up to timeout seconds for one to come back. Connections
+    older than max_lifetime seconds are closed rather than reused, and one
+    that sat idle for check_interval seconds or more is checked with
+    is_healthy() before it is handed out.
+
+    connect -- callable returning a new connection
+    """
+
+    # errors after which a connection, and the idle ones, are dropped
+    server_down_errors = ()
+
+    def __init__(self, connect, size=10, max_lifetime=600, check_interval=30,
+                 timeout=30):
+        self.connect = connect
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.timeout = timeout
+        # (connection, created, last_used), most recently used last
+        self._free = collections.deque()
+        self._slots = semaphore.Semaphore(size)
+        self._pid = os.getpid()
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.reconnects = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def is_healthy(self, conn):
+        """Whether an idle connection can still be used"""
+        return True
+
+    def close_connection(self, conn):
+        conn.close()
+
+    def timed_out(self):
+        """Returns the exception raised when no connection is free"""
+        return PoolTimeout("No connection free after %s seconds" %
+                           (self.timeout,))
+
+    def get(self):
+        """Checks out a connection; give it back with put()"""
+        if not self._slots.acquire(blocking=False):
+            start = time.time()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            self.waits += 1
+            self.wait_time += time.time() - start
+            if not acquired:
+                raise self.timed_out()
+        try:
+            item = self._get_free()
+            if item is None:
+                item = (self.connect(), time.time())
+                self.created += 1
+            else:
+                self.reused += 1
+        except:
+            self._slots.release()
+            raise
+        self.in_use += 1
+        return item
+
+    def _get_free(self):
+        if self._pid != os.getpid():
+            # forked into a worker: the parent's connections are its own,
+            # so abandon them without closing them
+            self._pid = os.getpid()
+            self._free.clear()
+        now = time.time()
+        while self._free:
+            (conn, created, last_used) = self._free.pop()
+            if now - created >= self.max_lifetime:
+                self._close(conn)
+            elif now - last_used >= self.check_interval and \
+                    not self.is_healthy(conn):
+                self._close(conn)
+            else:
+                return (conn, created)
+        return None
+
+    def put(self, item, broken=False):
+        """Returns a connection from get(); a broken one is closed"""
+        (conn, created) = item
+        self.in_use -= 1
+        try:
+            if broken or time.time() - created >= self.max_lifetime:
+                self._close(conn)
+            else:
+                self._free.append((conn, created, time.time()))
+        finally:
+            self._slots.release()
+
+    def call(self, method, *args):
+        """Calls method on a pooled connection
+
+        If the server went away, the idle connections are dropped too and
+        the call is made once more on a new connection.
+        """
+        for retry in (False, True):
+            item = self.get()
+            try:
+                result = getattr(item[0], method)(*args)
+            except self.server_down_errors:
+                self.put(item, broken=True)
+                self.clear()
+                if retry:
+                    raise
+                self.reconnects += 1
+                continue
+            except:
+                self.put(item)
+                raise
+            self.put(item)
+            return result
+
+    def _close(self, conn):
+        self.discarded += 1
+        self.close_connection(conn)
+
+    def clear(self):
+        """Closes the idle connections"""
+        while self._free:
+            self._close(self._free.pop()[0])
+
+    def stats(self):
+        """Returns a dict of counters, handy for logging and tests"""
+        return {'size': self.size, 'in_use': self.in_use,
+                'idle': len(self._free), 'created': self.created,
+                'reused': self.reused, 'discarded': self.discarded,
+                'reconnects': self.reconnects, 'waits': self.waits,
+                'wait_time': self.wait_time}
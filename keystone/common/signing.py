@@ -0,0 +1,87 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2011 OpenStack LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Signed tokens
+
+A signed token is a CMS (PKCS #7) signed-data message holding some text,
+base64 encoded with the URL safe alphabet. Anyone holding the signing
+certificate can check it and read the text without asking Keystone.
+
+Messages are signed and verified with the openssl command line tool, run
+through eventlet so that other greenthreads keep running meanwhile.
+"""
+
+import base64
+
+from eventlet.green import subprocess
+
+
+OPENSSL = 'openssl'
+
+# Every DER encoded signed-data message starts with a SEQUENCE long enough
+# to need a two byte length, which base64 encodes to 'MII'
+SIGNED_TOKEN_PREFIX = 'MII'
+
+
+class SigningError(Exception):
+    pass
+
+
+def is_signed(token_id):
+    """Tells signed tokens apart from the opaque (uuid) ones"""
+    return bool(token_id) and token_id.startswith(SIGNED_TOKEN_PREFIX)
+
+
+def _openssl(args, data):
+    try:
+        process = subprocess.Popen([OPENSSL] + args, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError as e:
+        raise SigningError("Could not run %s: %s" % (OPENSSL, e))
+    (output, errors) = process.communicate(data)
+    if process.returncode:
+        raise SigningError(errors.strip() or
+                           "%s exited with %s" % (OPENSSL,
+                                                  process.returncode))
+    return output
+
+
+def sign(text, certfile, keyfile):
+    """Returns a token holding text, signed with the key in keyfile whose
+    certificate is in certfile (both PEM encoded)"""
+    der = _openssl(['cms', '-sign', '-signer', certfile, '-inkey', keyfile,
+                    '-outform', 'DER', '-md', 'sha256', '-nodetach',
+                    '-nocerts', '-noattr', '-nosmimecap', '-binary'], text)
+    return base64.urlsafe_b64encode(der)
+
+
+def verify(token, certfile, ca_certs=None):
+    """Returns the text held by a token signed by the owner of the
+    certificate in certfile. The certificate must be issued by one in
+    ca_certs, or be self-signed if ca_certs is not given.
+
+    Raises SigningError if the token was not signed by that key, or was
+    tampered with. Certificates embedded in the token are ignored, so one
+    issued by the same CA to someone else does not pass.
+    """
+    try:
+        der = base64.urlsafe_b64decode(str(token))
+    except (TypeError, UnicodeEncodeError):
+        raise SigningError("Not a signed token")
+    return _openssl(['cms', '-verify', '-inform', 'DER', '-nointern',
+                     '-certfile', certfile, '-CAfile', ca_certs or certfile,
+                     '-binary'], der)
@@ -21,13 +21,18 @@
 Utility methods for working with WSGI servers
 """
 
+import errno
 import json
 import logging
+import os
+import signal
 import sys
 import datetime
 import ssl
+import time
 
 import eventlet.wsgi
+import greenlet
 eventlet.patcher.monkey_patch(all=False, socket=True)
 import routes.middleware
 from webob import Response
@@ -84,25 +89,53 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+# Seconds a worker waits for in-flight requests when told to stop
+WORKER_DRAIN_TIMEOUT = 30
+
+# Workers that die sooner than this after being forked are restarted after
+# a pause, so a worker that cannot start does not fork in a tight loop
+WORKER_RESPAWN_DELAY = 1
+
+LOG = logging.getLogger('keystone.common.wsgi')
+
+
 class Server(object):
-    """Server class to manage multiple WSGI sockets and applications."""
+    """Server class to manage multiple WSGI sockets and applications.
+
+    With workers > 0, start() only binds the socket and wait() forks that
+    many worker processes to serve it (see Workers).
+    """
     started = False
 
-    def __init__(self, threads=1000):
+    def __init__(self, threads=1000, workers=0):
         self.pool = eventlet.GreenPool(threads)
         self.socket_info = {}
         self.threads = {}
+        self.workers = workers
+        self.applications = []
 
     def start(self, application, port, host='0.0.0.0', key=None, backlog=128):
         """Run a WSGI server with the given application."""
         socket = eventlet.listen((host, port), backlog=backlog)
-        thread = self.pool.spawn(self._run, application, socket)
+        self._serve(application, socket, key)
+
+    def _serve(self, application, socket, key):
         if key:
             self.socket_info[key] = socket
+        if self.workers:
+            # Served by the workers once they are forked; spawning now
+            # would schedule the server on the parent's hub
+            self.applications.append((application, socket, key))
+            return
+        thread = self.pool.spawn(self._run, application, socket)
+        if key:
             self.threads[key] = thread
 
     def wait(self):
         """Wait until all servers have completed running."""
+        if self.workers:
+            Workers([self], self.workers).run()
+            return
         try:
             self.pool.waitall()
         except KeyboardInterrupt:
@@ -132,10 +165,143 @@ class SslServer(Server):
                                       keyfile=keyfile,
                                       server_side=True, cert_reqs=cert_reqs,
                                       ca_certs=ca_certs)
-        thread = self.pool.spawn(self._run, application, sslsocket)
-        if key:
-            self.socket_info[key] = sslsocket
-            self.threads[key] = thread
+        self._serve(application, sslsocket, key)
+
+
+class Workers(object):
+    """Serves the sockets bound by servers from forked worker processes
+
+    The parent keeps count workers running, forking a new one whenever one
+    dies. Every worker accepts on the same listen sockets, so the kernel
+    spreads connections between them and each gets a core of its own.
+
+    SIGTERM (or SIGINT) is passed on to the workers, which stop accepting,
+    finish the requests they are serving and exit; the parent returns once
+    they are all gone. SIGHUP is passed on the same way, but the parent
+    forks fresh workers to replace the ones that drain.
+
+    Workers share no memory: what one caches is not invalidated by writes
+    served by another, so such caches must expire (see the workers option
+    in etc/keystone.conf for how stale each can get).
+    """
+
+    def __init__(self, servers, count):
+        self.servers = servers
+        self.count = count
+        self.children = {}
+        self.running = False
+        self.signals = []
+        self.respawn_at = 0
+
+    def run(self):
+        """Forks the workers and supervises them until told to stop"""
+        self.running = True
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGHUP, self._handle_signal)
+
+        while self.running or self.children:
+            self._pass_on_signals()
+            while (self.running and len(self.children) < self.count and
+                   time.time() >= self.respawn_at):
+                self._fork()
+            if not self._reap():
+                # eventlet.sleep, so the parent's own greenthreads (e.g.
+                # the expired token purger) keep running
+                eventlet.sleep(0.1)
+
+    def _handle_signal(self, signum, frame):
+        # Acted on by run(); a signal can arrive halfway through a fork
+        self.signals.append(signum)
+
+    def _pass_on_signals(self):
+        while self.signals:
+            signum = self.signals.pop(0)
+            if signum == signal.SIGHUP:
+                self._signal_children(signal.SIGHUP)
+            else:
+                self.running = False
+                self._signal_children(signal.SIGTERM)
+
+    def _signal_children(self, signum):
+        for pid in self.children.keys():
+            try:
+                os.kill(pid, signum)
+            except OSError, e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _fork(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self._run_child()
+            except BaseException:
+                LOG.exception("Worker %s failed", os.getpid())
+                status = 1
+            # never return into the parent's supervision loop
+            os._exit(status)
+        LOG.info("Started worker %s", pid)
+        self.children[pid] = time.time()
+
+    def _reap(self):
+        """Reaps a dead worker, if any. Returns whether one was reaped"""
+        try:
+            (pid, status) = os.waitpid(-1, os.WNOHANG)
+        except OSError, e:
+            if e.errno == errno.ECHILD:
+                self.children.clear()
+            elif e.errno != errno.EINTR:
+                raise
+            return False
+        started = self.children.pop(pid, None)
+        if started is None:
+            return False
+        LOG.info("Worker %s exited with status %s", pid, status)
+        if time.time() - started < WORKER_RESPAWN_DELAY:
+            self.respawn_at = time.time() + WORKER_RESPAWN_DELAY
+        return True
+
+    def _run_child(self):
+        """Serves every application in a fresh hub until signalled"""
+        # The epoll instance of the parent's hub is shared across fork()
+        eventlet.hubs.use_hub()
+        stopping = []
+
+        def stop(signum, frame):
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGHUP, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # caught by the parent's handler between fork() and here
+        stopping.extend(self.signals)
+
+        threads = []
+        for server in self.servers:
+            server.pool = eventlet.GreenPool(server.pool.size)
+            for (application, socket, key) in server.applications:
+                # Not in server.pool, so stopping the server can drain it
+                thread = eventlet.spawn(server._run, application, socket)
+                if key:
+                    server.threads[key] = thread
+                threads.append(thread)
+
+        # Only flag the signal in the handler and act on it here; killing
+        # greenthreads from inside a signal handler is not safe
+        while not stopping and not all(t.dead for t in threads):
+            eventlet.sleep(0.5)
+
+        with eventlet.Timeout(WORKER_DRAIN_TIMEOUT, False):
+            for thread in threads:
+                # stops accepting; wsgi.server then waits for its requests
+                thread.kill()
+            for thread in threads:
+                try:
+                    thread.wait()
+                except greenlet.GreenletExit:
+                    pass
 
 
 class Middleware(object):
@@ -0,0 +1,163 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2011 OpenStack LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Incremental XML writer
+
+Writes XML as it goes, instead of building an lxml element tree and
+serializing it at the end. The output is what etree.tostring() gives for
+the same elements: attributes in the order they are written, the same
+escaping, and character references for anything that is not ASCII.
+
+    writer = XMLWriter()
+    writer.start("tenant")
+    writer.attribute("xmlns", "http://docs.openstack.org/identity/api/v2.0")
+    writer.attribute("id", "1")
+    writer.element("description", text="A tenant")
+    writer.end()
+    xml = writer.getvalue()
+
+Long documents can be handed over in chunks with flush().
+"""
+
+import re
+
+
+# Characters lxml refuses in element text and attribute values
+_INVALID = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_INVALID_BYTES = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x80-\xff]')
+
+
+def _check(value):
+    if isinstance(value, unicode):
+        invalid = _INVALID.search(value)
+    elif isinstance(value, str):
+        invalid = _INVALID_BYTES.search(value)
+    else:
+        raise TypeError("Argument must be bytes or unicode, got '%s'" %
+                        type(value).__name__)
+    if invalid:
+        raise ValueError("All strings must be XML compatible: Unicode or "
+                         "ASCII, no NULL bytes or control characters")
+
+
+def escape_text(value):
+    """Escapes element text the way libxml2 does"""
+    _check(value)
+    value = value.replace("&", "&amp;").replace("<", "&lt;").\
+        replace(">", "&gt;").replace("\r", "&#13;")
+    if isinstance(value, unicode):
+        value = value.encode("ascii", "xmlcharrefreplace")
+    return value
+
+
+def escape_attribute(value):
+    """Escapes an attribute value the way libxml2 does"""
+    _check(value)
+    value = value.replace("&", "&amp;").replace("<", "&lt;").\
+        replace(">", "&gt;").replace('"', "&quot;").\
+        replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    if isinstance(value, unicode):
+        value = value.encode("ascii", "xmlcharrefreplace")
+    return value
+
+
+class XMLWriter(object):
+    """Writes elements one piece at a time
+
+    Attributes are written right after start(), before any text or child
+    element. Elements without content are written as <tag/>.
+    """
+
+    def __init__(self):
+        self.parts = []
+        # bytes written since the last flush()
+        self.size = 0
+        self._tags = []
+        # the last start tag still takes attributes
+        self._open = False
+
+    def _write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+
+    def _close_start_tag(self):
+        if self._open:
+            self._write(">")
+            self._open = False
+
+    def start(self, tag):
+        self._close_start_tag()
+        self._write("<" + tag)
+        self._tags.append(tag)
+        self._open = True
+
+    def attribute(self, name, value):
+        if not self._open:
+            raise ValueError("Attribute %s written after the content of "
+                             "<%s>" % (name, self._tags[-1] if self._tags
+                                       else None))
+        self._write(' %s="%s"' % (name, escape_attribute(value)))
+
+    def text(self, value):
+        self._close_start_tag()
+        self._write(escape_text(value))
+
+    def fragment(self, xml):
+        """Writes a piece of serialized XML as is"""
+        self._close_start_tag()
+        self._write(xml)
+
+    def end(self):
+        tag = self._tags.pop()
+        if self._open:
+            self._write("/>")
+            self._open = False
+        else:
+            self._write("</%s>" % tag)
+
+    def element(self, tag, attributes=(), text=None):
+        """Writes a whole element, given its (name, value) attributes"""
+        self.start(tag)
+        for (name, value) in attributes:
+            self.attribute(name, value)
+        if text is not None:
+            self.text(text)
+        self.end()
+
+    def flush(self):
+        """Returns what was written since the last flush()"""
+        data = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        return data
+
+    def getvalue(self):
+        """Returns the document, once all elements have ended"""
+        return self.flush()
+
+
+def list_chunks(tag, xmlns, items, chunk_size):
+    """Yields <tag xmlns="xmlns"> holding each of items, which are written
+    by their write_xml(writer), in chunks of about chunk_size bytes"""
+    writer = XMLWriter()
+    writer.start(tag)
+    writer.attribute("xmlns", xmlns)
+    for item in items:
+        item.write_xml(writer)
+        if writer.size >= chunk_size:
+            yield writer.flush()
+    writer.end()
+    yield writer.flush()
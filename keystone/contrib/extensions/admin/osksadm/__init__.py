@@ -22,6 +22,7 @@ from keystone.controllers.roles import RolesController
 from keystone.controllers.user import UserController
 from keystone.controllers.tenant import TenantController
 from keystone.controllers.credentials import CredentialsController
+from keystone.controllers.token import TokenController
 
 
 class ExtensionHandler(BaseExtensionHandler):
@@ -125,6 +126,12 @@ class ExtensionHandler(BaseExtensionHandler):
             controller=roles_controller, action="delete_role",
             conditions=dict(method=["DELETE"]))
 
+        #Revocations, polled by services to evict cached tokens
+        token_controller = TokenController(options)
+        mapper.connect("/OS-KSADM/revocations",
+            controller=token_controller, action="get_revocations",
+            conditions=dict(method=["GET"]))
+
         #Credentials Operations
         mapper.connect("/users/{user_id}/OS-KSADM/credentials",
             controller=credentials_controller, action="get_credentials",
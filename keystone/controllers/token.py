@@ -24,6 +24,8 @@ calls from the request routers.
 
 """
 
+from webob import Response
+
 from keystone import utils
 from keystone.common import wsgi
 from keystone.logic.types import auth
@@ -31,6 +33,9 @@ from keystone.logic.types import fault
 from keystone.logic import service
 from . import get_marker_limit_and_url
 
+# Most revocations listed per request
+MAX_REVOCATIONS = 1000
+
 
 class TokenController(wsgi.Controller):
     """Controller for token related operations"""
@@ -65,6 +70,12 @@ class TokenController(wsgi.Controller):
         return utils.send_result(200, req,
             self.identity_service.authenticate_ec2(creds))
 
+    @utils.wrap_error
+    def get_signing_certificate(self, req):
+        """Returns the certificate that signed tokens can be checked with"""
+        return Response(body=self.identity_service.get_signing_certificate(),
+                        content_type="application/x-pem-file")
+
     def _validate_token(self, req, token_id):
         """Validates the token, and that it belongs to the specified tenant"""
         belongs_to = req.GET.get('belongsTo')
@@ -82,6 +93,29 @@ class TokenController(wsgi.Controller):
         self._validate_token(req, token_id)
         return utils.send_result(200, req)
 
+    @utils.wrap_error
+    def validate_tokens(self, req):
+        """Validates a batch of tokens (OS-KSVALIDATE extension)"""
+        validations = utils.get_normalized_request_content(
+            auth.TokenValidations, req)
+        return utils.send_result(200, req,
+            self.identity_service.validate_tokens(utils.get_auth_token(req),
+                validations))
+
+    @utils.wrap_error
+    def get_revocations(self, req):
+        """Lists the revocations recorded after the one given as 'since'
+        (OS-KSADM extension)"""
+        try:
+            since = int(req.GET.get('since', 0))
+            limit = int(req.GET.get('limit', MAX_REVOCATIONS))
+        except ValueError:
+            raise fault.BadRequestFault("Expecting integers for since and "
+                                        "limit")
+        return utils.send_result(200, req,
+            self.identity_service.get_revocations(utils.get_auth_token(req),
+                since, max(0, min(limit, MAX_REVOCATIONS))))
+
     @utils.wrap_error
     def delete_token(self, req, token_id):
         return utils.send_result(204, req,
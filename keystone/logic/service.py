@@ -16,6 +16,10 @@
 # pylint: disable=C0302
 
 from datetime import datetime, timedelta
+import hashlib
+import hmac
+import json
+import os
 import uuid
 import logging
 
@@ -32,15 +36,239 @@ from keystone.logic.types.user import User, User_Update, Users
 from keystone.logic.types.endpoint import Endpoint, Endpoints, \
     EndpointTemplate, EndpointTemplates
 from keystone.logic.types.credential import Credentials, PasswordCredentials
+from keystone.logic.types.revocation import Revocations
 from keystone import utils
+from keystone.common import signing
+from keystone.common.cache import LRUCache, SingleFlight
 # New imports as we refactor old backend design and models
-from keystone.models import Tenant, Token
+from keystone.models import Revocation, Tenant, Token
 from keystone.token import Manager as TokenManager
 from keystone.tenant import Manager as TenantManager
 
 
 LOG = logging.getLogger('keystone.logic.service')
 
+# Concurrent validations of the same token share a single backend lookup
+TOKEN_VALIDATIONS = SingleFlight()
+
+# Rendered service catalogs; invalidated whenever endpoints or services change
+CATALOG_CACHE = auth.CatalogCache()
+
+# How long (in seconds) the authorization context of a caller's token is
+# reused before the token and its global roles are looked up again
+AUTHORIZATION_CACHE_TTL = 5
+AUTHORIZATION_CACHE = LRUCache(maxsize=1000, ttl=AUTHORIZATION_CACHE_TTL)
+
+
+class AuthorizationContext(object):
+    """The validated token of a caller along with its global roles
+
+    Answers role checks from memory, so that the several checks made by
+    one admin call only validate the token and list its roles once.
+    """
+
+    def __init__(self, token, user, role_ids):
+        self.token = token
+        self.user = user
+        self.role_ids = role_ids
+
+    def has_role(self, role_id):
+        return role_id is not None and role_id in self.role_ids
+
+    def is_admin(self):
+        init_admin_role_identifiers()
+        return self.has_role(backends.ADMIN_ROLE_ID)
+
+    def is_service_admin(self):
+        init_admin_role_identifiers()
+        return self.has_role(backends.SERVICE_ADMIN_ROLE_ID) or \
+            self.is_admin()
+
+
+class PasswordCache(object):
+    """Remembers successful password verifications for a short while
+
+    Keeps one HMAC per user, of the user id, the stored password hash and
+    the password presented, under a key generated for this process. No
+    password, or anything that could be checked offline against one, is
+    held. Disabled (every check verifies) while ttl is 0.
+    """
+
+    def __init__(self, ttl=0, maxsize=10000):
+        self.maxsize = maxsize
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        self.configure(ttl)
+
+    def configure(self, ttl):
+        """Sets the number of seconds a verification is remembered for"""
+        if ttl != self.ttl:
+            self.ttl = ttl
+            self._cache = LRUCache(maxsize=self.maxsize, ttl=ttl) \
+                if ttl > 0 else None
+
+    def _digest(self, user, password):
+        if isinstance(password, unicode):
+            password = password.encode('utf-8')
+        message = '\0'.join([str(user.id), str(user.password), password])
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check(self, user, password, verify):
+        """Returns True if password is the user's, calling
+        verify(user, password) unless that was recently established"""
+        if self._cache is None or not password:
+            return verify(user, password)
+
+        digest = self._digest(user, password)
+        if self._cache.get(user.id) == digest:
+            self.hits += 1
+            return True
+        self.misses += 1
+        if verify(user, password):
+            self._cache.set(user.id, digest)
+            return True
+        return False
+
+    def invalidate(self, user_id):
+        if self._cache is not None:
+            self._cache.delete(user_id)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._cache) if self._cache is not None else 0}
+
+
+# Opt-in, see the password-cache-ttl option
+PASSWORD_CACHE = PasswordCache()
+
+
+class TokenSigner(object):
+    """Issues signed tokens, if the token-format option is 'signed'
+
+    A signed token holds what validating it would return, signed with the
+    key in signing-keyfile, so that services holding the certificate can
+    check it without calling Keystone (see keystone.common.signing). Its
+    row in the token backend is kept under a uuid, which is the token id
+    in the signed content; tokens presented to Keystone are looked up by
+    that id, so signed and uuid tokens work side by side.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.certfile = None
+        self.keyfile = None
+        self.ca_certs = None
+        self.certificate = None
+        # signed tokens already checked, and the id each is stored under
+        self._ids = LRUCache(maxsize=maxsize)
+
+    def configure(self, token_format, certfile=None, keyfile=None,
+                  ca_certs=None):
+        token_format = (token_format or 'uuid').lower()
+        if token_format not in ('uuid', 'signed'):
+            raise ValueError("token-format must be 'uuid' or 'signed', "
+                             "not %r" % token_format)
+        if token_format == 'signed' and not (certfile and keyfile):
+            raise ValueError("signed tokens need a signing-certfile and a "
+                             "signing-keyfile")
+        self.keyfile = keyfile if token_format == 'signed' else None
+        self.ca_certs = ca_certs
+        if certfile != self.certfile:
+            self.certfile = certfile
+            self.certificate = None
+            if certfile:
+                with open(certfile) as f:
+                    self.certificate = f.read()
+            self._ids.clear()
+
+    @property
+    def enabled(self):
+        return self.keyfile is not None
+
+    def sign(self, validate_data):
+        """Returns a signed token holding an auth.ValidateData"""
+        return signing.sign(validate_data.to_json(), self.certfile,
+                            self.keyfile)
+
+    def token_id(self, token_id):
+        """Returns the id a token is stored under: the token itself, or the
+        id signed into a signed token (None if its signature is bad)"""
+        if not signing.is_signed(token_id) or self.certfile is None:
+            return token_id
+        stored_id = self._ids.get(token_id)
+        if stored_id is None:
+            try:
+                access = json.loads(signing.verify(token_id, self.certfile,
+                                                   self.ca_certs))['access']
+                stored_id = access['token']['id']
+            except (signing.SigningError, ValueError, KeyError,
+                    TypeError) as e:
+                LOG.debug("Rejected a signed token: %s" % e)
+                return None
+            self._ids.set(token_id, stored_id)
+        return stored_id
+
+
+# Opt-in, see the token-format option
+TOKEN_SIGNER = TokenSigner()
+
+
+def get_authorization_context(token_id):
+    """ Returns the AuthorizationContext for a token, validating it and
+        loading its global roles if it is not cached (or has expired since).
+
+        Raises the same faults as validate_token.
+    """
+    token_id = TOKEN_SIGNER.token_id(token_id)
+    context = AUTHORIZATION_CACHE.get(token_id)
+    if context is None or context.token.expires < datetime.now():
+        (token, user) = validate_token(token_id)
+        role_ids = frozenset(ref.role_id for ref in
+            api.ROLE.ref_get_all_global_roles(user.id)
+            if ref.tenant_id is None)
+        context = AuthorizationContext(token, user, role_ids)
+        AUTHORIZATION_CACHE.set(token_id, context)
+    return context
+
+
+def invalidate_authorization_contexts(token_id=None):
+    """ Forgets the cached context of a token, or all of them if no token
+        is given (e.g. after a change to users or role assignments)
+    """
+    if token_id is None:
+        AUTHORIZATION_CACHE.clear()
+    else:
+        AUTHORIZATION_CACHE.delete(token_id)
+
+
+def record_revocation(token_id=None, user_id=None, tenant_id=None):
+    """ Records that a token, or everything of a user or scoped to a tenant,
+        was revoked, for services to evict from their caches (see
+        get_revocations)
+    """
+    try:
+        api.REVOCATION.create(Revocation(token_id=token_id, user_id=user_id,
+                                         tenant_id=tenant_id))
+    except NotImplementedError:
+        LOG.warning("Can't record revocations without a revocation backend "
+                    "(add 'Revocation' to the backend_entities)")
+
+
+def revoke_user_tokens(user_id):
+    """ Deletes all of a user's tokens, if the token backend can find them
+        (e.g. after the user is disabled or their password changes)
+    """
+    record_revocation(user_id=user_id)
+    try:
+        token_ids = api.TOKEN.delete_all_for_user(user_id)
+    except NotImplementedError:
+        LOG.warning("Can't revoke the tokens of user %s with this token "
+                    "backend" % user_id)
+        return
+    for token_id in token_ids:
+        invalidate_authorization_contexts(token_id)
+
 
 def has_admin_role(token_id):
     """ Checks if the token belongs to a user who has Keystone admin
@@ -52,10 +280,9 @@ def has_admin_role(token_id):
         (i.e. role assigned without a tenant id). The actual name of the role
         is defined in the config file using the keystone-admin-role setting
     """
-    (token, user) = validate_token(token_id)
-    init_admin_role_identifiers()
-    if has_role({"api": api}, user, backends.ADMIN_ROLE_ID):
-        return (token, user)
+    context = get_authorization_context(token_id)
+    if context.is_admin():
+        return (context.token, context.user)
     else:
         return False
 
@@ -70,13 +297,11 @@ def has_service_admin_role(token_id):
         (i.e. role assigned without a tenant id). The actual name of the role
         is defined in the config file using the keystone-admin-role setting
     """
-    (token, user) = validate_token(token_id)
-    init_admin_role_identifiers()
-    if has_role({"api": api}, user,
-                backends.SERVICE_ADMIN_ROLE_ID):
-        return (token, user)
+    context = get_authorization_context(token_id)
+    if context.is_service_admin():
+        return (context.token, context.user)
     else:
-        return has_admin_role(token_id)
+        return False
 
 
 def validate_admin_token(token_id):
@@ -104,12 +329,9 @@ def validate_service_admin_token(token_id):
         is defined in the config file using the keystone-admin-role and
         keystone-service-admin-role settings
     """
-    # Does the user have the Service Admin role
+    # Does the user have the Service Admin or Admin role (which includes
+    # Service Admin rights)
     result = has_service_admin_role(token_id)
-    if result:
-        return result
-    # Does the user have the Admin role (which includes Service Admin rights)
-    result = has_admin_role(token_id)
     if result:
         return result
 
@@ -196,6 +418,7 @@ def get_token_info(token_id):
 
     token = None
     user = None
+    token_id = TOKEN_SIGNER.token_id(token_id)
     if token_id:
         token = api.TOKEN.get(token_id)
         if token:
@@ -211,66 +434,51 @@ def get_auth_data(dtoken):
     tenant = None
     endpoints = None
 
+    info = api.TOKEN.get_validation_info(dtoken.id)
+    (_token, duser, dtenant, _user_tenant, droles) = info
+
     if dtoken.tenant_id:
-        dtenant = api.TENANT.get(dtoken.tenant_id)
         tenant = auth.Tenant(id=dtenant.id, name=dtenant.name)
 
-        endpoints = api.TENANT.get_all_endpoints(dtoken.tenant_id)
-
-    token = auth.Token(dtoken.expires, dtoken.id, tenant)
+        # only loaded if the tenant's catalog is not cached yet
+        endpoints = lambda: api.TENANT.get_all_endpoints(dtoken.tenant_id)
 
-    duser = api.USER.get(dtoken.user_id)
+    token_id = dtoken.id
+    if TOKEN_SIGNER.enabled:
+        token_id = TOKEN_SIGNER.sign(get_validate_data(*info))
+    token = auth.Token(dtoken.expires, token_id, tenant)
 
     ts = []
-    if dtoken.tenant_id:
-        drole_refs = api.ROLE.ref_get_all_tenant_roles(duser.id,
-            dtoken.tenant_id)
-        for drole_ref in drole_refs:
-            drole = api.ROLE.get(drole_ref.role_id)
-            ts.append(Role(drole_ref.role_id, drole.name,
-                drole.desc, None, drole_ref.tenant_id))
-    drole_refs = api.ROLE.ref_get_all_global_roles(duser.id)
-    for drole_ref in drole_refs:
-        drole = api.ROLE.get(drole_ref.role_id)
-        ts.append(Role(drole_ref.role_id, drole.name,
-            drole.desc, None, drole_ref.tenant_id))
+    for drole in droles:
+        ts.append(Role(drole.id, drole.name,
+            drole.description, None, drole.tenant_id))
     user = auth.User(duser.id, duser.name, None, None, Roles(ts, []))
-    if has_service_admin_role(token.id):
+    if has_service_admin_role(dtoken.id):
         # Privileged users see the adminURL as well
         url_types = ['admin', 'internal', 'public']
     else:
         url_types = ['internal', 'public']
-    return auth.AuthData(token, user, endpoints, url_types=url_types)
+    return auth.AuthData(token, user, endpoints, url_types=url_types,
+                         catalog_cache=CATALOG_CACHE)
 
 
-def get_validate_data(dtoken, duser):
-    """return ValidateData object for a token/user pair"""
+def get_validate_data(dtoken, duser, dtenant, dusertenant, droles):
+    """return ValidateData object for the output of validate_token_info"""
     tenant = None
     if dtoken.tenant_id:
-        dtenant = api.TENANT.get(dtoken.tenant_id)
         tenant = auth.Tenant(id=dtenant.id, name=dtenant.name)
 
     token = auth.Token(dtoken.expires, dtoken.id, tenant)
 
     ts = []
-    if dtoken.tenant_id:
-        drole_refs = api.ROLE.ref_get_all_tenant_roles(duser.id,
-            dtoken.tenant_id)
-        for drole_ref in drole_refs:
-            drole = api.ROLE.get(drole_ref.role_id)
-            ts.append(Role(drole_ref.role_id, drole.name,
-                None, drole_ref.tenant_id))
-    drole_refs = api.ROLE.ref_get_all_global_roles(duser.id)
-    for drole_ref in drole_refs:
-        drole = api.ROLE.get(drole_ref.role_id)
-        ts.append(Role(drole_ref.role_id, drole.name,
-            None, drole_ref.tenant_id))
+    for drole in droles:
+        ts.append(Role(drole.id, drole.name,
+            None, drole.tenant_id))
 
     # Also get the user's tenant's name
     tenant_name = None
     if duser.tenant_id:
-        utenant = api.TENANT.get(duser.tenant_id)
-        tenant_name = utenant.name
+        tenant_name = dusertenant.name
 
     user = auth.User(duser.id, duser.name, duser.tenant_id,
         tenant_name, Roles(ts, []))
@@ -290,21 +498,9 @@ def validate_tenant(dtenant):
     return dtenant
 
 
-def validate_token(token_id, belongs_to=None, is_check_token=None):
-    """
-    Method to validate a token.
-    token_id -- id of the token that needs to be validated.
-    belongs_to -- optional tenant_id to check whether the token is
-    mapped to a specific tenant.
-    is_check_token -- optional argument that tells whether
-    we check the existence of a Token using another Token
-    to authenticate. This value decides the faults that are to be thrown.
-    """
-    if not token_id:
-        raise fault.UnauthorizedFault("Missing token")
-
-    (token, user) = get_token_info(token_id)
-
+def check_token(token, user, is_check_token=None):
+    """Raises the right fault for a missing or expired token, or a
+    disabled user. See validate_token for is_check_token."""
     if not token:
         if is_check_token:
             raise fault.ItemNotFoundFault("Token does not exist.")
@@ -322,6 +518,24 @@ def validate_token(token_id, belongs_to=None, is_check_token=None):
         raise fault.UserDisabledFault("User %s has been disabled!"
             % user.id)
 
+
+def validate_token(token_id, belongs_to=None, is_check_token=None):
+    """
+    Method to validate a token.
+    token_id -- id of the token that needs to be validated.
+    belongs_to -- optional tenant_id to check whether the token is
+    mapped to a specific tenant.
+    is_check_token -- optional argument that tells whether
+    we check the existence of a Token using another Token
+    to authenticate. This value decides the faults that are to be thrown.
+    """
+    if not token_id:
+        raise fault.UnauthorizedFault("Missing token")
+
+    (token, user) = get_token_info(token_id)
+
+    check_token(token, user, is_check_token)
+
     if user.tenant_id:
         validate_tenant_by_id(user.tenant_id)
 
@@ -334,6 +548,47 @@ def validate_token(token_id, belongs_to=None, is_check_token=None):
     return (token, user)
 
 
+def validate_token_info(token_id, belongs_to=None, is_check_token=None):
+    """
+    Same checks as validate_token, but loads the token, user, tenants and
+    roles with a single backend call.
+
+    Returns a (token, user, tenant, user_tenant, roles) tuple as described
+    in BaseTokenAPI.get_validation_info.
+    """
+    if not token_id:
+        raise fault.UnauthorizedFault("Missing token")
+
+    info = api.TOKEN.get_validation_info(TOKEN_SIGNER.token_id(token_id))
+    return check_validation_info(info, belongs_to, is_check_token)
+
+
+def check_validation_info(info, belongs_to=None, is_check_token=None):
+    """
+    The checks of validate_token_info, on info as returned by
+    BaseTokenAPI.get_validation_info (None if the token was not found).
+
+    Returns info.
+    """
+    if info:
+        (token, user, tenant, user_tenant, _roles) = info
+    else:
+        (token, user, tenant, user_tenant) = (None, None, None, None)
+
+    check_token(token, user, is_check_token)
+
+    if user.tenant_id:
+        validate_tenant(user_tenant)
+
+    if token.tenant_id:
+        validate_tenant(tenant)
+
+    if belongs_to and unicode(token.tenant_id) != unicode(belongs_to):
+        raise fault.UnauthorizedFault("Unauthorized on this tenant")
+
+    return info
+
+
 class IdentityService(object):
     """Implements the Identity service
 
@@ -347,6 +602,11 @@ class IdentityService(object):
         Loads all necessary backends to handle incoming requests.
         """
         backends.configure_backends(options)
+        PASSWORD_CACHE.configure(int(options.get('password-cache-ttl', 0)))
+        TOKEN_SIGNER.configure(options.get('token-format'),
+                               options.get('signing-certfile'),
+                               options.get('signing-keyfile'),
+                               options.get('signing-ca-certs'))
         self.token_manager = TokenManager(options)
         self.tenant_manager = TenantManager(options)
 
@@ -360,7 +620,8 @@ class IdentityService(object):
                 "Expecting auth_with_password_credentials!")
 
         def validate(duser):
-            return api.USER.check_password(duser, auth_request.password)
+            return PASSWORD_CACHE.check(duser, auth_request.password,
+                                        api.USER.check_password)
 
         if auth_request.tenant_name:
             dtenant = validate_tenant_by_name(auth_request.tenant_name)
@@ -459,26 +720,83 @@ class IdentityService(object):
             dtoken = api.TOKEN.create(dtoken)
         return get_auth_data(dtoken)
 
+    @staticmethod
+    def get_signing_certificate():
+        if TOKEN_SIGNER.certificate is None:
+            raise fault.ItemNotFoundFault("Tokens are not signed")
+        return TOKEN_SIGNER.certificate
+
     @staticmethod
     def validate_token(admin_token, token_id, belongs_to=None):
         validate_service_admin_token(admin_token)
-        (token, user) = validate_token(token_id, belongs_to, True)
-        return get_validate_data(token, user)
+        return TOKEN_VALIDATIONS.do((token_id, belongs_to),
+                                    IdentityService._validate_token,
+                                    token_id, belongs_to)
+
+    @staticmethod
+    def _validate_token(token_id, belongs_to):
+        info = validate_token_info(token_id, belongs_to, True)
+        return get_validate_data(*info)
+
+    @staticmethod
+    def validate_tokens(admin_token, validations):
+        """ Validates several tokens at once
+
+        validations is an auth.TokenValidations holding (token id,
+        belongs_to) pairs. Returns it with each pair's ValidateData or
+        fault filled in.
+        """
+        validate_service_admin_token(admin_token)
+        stored_ids = dict((token_id, TOKEN_SIGNER.token_id(token_id))
+                          for (token_id, _belongs_to) in validations.requests
+                          if token_id)
+        infos = api.TOKEN.get_validation_info_multi(
+            [stored_id for stored_id in stored_ids.values() if stored_id])
+        results = []
+        for (token_id, belongs_to) in validations.requests:
+            try:
+                if not token_id:
+                    raise fault.UnauthorizedFault("Missing token")
+                info = check_validation_info(infos.get(stored_ids[token_id]),
+                                             belongs_to, True)
+                results.append(get_validate_data(*info))
+            except fault.IdentityFault as e:
+                results.append(e)
+        validations.results = results
+        return validations
 
     @staticmethod
     def revoke_token(admin_token, token_id):
         validate_admin_token(admin_token)
 
-        dtoken = api.TOKEN.get(token_id)
+        token_id = TOKEN_SIGNER.token_id(token_id)
+        dtoken = api.TOKEN.get(token_id) if token_id else None
         if not dtoken:
             raise fault.ItemNotFoundFault("Token not found")
 
         api.TOKEN.delete(token_id)
+        invalidate_authorization_contexts(token_id)
+        record_revocation(token_id=token_id)
+
+    @staticmethod
+    def get_revocations(admin_token, since, limit):
+        """ Returns up to limit of the revocations recorded after the one
+        whose id is since (0 for the oldest) """
+        validate_service_admin_token(admin_token)
+        try:
+            first_id = api.REVOCATION.get_first_id()
+            values = api.REVOCATION.get_since(since, limit)
+        except NotImplementedError:
+            raise fault.ServiceUnavailableFault(
+                "Revocations are not recorded")
+        truncated = first_id is not None and since < first_id - 1
+        return Revocations(values, truncated)
 
     def get_endpoints_for_token(self, admin_token,
             token_id, marker, limit, url,):
         validate_service_admin_token(admin_token)
-        dtoken = api.TOKEN.get(token_id)
+        token_id = TOKEN_SIGNER.token_id(token_id)
+        dtoken = api.TOKEN.get(token_id) if token_id else None
         if not dtoken:
             raise fault.ItemNotFoundFault("Token not found")
         if not dtoken.tenant_id:
@@ -517,16 +835,14 @@ class IdentityService(object):
             (_token, user) = validate_token(admin_token, False)
 
             # Return tenants specific to user
-            dtenants = api.TENANT.tenants_for_user_get_page(
-                user, marker, limit)
-            prev_page, next_page = api.TENANT.\
-                tenants_for_user_get_page_markers(user, marker, limit)
+            (dtenants, prev_page, next_page) = api.TENANT.\
+                tenants_for_user_get_page_with_markers(user, marker, limit)
         else:
             #Check Admin Token
             (_token, user) = validate_admin_token(admin_token)
             # Return all tenants
-            dtenants = api.TENANT.get_page(marker, limit)
-            prev_page, next_page = api.TENANT.get_page_markers(marker, limit)
+            (dtenants, prev_page, next_page) = \
+                api.TENANT.get_page_with_markers(marker, limit)
 
         for dtenant in dtenants:
             t = Tenant(id=dtenant.id, name=dtenant.name,
@@ -573,6 +889,8 @@ class IdentityService(object):
         values = {'desc': tenant.description, 'enabled': tenant.enabled,
                   'name': tenant.name}
         api.TENANT.update(tenant_id, values)
+        if dtenant.enabled and not tenant.enabled:
+            record_revocation(tenant_id=tenant_id)
         dtenant = api.TENANT.get(tenant_id)
         return Tenant(id=dtenant.id, name=dtenant.name,
             description=dtenant.desc, enabled=dtenant.enabled)
@@ -590,6 +908,7 @@ class IdentityService(object):
                                        "contains get_users")
 
         api.TENANT.delete(dtenant.id)
+        record_revocation(tenant_id=tenant_id)
         return None
 
     #
@@ -651,8 +970,9 @@ class IdentityService(object):
             if not api.ROLE.get(role_id):
                 raise fault.ItemNotFoundFault("The role not found")
         ts = []
-        dtenantusers = api.USER.users_get_by_tenant_get_page(
-            tenant_id, role_id, marker, limit)
+        (dtenantusers, prev, next) = \
+            api.USER.users_get_by_tenant_get_page_with_markers(
+                tenant_id, role_id, marker, limit)
         for dtenantuser in dtenantusers:
             ts.append(User(None, dtenantuser.id, dtenantuser.name, tenant_id,
                            dtenantuser.email, dtenantuser.enabled,
@@ -660,21 +980,19 @@ class IdentityService(object):
                                                     "tenant_roles") else None))
         links = []
         if ts.__len__():
-            prev, next = api.USER.users_get_by_tenant_get_page_markers(
-                    tenant_id, role_id, marker, limit)
             links = self.get_links(url, prev, next, limit)
         return Users(ts, links)
 
     def get_users(self, admin_token, marker, limit, url):
         validate_admin_token(admin_token)
         ts = []
-        dusers = api.USER.users_get_page(marker, limit)
+        (dusers, prev, next) = api.USER.users_get_page_with_markers(marker,
+            limit)
         for duser in dusers:
             ts.append(User(None, duser.id, duser.name, duser.tenant_id,
                                    duser.email, duser.enabled))
         links = []
         if ts.__len__():
-            prev, next = api.USER.users_get_page_markers(marker, limit)
             links = self.get_links(url, prev, next, limit)
         return Users(ts, links)
 
@@ -722,6 +1040,7 @@ class IdentityService(object):
 
         values = {'email': user.email, 'name': user.name}
         api.USER.update(user_id, values)
+        PASSWORD_CACHE.invalidate(user_id)
         duser = api.USER.user_get_update(user_id)
         return User(duser.password, duser.id, duser.name, duser.tenant_id,
             duser.email, duser.enabled)
@@ -744,6 +1063,8 @@ class IdentityService(object):
         values = {'password': user.password}
 
         api.USER.update(user_id, values)
+        PASSWORD_CACHE.invalidate(user_id)
+        revoke_user_tokens(user_id)
 
         return User_Update(password=user.password)
 
@@ -759,6 +1080,10 @@ class IdentityService(object):
         values = {'enabled': user.enabled}
 
         api.USER.update(user_id, values)
+        PASSWORD_CACHE.invalidate(user_id)
+        invalidate_authorization_contexts()
+        if not user.enabled:
+            revoke_user_tokens(user_id)
 
         duser = api.USER.get(user_id)
 
@@ -785,11 +1110,14 @@ class IdentityService(object):
         if not duser:
             raise fault.ItemNotFoundFault("The user could not be found")
 
+        revoke_user_tokens(user_id)
         dtenant = api.TENANT.get(duser.tenant_id)
         if dtenant != None:
             api.USER.delete_tenant_user(user_id, dtenant.id)
         else:
             api.USER.delete(user_id)
+        PASSWORD_CACHE.invalidate(user_id)
+        invalidate_authorization_contexts()
         return None
 
     @staticmethod
@@ -846,10 +1174,9 @@ class IdentityService(object):
         validate_service_admin_token(admin_token)
 
         ts = []
-        droles = api.ROLE.get_page(marker, limit)
+        (droles, prev, next) = api.ROLE.get_page_with_markers(marker, limit)
         for drole in droles:
             ts.append(Role(drole.id, drole.name, drole.desc, drole.service_id))
-        prev, next = api.ROLE.get_page_markers(marker, limit)
         links = self.get_links(url, prev, next, limit)
         return Roles(ts, links)
 
@@ -893,7 +1220,10 @@ class IdentityService(object):
         if role_refs != None:
             for role_ref in role_refs:
                 api.ROLE.ref_delete(role_ref.id)
+            for user_id in set(role_ref.user_id for role_ref in role_refs):
+                record_revocation(user_id=user_id)
         api.ROLE.delete(role_id)
+        invalidate_authorization_contexts()
 
     @staticmethod
     def add_role_to_user(admin_token, user_id, role_id, tenant_id=None):
@@ -921,6 +1251,7 @@ class IdentityService(object):
         if tenant_id != None:
             drole_ref.tenant_id = dtenant.id
         api.USER.user_role_add(drole_ref)
+        invalidate_authorization_contexts()
 
     @staticmethod
     def remove_role_from_user(admin_token, user_id, role_id, tenant_id=None):
@@ -931,6 +1262,8 @@ class IdentityService(object):
             raise fault.ItemNotFoundFault(
                 "This role is not mapped to the user.")
         api.ROLE.ref_delete(drole_ref.id)
+        invalidate_authorization_contexts()
+        record_revocation(user_id=user_id)
 
     # pylint: disable=R0913, R0914
     def get_user_roles(self, admin_token, marker,
@@ -946,13 +1279,12 @@ class IdentityService(object):
             if not dtenant:
                 raise fault.ItemNotFoundFault("The tenant could not be found.")
         ts = []
-        drole_refs = api.ROLE.ref_get_page(marker, limit, user_id, tenant_id)
+        (drole_refs, prev, next) = api.ROLE.ref_get_page_with_markers(
+            marker, limit, user_id, tenant_id)
         for drole_ref in drole_refs:
             drole = api.ROLE.get(drole_ref.role_id)
             ts.append(Role(drole.id, drole.name,
                     drole.desc, drole.service_id))
-        prev, next = api.ROLE.ref_get_page_markers(
-            user_id, tenant_id, marker, limit)
         links = self.get_links(url, prev, next, limit)
         return Roles(ts, links)
 
@@ -994,6 +1326,7 @@ class IdentityService(object):
         dendpoint_template.version_list = endpoint_template.version_list
         dendpoint_template.version_info = endpoint_template.version_info
         dendpoint_template = api.ENDPOINT_TEMPLATE.create(dendpoint_template)
+        CATALOG_CACHE.invalidate()
         endpoint_template.id = dendpoint_template.id
         return endpoint_template
 
@@ -1039,6 +1372,7 @@ class IdentityService(object):
         dendpoint_template.version_info = endpoint_template.version_info
         dendpoint_template = api.ENDPOINT_TEMPLATE.update(
             endpoint_template_id, dendpoint_template)
+        CATALOG_CACHE.invalidate()
         return EndpointTemplate(
             dendpoint_template.id,
             dendpoint_template.region,
@@ -1084,12 +1418,13 @@ class IdentityService(object):
             for endpoint in endpoints:
                 api.ENDPOINT_TEMPLATE.endpoint_delete(endpoint.id)
         api.ENDPOINT_TEMPLATE.delete(endpoint_template_id)
+        CATALOG_CACHE.invalidate()
 
     def get_endpoint_templates(self, admin_token, marker, limit, url):
         validate_service_admin_token(admin_token)
-        dendpoint_templates = api.ENDPOINT_TEMPLATE.get_page(marker, limit)
+        (dendpoint_templates, prev, next) = \
+            api.ENDPOINT_TEMPLATE.get_page_with_markers(marker, limit)
         ts = self.transform_endpoint_templates(dendpoint_templates)
-        prev, next = api.ENDPOINT_TEMPLATE.get_page_markers(marker, limit)
         links = self.get_links(url, prev, next, limit)
         return EndpointTemplates(ts, links)
 
@@ -1100,11 +1435,9 @@ class IdentityService(object):
         if dservice is None:
             raise fault.ItemNotFoundFault(
                 "No service with the id %s found." % service_id)
-        dendpoint_templates = api.ENDPOINT_TEMPLATE.\
-            get_by_service_get_page(service_id, marker, limit)
+        (dendpoint_templates, prev, next) = api.ENDPOINT_TEMPLATE.\
+            get_by_service_get_page_with_markers(service_id, marker, limit)
         ts = self.transform_endpoint_templates(dendpoint_templates)
-        prev, next = api.ENDPOINT_TEMPLATE.\
-            get_by_service_get_page_markers(service_id, marker, limit)
         links = self.get_links(url, prev, next, limit)
         return EndpointTemplates(ts, links)
 
@@ -1167,9 +1500,9 @@ class IdentityService(object):
 
         ts = []
 
-        dtenant_endpoints = \
+        (dtenant_endpoints, prev, next) = \
             api.ENDPOINT_TEMPLATE.\
-                endpoint_get_by_tenant_get_page(
+                endpoint_get_by_tenant_get_page_with_markers(
                     tenant_id, marker, limit)
         for dtenant_endpoint in dtenant_endpoints:
             dendpoint_template = api.ENDPOINT_TEMPLATE.get(
@@ -1190,9 +1523,6 @@ class IdentityService(object):
                             ))
         links = []
         if ts.__len__():
-            prev, next = \
-                api.ENDPOINT_TEMPLATE.endpoint_get_by_tenant_get_page_markers(
-                    tenant_id, marker, limit)
             links = self.get_links(url, prev, next, limit)
         return Endpoints(ts, links)
 
@@ -1211,6 +1541,7 @@ class IdentityService(object):
         dendpoint.tenant_id = tenant_id
         dendpoint.endpoint_template_id = endpoint_template.id
         dendpoint = api.ENDPOINT_TEMPLATE.endpoint_add(dendpoint)
+        CATALOG_CACHE.invalidate()
         dservice = api.SERVICE.get(dendpoint_template.service_id)
         dendpoint = Endpoint(
                             dendpoint.id,
@@ -1233,6 +1564,7 @@ class IdentityService(object):
         if api.ENDPOINT_TEMPLATE.get(endpoint_id) is None:
             raise fault.ItemNotFoundFault("The Endpoint is not found.")
         api.ENDPOINT_TEMPLATE.endpoint_delete(endpoint_id)
+        CATALOG_CACHE.invalidate()
         return None
 
     #Service Operations
@@ -1263,11 +1595,11 @@ class IdentityService(object):
         validate_service_admin_token(admin_token)
 
         ts = []
-        dservices = api.SERVICE.get_page(marker, limit)
+        (dservices, prev, next) = api.SERVICE.get_page_with_markers(marker,
+            limit)
         for dservice in dservices:
             ts.append(Service(dservice.id, dservice.name, dservice.type,
                 dservice.desc))
-        prev, next = api.SERVICE.get_page_markers(marker, limit)
         links = self.get_links(url, prev, next, limit)
         return Services(ts, links)
 
@@ -1318,6 +1650,8 @@ class IdentityService(object):
                         api.ROLE.ref_delete(role_ref.id)
                 api.ROLE.delete(role.id)
         api.SERVICE.delete(service_id)
+        CATALOG_CACHE.invalidate()
+        invalidate_authorization_contexts()
 
     @staticmethod
     def get_credentials(admin_token, user_id, marker, limit, url):
@@ -14,6 +14,8 @@
 # limitations under the License.
 from lxml import etree
 
+from keystone.common.xmlwriter import XMLWriter
+
 
 class Link(object):
     """An atom link"""
@@ -39,16 +41,22 @@ class Link(object):
         return {'links': links}
 
     def to_dom(self):
-        ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
-        ATOM = "{%s}" % ATOM_NAMESPACE
-        NSMAP = {'atom': ATOM_NAMESPACE}
-        dom = etree.Element(ATOM + "link", nsmap=NSMAP)
+        return etree.fromstring(self.to_xml())
+
+    def to_xml(self):
+        writer = XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
+    def write_xml(self, writer):
+        writer.start("atom:link")
+        writer.attribute("xmlns:atom", "http://www.w3.org/2005/Atom")
         if self.link_type:
-            dom.set("link_type", self.link_type)
+            writer.attribute("link_type", self.link_type)
         if self.link_type:
-            dom.set("hreflang", self.hreflang)
+            writer.attribute("hreflang", self.hreflang)
         if self.title:
-            dom.set("title", self.title)
-        dom.set("rel", self.rel)
-        dom.set("href", self.href)
-        return dom
+            writer.attribute("title", self.title)
+        writer.attribute("rel", self.rel)
+        writer.attribute("href", self.href)
+        writer.end()
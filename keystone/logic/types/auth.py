@@ -15,9 +15,11 @@
 
 import json
 from lxml import etree
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
 import keystone.backends.api as db_api
 from keystone import utils
+from keystone.common.cache import LRUCache
 
 
 class AuthBase(object):
@@ -294,6 +296,36 @@ class User(object):
         self.role_refs = role_refs
 
 
+class CatalogCache(object):
+    """Serialized service catalogs, keyed by (tenant id, url types, format)
+
+    invalidate() bumps a generation number that is part of every key, so
+    all catalogs rendered before the bump are ignored and age out of the
+    LRU. Entries also expire after ttl seconds, which bounds how stale a
+    catalog can be in other processes that did not see the change.
+    """
+
+    def __init__(self, maxsize=1000, ttl=300):
+        self.generation = 0
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def invalidate(self):
+        self.generation += 1
+
+    def get_or_render(self, key, render):
+        # read the generation first so that a catalog rendered while it is
+        # bumped is filed under the old one
+        generation_key = (self.generation,) + key
+        fragment = self._cache.get(generation_key)
+        if fragment is None:
+            fragment = render()
+            self._cache.set(generation_key, fragment)
+        return fragment
+
+    def stats(self):
+        return self._cache.stats()
+
+
 class AuthData(object):
     """Authentation Information returned upon successful login.
 
@@ -305,9 +337,14 @@ class AuthData(object):
         without elevated privileges, the "adminURL" is not returned. The
         url_types paramater in the initializer lists the types to return.
         The actual authorization is done in logic/service.py
+
+        If a catalog_cache is given, the rendered catalog is cached there.
+        base_urls may then be a callable returning the endpoint templates,
+        so that they are only loaded when the catalog is not cached.
     """
 
-    def __init__(self, token, user, base_urls=None, url_types=None):
+    def __init__(self, token, user, base_urls=None, url_types=None,
+                 catalog_cache=None):
         self.token = token
         self.user = user
         self.base_urls = base_urls
@@ -315,59 +352,85 @@ class AuthData(object):
             self.url_types = ["internal", "public", "admin"]
         else:
             self.url_types = url_types
-        self.d = {}
-        if self.base_urls != None:
-            self.__convert_baseurls_to_dict()
+        self.catalog_cache = catalog_cache
+        self.d = None
+        self.services = {}
 
     def to_xml(self):
-        dom = etree.Element("access",
-            xmlns="http://docs.openstack.org/identity/api/v2.0")
-        token = etree.Element("token",
-                             expires=self.token.expires.isoformat())
-        token.set("id", self.token.id)
+        writer = xmlwriter.XMLWriter()
+        writer.start("access")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
+        writer.start("token")
+        writer.attribute("expires", self.token.expires.isoformat())
+        writer.attribute("id", self.token.id)
         if self.token.tenant:
-            tenant = etree.Element("tenant",
-                id=unicode(self.token.tenant.id),
-                name=unicode(self.token.tenant.name))
-            token.append(tenant)
-        dom.append(token)
-
-        user = etree.Element("user",
-            id=unicode(self.user.id),
-            name=unicode(self.user.username))
-        dom.append(user)
-
+            writer.element("tenant", [
+                ("id", unicode(self.token.tenant.id)),
+                ("name", unicode(self.token.tenant.name))])
+        writer.end()
+
+        writer.start("user")
+        writer.attribute("id", unicode(self.user.id))
+        writer.attribute("name", unicode(self.user.username))
         if self.user.role_refs != None:
-            user.append(self.user.role_refs.to_dom())
+            self.user.role_refs.write_xml(writer)
+        writer.end()
 
         if self.base_urls != None:
-            service_catalog = etree.Element("serviceCatalog")
-            for key, key_base_urls in self.d.items():
-                dservice = db_api.SERVICE.get(key)
-                if not dservice:
-                    raise fault.ItemNotFoundFault(
-                        "The service could not be found")
-                service = etree.Element("service",
-                                 name=dservice.name, type=dservice.type)
-                for base_url in key_base_urls:
-                    endpoint = etree.Element("endpoint")
-                    if base_url.region:
-                        endpoint.set("region", base_url.region)
-                    for url_kind in self.url_types:
-                        base_url_item = getattr(base_url, url_kind + "_url")
-                        if base_url_item:
-                            endpoint.set(url_kind + "URL", base_url_item.\
-                            replace('%tenant_id%', str(self.token.tenant.id))
-                            if self.token.tenant else base_url_item)
-                    service.append(endpoint)
-                service_catalog.append(service)
-            dom.append(service_catalog)
-        return etree.tostring(dom)
+            writer.fragment(self.__catalog('xml', self.__catalog_to_xml))
+        writer.end()
+        return writer.getvalue()
+
+    def __catalog(self, format, render):
+        if self.catalog_cache is None:
+            return render()
+        tenant_id = self.token.tenant.id if self.token.tenant else None
+        return self.catalog_cache.get_or_render(
+            (tenant_id, tuple(self.url_types), format), render)
+
+    def __catalog_to_xml(self):
+        self.__convert_baseurls_to_dict()
+        writer = xmlwriter.XMLWriter()
+        writer.start("serviceCatalog")
+        for key, key_base_urls in self.d.items():
+            dservice = self.services.get(key)
+            if not dservice:
+                raise fault.ItemNotFoundFault(
+                    "The service could not be found")
+            writer.start("service")
+            writer.attribute("name", dservice.name)
+            writer.attribute("type", dservice.type)
+            for base_url in key_base_urls:
+                writer.start("endpoint")
+                if base_url.region:
+                    writer.attribute("region", base_url.region)
+                for url_kind in self.url_types:
+                    base_url_item = getattr(base_url, url_kind + "_url")
+                    if base_url_item:
+                        writer.attribute(url_kind + "URL", base_url_item.\
+                        replace('%tenant_id%', str(self.token.tenant.id))
+                        if self.token.tenant else base_url_item)
+                writer.end()
+            writer.end()
+        writer.end()
+        return writer.getvalue()
 
     def __convert_baseurls_to_dict(self):
-        for base_url in self.base_urls:
+        if self.d is not None:
+            return
+        self.d = {}
+        base_urls = self.base_urls
+        if callable(base_urls):
+            base_urls = base_urls()
+        for base_url in base_urls:
             if base_url.service_id not in self.d:
                 self.d[base_url.service_id] = list()
+                # backends may hand us the service along with the template
+                service = getattr(base_url, 'service', None)
+                if service is None:
+                    service = db_api.SERVICE.get(base_url.service_id)
+                self.services[base_url.service_id] = service
             self.d[base_url.service_id].append(base_url)
 
     def to_json(self):
@@ -387,35 +450,42 @@ class AuthData(object):
         if self.user.role_refs is not None:
             auth['user']["roles"] = self.user.role_refs.to_json_values()
 
-        if self.base_urls != None:
-            service_catalog = []
-            for key, key_base_urls in self.d.items():
-                service = {}
-                endpoints = []
-                for base_url in key_base_urls:
-                    endpoint = {}
-                    if base_url.region:
-                        endpoint["region"] = base_url.region
-                    for url_kind in self.url_types:
-                        base_url_item = getattr(base_url, url_kind + "_url")
-                        if base_url_item:
-                            endpoint[url_kind + "URL"] = base_url_item.\
-                                replace('%tenant_id%',
-                                    str(self.token.tenant.id)) \
-                                if self.token.tenant else base_url_item
-                    endpoints.append(endpoint)
-                    dservice = db_api.SERVICE.get(key)
-                    if not dservice:
-                        raise fault.ItemNotFoundFault(
-                        "The service could not be found for" + str(key))
-                service["name"] = dservice.name
-                service["type"] = dservice.type
-                service["endpoints"] = endpoints
-                service_catalog.append(service)
-            auth["serviceCatalog"] = service_catalog
         ret = {}
         ret["access"] = auth
-        return json.dumps(ret)
+        js = json.dumps(ret)
+        if self.base_urls != None:
+            # splice the catalog in as the last member of "access"
+            js = js[:-2] + ', "serviceCatalog": ' + \
+                self.__catalog('json', self.__catalog_to_json) + js[-2:]
+        return js
+
+    def __catalog_to_json(self):
+        self.__convert_baseurls_to_dict()
+        service_catalog = []
+        for key, key_base_urls in self.d.items():
+            service = {}
+            endpoints = []
+            for base_url in key_base_urls:
+                endpoint = {}
+                if base_url.region:
+                    endpoint["region"] = base_url.region
+                for url_kind in self.url_types:
+                    base_url_item = getattr(base_url, url_kind + "_url")
+                    if base_url_item:
+                        endpoint[url_kind + "URL"] = base_url_item.\
+                            replace('%tenant_id%',
+                                str(self.token.tenant.id)) \
+                            if self.token.tenant else base_url_item
+                endpoints.append(endpoint)
+                dservice = self.services.get(key)
+                if not dservice:
+                    raise fault.ItemNotFoundFault(
+                    "The service could not be found for" + str(key))
+            service["name"] = dservice.name
+            service["type"] = dservice.type
+            service["endpoints"] = endpoints
+            service_catalog.append(service)
+        return json.dumps(service_catalog)
 
 
 class ValidateData(object):
@@ -429,36 +499,44 @@ class ValidateData(object):
         self.user = user
 
     def to_xml(self):
-        dom = etree.Element("access",
-            xmlns="http://docs.openstack.org/identity/api/v2.0")
-
-        token = etree.Element("token",
-            id=unicode(self.token.id),
-            expires=self.token.expires.isoformat())
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
 
-        if self.token.tenant:
-            tenant = etree.Element("tenant",
-                id=unicode(self.token.tenant.id),
-                name=unicode(self.token.tenant.name))
-            token.append(tenant)
+    def to_dom(self):
+        return etree.fromstring(self.to_xml())
 
-        user = etree.Element("user",
-            id=unicode(self.user.id),
-            name=unicode(self.user.username))
+    def write_xml(self, writer):
+        writer.start("access")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
 
+        writer.start("token")
+        writer.attribute("expires", self.token.expires.isoformat())
+        writer.attribute("id", unicode(self.token.id))
+        if self.token.tenant:
+            writer.element("tenant", [
+                ("id", unicode(self.token.tenant.id)),
+                ("name", unicode(self.token.tenant.name))])
+        writer.end()
+
+        writer.start("user")
+        writer.attribute("id", unicode(self.user.id))
+        writer.attribute("name", unicode(self.user.username))
         if self.user.tenant_id is not None:
-            user.set('tenantId', unicode(self.user.tenant_id))
+            writer.attribute('tenantId', unicode(self.user.tenant_id))
             if self.user.tenant_name is not None:
-                user.set('tenantName', unicode(self.user.tenant_name))
-
+                writer.attribute('tenantName', unicode(self.user.tenant_name))
         if self.user.role_refs is not None:
-            user.append(self.user.role_refs.to_dom())
+            self.user.role_refs.write_xml(writer)
+        writer.end()
 
-        dom.append(token)
-        dom.append(user)
-        return etree.tostring(dom)
+        writer.end()
 
     def to_json(self):
+        return json.dumps({"access": self.to_json_values()})
+
+    def to_json_values(self):
         token = {
             "id": unicode(self.token.id),
             "expires": self.token.expires.isoformat()}
@@ -482,7 +560,77 @@ class ValidateData(object):
         if self.user.role_refs is not None:
             user["roles"] = self.user.role_refs.to_json_values()
 
-        return json.dumps({
-            "access": {
-                "token": token,
-                "user": user}})
+        return {"token": token, "user": user}
+
+
+class TokenValidations(object):
+    """A batch of tokens to validate, and the outcome for each
+
+    requests is a list of (token id, belongs_to) pairs; once validated,
+    results holds a ValidateData or an IdentityFault for each of them.
+    """
+
+    # Most tokens validated by one request
+    MAX_TOKENS = 1000
+
+    def __init__(self, requests, results=None):
+        if len(requests) > TokenValidations.MAX_TOKENS:
+            raise fault.BadRequestFault("Expecting at most %s tokens" %
+                                        TokenValidations.MAX_TOKENS)
+        self.requests = requests
+        self.results = results
+
+    @staticmethod
+    def from_xml(xml_str):
+        try:
+            dom = etree.Element("root")
+            dom.append(etree.fromstring(xml_str))
+            root = dom.find("{http://docs.openstack.org/identity/api/v2.0}"
+                "tokens")
+            if root is None:
+                raise fault.BadRequestFault("Expecting tokens")
+            requests = [(token.get("id"), token.get("belongsTo"))
+                        for token in root.findall(
+                            "{http://docs.openstack.org/identity/api/v2.0}"
+                            "token")]
+            return TokenValidations(requests)
+        except etree.LxmlError as e:
+            raise fault.BadRequestFault("Cannot parse tokens", str(e))
+
+    @staticmethod
+    def from_json(json_str):
+        try:
+            obj = json.loads(json_str)
+            if not isinstance(obj.get("tokens"), list):
+                raise fault.BadRequestFault("Expecting tokens")
+            requests = [(token.get("id"), token.get("belongsTo"))
+                        for token in obj["tokens"]]
+            return TokenValidations(requests)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise fault.BadRequestFault("Cannot parse tokens", str(e))
+
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        writer.start("tokens")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
+        for ((token_id, _belongs_to), result) in zip(self.requests,
+                                                     self.results):
+            writer.start("token")
+            writer.attribute("id", unicode(token_id))
+            result.write_xml(writer)
+            writer.end()
+        writer.end()
+        return writer.getvalue()
+
+    def to_json(self):
+        tokens = []
+        for ((token_id, _belongs_to), result) in zip(self.requests,
+                                                     self.results):
+            token = {"id": unicode(token_id)}
+            if isinstance(result, fault.IdentityFault):
+                token[result.key] = result.to_json_values()
+            else:
+                token["access"] = result.to_json_values()
+            tokens.append(token)
+        return json.dumps({"tokens": tokens})
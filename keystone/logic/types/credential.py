@@ -12,9 +12,11 @@
 # implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import itertools
 import json
 from lxml import etree
 
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
 from keystone import utils
 
@@ -64,17 +66,23 @@ class PasswordCredentials(object):
             raise fault.BadRequestFault(
                 "Cannot parse passwordCredentials", str(e))
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("passwordCredentials",
-                        xmlns="http://docs.openstack.org/identity/api/v2.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("passwordCredentials")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.user_name:
-            dom.set("username", unicode(self.user_name))
+            writer.attribute("username", unicode(self.user_name))
         if self.password:
-            dom.set("password", unicode(self.password))
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+            writer.attribute("password", unicode(self.password))
+        writer.end()
 
     def to_dict(self):
         password_credentials = {}
@@ -96,30 +104,21 @@ class Credentials(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("credentials")
-        dom.set(u"xmlns", "http://docs.openstack.org/identity/api/v2.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
+        return "".join(self.to_xml_chunks())
 
-        for t in self.links:
-            dom.append(t.to_dom())
-
-        return etree.tostring(dom)
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("credentials",
+            "http://docs.openstack.org/identity/api/v2.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_dom(self):
-        dom = etree.Element("credentials")
-        dom.set(u"xmlns", "http://docs.openstack.org/identity/api/v2.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
-
-        for t in self.links:
-            dom.append(t.to_dom())
-
-        return dom
+        return etree.fromstring(self.to_xml())
 
     def to_json(self):
-        values = [t.to_dict() for t in self.values]
-        links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"credentials": values, "credentials_links": links})
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        values = (t.to_dict() for t in self.values)
+        links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"credentials": values,
+                                  "credentials_links": links})
@@ -13,9 +13,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import json
 from lxml import etree
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
+from keystone import utils
 
 
 class EndpointTemplate(object):
@@ -151,42 +154,47 @@ class EndpointTemplate(object):
         self.version_list = version_list
         self.version_info = version_info
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("endpointTemplate",
-            xmlns="http://docs.openstack.org/"
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("endpointTemplate")
+        writer.attribute("xmlns", "http://docs.openstack.org/"
             "identity/api/ext/OS-KSCATALOG/v1.0")
         if self.id:
-            dom.set("id", str(self.id))
+            writer.attribute("id", str(self.id))
         if self.region:
-            dom.set("region", self.region)
+            writer.attribute("region", self.region)
         if self.name:
-            dom.set("name", str(self.name))
+            writer.attribute("name", str(self.name))
         if self.type:
-            dom.set("type", str(self.type))
+            writer.attribute("type", str(self.type))
         if self.public_url:
-            dom.set("publicURL", self.public_url)
+            writer.attribute("publicURL", self.public_url)
         if self.admin_url:
-            dom.set("adminURL", self.admin_url)
+            writer.attribute("adminURL", self.admin_url)
         if self.internal_url:
-            dom.set("internalURL", self.internal_url)
+            writer.attribute("internalURL", self.internal_url)
         if self.enabled:
-            dom.set("enabled", str(self.enabled).lower())
+            writer.attribute("enabled", str(self.enabled).lower())
         if self.is_global:
-            dom.set("global", str(self.is_global).lower())
-        version = etree.Element("version",
-            xmlns="http://docs.openstack.org"
-            "/identity/api/v2.0")
+            writer.attribute("global", str(self.is_global).lower())
         if self.version_id:
-            version.set("id", self.version_id)
+            writer.start("version")
+            writer.attribute("xmlns",
+                             "http://docs.openstack.org/identity/api/v2.0")
+            writer.attribute("id", self.version_id)
             if self.version_info:
-                version.set("info", self.version_info)
+                writer.attribute("info", self.version_info)
             if self.version_list:
-                version.set("list", self.version_list)
-            dom.append(version)
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+                writer.attribute("list", self.version_list)
+            writer.end()
+        writer.end()
 
     def to_dict(self):
         endpoint_template = {}
@@ -228,23 +236,21 @@ class EndpointTemplates(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("endpointTemplates")
-        dom.set(u"xmlns",
-            "http://docs.openstack.org/identity/api/ext/OS-KSCATALOG/v1.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
+        return "".join(self.to_xml_chunks())
 
-        for t in self.links:
-            dom.append(t.to_dom())
-
-        return etree.tostring(dom)
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("endpointTemplates",
+            "http://docs.openstack.org/identity/api/ext/OS-KSCATALOG/v1.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_json(self):
-        values = [t.to_dict()["OS-KSCATALOG:endpointTemplate"]
-            for t in self.values]
-        links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"OS-KSCATALOG:endpointTemplates": values,
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        values = (t.to_dict()["OS-KSCATALOG:endpointTemplate"]
+            for t in self.values)
+        links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"OS-KSCATALOG:endpointTemplates": values,
              "OS-KSCATALOG:endpointTemplates_links": links})
 
 
@@ -267,39 +273,45 @@ class Endpoint(object):
         self.version_list = version_list
         self.version_info = version_info
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("endpoint",
-            xmlns="http://docs.openstack.org/identity/api/v2.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("endpoint")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.id:
-            dom.set("id", str(self.id))
+            writer.attribute("id", str(self.id))
         if self.tenant_id:
-            dom.set("tenantId", str(self.tenant_id))
+            writer.attribute("tenantId", str(self.tenant_id))
         if self.region:
-            dom.set("region", self.region)
+            writer.attribute("region", self.region)
         if self.name:
-            dom.set("name", str(self.name))
+            writer.attribute("name", str(self.name))
         if self.type:
-            dom.set("type", str(self.type))
+            writer.attribute("type", str(self.type))
         if self.public_url:
-            dom.set("publicURL", self.public_url)
+            writer.attribute("publicURL", self.public_url)
         if self.admin_url:
-            dom.set("adminURL", self.admin_url)
+            writer.attribute("adminURL", self.admin_url)
         if self.internal_url:
-            dom.set("internalURL", self.internal_url)
-        version = etree.Element("version",
-            xmlns="http://docs.openstack.org"
-            "/identity/api/v2.0")
+            writer.attribute("internalURL", self.internal_url)
         if self.version_id:
-            version.set("id", self.version_id)
+            writer.start("version")
+            writer.attribute("xmlns",
+                             "http://docs.openstack.org/identity/api/v2.0")
+            writer.attribute("id", self.version_id)
             if self.version_info:
-                version.set("info", self.version_info)
+                writer.attribute("info", self.version_info)
             if self.version_list:
-                version.set("list", self.version_list)
-            dom.append(version)
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+                writer.attribute("list", self.version_list)
+            writer.end()
+        writer.end()
 
     def to_dict(self):
         endpoint = {}
@@ -345,19 +357,18 @@ class Endpoints(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("endpoints")
-        dom.set(u"xmlns",
-            "http://docs.openstack.org/identity/api/v2.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
+        return "".join(self.to_xml_chunks())
 
-        for t in self.links:
-            dom.append(t.to_dom())
-
-        return etree.tostring(dom)
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("endpoints",
+            "http://docs.openstack.org/identity/api/v2.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_json(self):
-        values = [t.to_dict()["endpoint"] for t in self.values]
-        links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"endpoints": values, "endpoints_links": links})
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        values = (t.to_dict()["endpoint"] for t in self.values)
+        links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"endpoints": values,
+                                  "endpoints_links": links})
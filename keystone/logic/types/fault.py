@@ -16,6 +16,8 @@
 import json
 from lxml import etree
 
+from keystone.common.xmlwriter import XMLWriter
+
 
 class IdentityFault(Exception):
     """Base Exception type for all auth exceptions"""
@@ -32,27 +34,40 @@ class IdentityFault(Exception):
         return self.msg
 
     def to_xml(self):
-        dom = etree.Element(self.key,
-                        xmlns="http://docs.openstack.org/identity/api/v2.0")
-        dom.set("code", str(self.code))
-        msg = etree.Element("message")
-        msg.text = self.msg
-        dom.append(msg)
+        writer = XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
+    def to_dom(self):
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start(self.key)
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
+        writer.attribute("code", str(self.code))
+        writer.start("message")
+        if self.msg is not None:
+            writer.text(self.msg)
+        writer.end()
         if self.details and len(self.details.strip()):
-            desc = etree.Element("details")
-            desc.text = self.details
-            dom.append(desc)
-        return etree.tostring(dom)
+            writer.start("details")
+            writer.text(self.details)
+            writer.end()
+        writer.end()
 
     def to_json(self):
+        ret = {}
+        ret[self.key] = self.to_json_values()
+        return json.dumps(ret)
+
+    def to_json_values(self):
         fault = {}
         fault["message"] = self.msg
         fault["code"] = str(self.code)
         if self.details and len(self.details.strip()):
             fault["details"] = self.details
-        ret = {}
-        ret[self.key] = fault
-        return json.dumps(ret)
+        return fault
 
 
 class ServiceUnavailableFault(IdentityFault):
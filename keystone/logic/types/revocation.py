@@ -0,0 +1,68 @@
+# Copyright (c) 2011 OpenStack, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from keystone.common.xmlwriter import XMLWriter
+
+
+class Revocations(object):
+    """Revocations recorded after a given one, in order
+
+    Each is a keystone.models.Revocation of a token (token_id), of
+    everything of a user (user_id) or of everything scoped to a tenant
+    (tenant_id). truncated is set if revocations that should have been
+    listed were already purged, in which case anything cached before may
+    have been revoked.
+    """
+
+    ATTRIBUTES = (("tokenId", "token_id"), ("userId", "user_id"),
+                  ("tenantId", "tenant_id"))
+
+    def __init__(self, values, truncated=False):
+        self.values = values
+        self.truncated = truncated
+
+    def to_xml(self):
+        writer = XMLWriter()
+        writer.start("revocations")
+        writer.attribute("xmlns",
+            "http://docs.openstack.org/identity/api/ext/OS-KSADM/v1.0")
+        if self.truncated:
+            writer.attribute("truncated", "true")
+        for value in self.values:
+            writer.start("revocation")
+            writer.attribute("created", value.created.isoformat())
+            writer.attribute("id", unicode(value.id))
+            for (name, attribute) in Revocations.ATTRIBUTES:
+                if value[attribute] is not None:
+                    writer.attribute(name, unicode(value[attribute]))
+            writer.end()
+        writer.end()
+        return writer.getvalue()
+
+    def to_json(self):
+        values = []
+        for value in self.values:
+            revocation = {"id": value.id,
+                          "created": value.created.isoformat()}
+            for (name, attribute) in Revocations.ATTRIBUTES:
+                if value[attribute] is not None:
+                    revocation[name] = unicode(value[attribute])
+            values.append(revocation)
+        result = {"revocations": values}
+        if self.truncated:
+            result["revocations_truncated"] = True
+        return json.dumps(result)
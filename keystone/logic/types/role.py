@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import json
 from lxml import etree
 
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
 from keystone import utils
 
@@ -70,23 +72,29 @@ class Role(object):
         except (ValueError, TypeError) as e:
             raise fault.BadRequestFault("Cannot parse Role", str(e))
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("role",
-                        xmlns="http://docs.openstack.org/identity/api/v2.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("role")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.id:
-            dom.set("id", unicode(self.id))
+            writer.attribute("id", unicode(self.id))
         if self.name:
-            dom.set("name", unicode(self.name))
+            writer.attribute("name", unicode(self.name))
         if self.description:
-            dom.set("description", unicode(self.description))
+            writer.attribute("description", unicode(self.description))
         if self.service_id:
-            dom.set("serviceId", unicode(self.service_id))
+            writer.attribute("serviceId", unicode(self.service_id))
         if self.tenant_id:
-            dom.set("tenantId", unicode(self.tenant_id))
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+            writer.attribute("tenantId", unicode(self.tenant_id))
+        writer.end()
 
     def to_dict(self):
         role = {}
@@ -114,33 +122,31 @@ class Roles(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("roles")
-        dom.set(u"xmlns", "http://docs.openstack.org/identity/api/v2.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
+        return "".join(self.to_xml_chunks())
 
-        for t in self.links:
-            dom.append(t.to_dom())
-
-        return etree.tostring(dom)
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("roles",
+            "http://docs.openstack.org/identity/api/v2.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_dom(self):
-        dom = etree.Element("roles")
-        dom.set(u"xmlns", "http://docs.openstack.org/identity/api/v2.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
-
-        for t in self.links:
-            dom.append(t.to_dom())
+        return etree.fromstring(self.to_xml())
 
-        return dom
+    def write_xml(self, writer):
+        writer.start("roles")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
+        for t in itertools.chain(self.values, self.links):
+            t.write_xml(writer)
+        writer.end()
 
     def to_json(self):
-        values = [t.to_dict()["role"] for t in self.values]
-        links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"roles": values, "roles_links": links})
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        values = (t.to_dict()["role"] for t in self.values)
+        links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"roles": values, "roles_links": links})
 
     def to_json_values(self):
         values = [t.to_dict()["role"] for t in self.values]
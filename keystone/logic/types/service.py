@@ -13,8 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import json
 from lxml import etree
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
 from keystone import utils
 
@@ -71,21 +73,28 @@ class Service(object):
         except (ValueError, TypeError) as e:
             raise fault.BadRequestFault("Cannot parse service", str(e))
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("service",
-            xmlns="http://docs.openstack.org/identity/api/ext/OS-KSADM/v1.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("service")
+        writer.attribute("xmlns",
+            "http://docs.openstack.org/identity/api/ext/OS-KSADM/v1.0")
         if self.id:
-            dom.set("id", unicode(self.id))
+            writer.attribute("id", unicode(self.id))
         if self.name:
-            dom.set("name", unicode(self.name))
+            writer.attribute("name", unicode(self.name))
         if self.type:
-            dom.set("type", unicode(self.type))
+            writer.attribute("type", unicode(self.type))
         if self.description:
-            dom.set("description", unicode(self.description).lower())
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+            writer.attribute("description",
+                             unicode(self.description).lower())
+        writer.end()
 
     def to_dict(self):
         service = {}
@@ -111,20 +120,18 @@ class Services(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("services")
-        dom.set(u"xmlns",
-            "http://docs.openstack.org/identity/api/ext/OS-KSADM/v1.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
+        return "".join(self.to_xml_chunks())
 
-        for t in self.links:
-            dom.append(t.to_dom())
-
-        return etree.tostring(dom)
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("services",
+            "http://docs.openstack.org/identity/api/ext/OS-KSADM/v1.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_json(self):
-        services = [t.to_dict()["OS-KSADM:service"] for t in self.values]
-        services_links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"OS-KSADM:services": services,
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        services = (t.to_dict()["OS-KSADM:service"] for t in self.values)
+        services_links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"OS-KSADM:services": services,
             "OS-KSADM:services_links": services_links})
@@ -13,11 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import json
 from lxml import etree
 
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
 from keystone import models
+from keystone import utils
 
 
 class Tenant(object):
@@ -94,21 +97,25 @@ class Tenant(object):
         except (ValueError, TypeError) as e:
             raise fault.BadRequestFault("Cannot parse Tenant", str(e))
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("tenant",
-            xmlns="http://docs.openstack.org/identity/api/v2.0",
-            enabled=str(self.enabled).lower())
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("tenant")
+        writer.attribute("enabled", str(self.enabled).lower())
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.id:
-            dom.set("id", unicode(self.id))
+            writer.attribute("id", unicode(self.id))
         if self.name:
-            dom.set("name", unicode(self.name))
-        desc = etree.Element("description")
-        desc.text = unicode(self.description)
-        dom.append(desc)
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+            writer.attribute("name", unicode(self.name))
+        writer.element("description", text=unicode(self.description))
+        writer.end()
 
     def to_dict(self):
         tenant = {
@@ -132,21 +139,20 @@ class Tenants(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("tenants")
-        dom.set(u"xmlns", "http://docs.openstack.org/identity/api/v2.0")
-
-        for t in self.values:
-            dom.append(t.to_dom())
-
-        for t in self.links:
-            dom.append(t.to_dom())
+        return "".join(self.to_xml_chunks())
 
-        return etree.tostring(dom)
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("tenants",
+            "http://docs.openstack.org/identity/api/v2.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_json(self):
-        values = [t.to_dict()["tenant"] for t in self.values]
-        links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"tenants": values, "tenants_links": links})
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        values = (t.to_dict()["tenant"] for t in self.values)
+        links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"tenants": values, "tenants_links": links})
 
 
 class User(object):
@@ -162,21 +168,27 @@ class User(object):
         self.email = email
         self.enabled = bool(enabled)
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("user",
-            xmlns="http://docs.openstack.org/identity/api/v2.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("user")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.user_id:
-            dom.set("id", self.user_id)
+            writer.attribute("id", self.user_id)
         if self.tenant_id:
-            dom.set("tenantId", self.tenant_id)
+            writer.attribute("tenantId", self.tenant_id)
         if self.email:
-            dom.set("email", self.email)
+            writer.attribute("email", self.email)
         if self.enabled:
-            dom.set("enabled", str(self.enabled).lower())
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+            writer.attribute("enabled", str(self.enabled).lower())
+        writer.end()
 
     def to_dict(self):
         user = {}
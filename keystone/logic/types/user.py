@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import json
 from lxml import etree
 
+from keystone.common import xmlwriter
 from keystone.logic.types import fault
 from keystone import utils
 
@@ -100,32 +102,36 @@ class User(object):
         except (ValueError, TypeError) as e:
             raise fault.BadRequestFault("Cannot parse User", str(e))
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("user",
-                        xmlns="http://docs.openstack.org/identity/api/v2.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("user")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.email:
-            dom.set("email", unicode(self.email))
+            writer.attribute("email", unicode(self.email))
         if self.tenant_id:
-            dom.set("tenantId", unicode(self.tenant_id))
+            writer.attribute("tenantId", unicode(self.tenant_id))
         if self.id:
-            dom.set("id", unicode(self.id))
+            writer.attribute("id", unicode(self.id))
         if self.name:
-            dom.set("name", unicode(self.name))
+            writer.attribute("name", unicode(self.name))
         if self.enabled:
-            dom.set("enabled", unicode(self.enabled).lower())
+            writer.attribute("enabled", unicode(self.enabled).lower())
         if self.password:
-            dom.set("password", unicode(self.password))
+            writer.attribute("password", unicode(self.password))
         if self.tenant_roles:
-            dom_roles = etree.Element("tenantRoles")
+            writer.start("tenantRoles")
             for role in self.tenant_roles:
-                dom_role = etree.Element("tenantRole")
-                dom_role.text = role
-                dom_roles.append(dom_role)
-            dom.append(dom_roles)
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+                writer.element("tenantRole", text=role)
+            writer.end()
+        writer.end()
 
     def to_dict(self):
         user = {}
@@ -217,25 +223,31 @@ class User_Update(object):
         except (ValueError, TypeError) as e:
             raise fault.BadRequestFault("Cannot parse Tenant", str(e))
 
+    def to_xml(self):
+        writer = xmlwriter.XMLWriter()
+        self.write_xml(writer)
+        return writer.getvalue()
+
     def to_dom(self):
-        dom = etree.Element("user",
-                        xmlns="http://docs.openstack.org/identity/api/v2.0")
+        return etree.fromstring(self.to_xml())
+
+    def write_xml(self, writer):
+        writer.start("user")
+        writer.attribute("xmlns",
+                         "http://docs.openstack.org/identity/api/v2.0")
         if self.email:
-            dom.set("email", unicode(self.email))
+            writer.attribute("email", unicode(self.email))
         if self.tenant_id:
-            dom.set("tenantId", unicode(self.tenant_id))
+            writer.attribute("tenantId", unicode(self.tenant_id))
         if self.id:
-            dom.set("id", unicode(self.id))
+            writer.attribute("id", unicode(self.id))
         if self.name:
-            dom.set("name", unicode(self.name))
+            writer.attribute("name", unicode(self.name))
         if self.enabled is not None:
-            dom.set("enabled", unicode(self.enabled).lower())
+            writer.attribute("enabled", unicode(self.enabled).lower())
         if self.password:
-            dom.set("password", unicode(self.password))
-        return dom
-
-    def to_xml(self):
-        return etree.tostring(self.to_dom())
+            writer.attribute("password", unicode(self.password))
+        writer.end()
 
     def to_dict(self):
         user = {}
@@ -266,15 +278,17 @@ class Users(object):
         self.links = links
 
     def to_xml(self):
-        dom = etree.Element("users")
-        dom.set(u"xmlns", "http://docs.openstack.org/identity/api/v2.0")
-        for t in self.values:
-            dom.append(t.to_dom())
-        for t in self.links:
-            dom.append(t.to_dom())
-        return etree.tostring(dom)
+        return "".join(self.to_xml_chunks())
+
+    def to_xml_chunks(self):
+        return xmlwriter.list_chunks("users",
+            "http://docs.openstack.org/identity/api/v2.0",
+            itertools.chain(self.values, self.links), utils.CHUNK_SIZE)
 
     def to_json(self):
-        values = [t.to_dict()["user"] for t in self.values]
-        links = [t.to_dict()["links"] for t in self.links]
-        return json.dumps({"users": values, "users_links": links})
+        return "".join(self.to_json_chunks())
+
+    def to_json_chunks(self):
+        values = (t.to_dict()["user"] for t in self.values)
+        links = (t.to_dict()["links"] for t in self.links)
+        return utils.json_chunks({"users": values, "users_links": links})
@@ -38,7 +38,7 @@ from keystone.manage import api
 OBJECTS = ['user', 'tenant', 'role', 'service',
     'endpointTemplates', 'token', 'endpoint', 'credentials', 'database']
 ACTIONS = ['add', 'list', 'disable', 'delete', 'grant',
-    'revoke',
+    'revoke', 'purge',
     'sync', 'downgrade', 'upgrade', 'version_control', 'version']
 
 
@@ -49,6 +49,7 @@ ID_NOT_SPECIFIED = 'No ID specified for third argument'
 SUPPORTED_OBJECTS = "Supported objects: %s" % (", ".join(OBJECTS))
 SUPPORTED_ACTIONS = "Supported actions: %s" % (", ".join(ACTIONS))
 ACTION_NOT_SUPPORTED = 'Action not supported for %s'
+PURGE_NOT_SUPPORTED = 'Purging %s is not supported by this backend'
 
 
 class RaisingOptionParser(optparse.OptionParser):
@@ -68,6 +69,7 @@ def parse_args(args=None):
         tokens   : user, tenant, expiration
 
       role list [tenant] will list roles granted on that tenant
+      token purge [batch size] will delete all expired tokens
       database [sync | downgrade | upgrade | version_control | version]
 
     options
@@ -125,7 +127,8 @@ def process(*args):
         if action not in ACTIONS:
             raise optparse.OptParseError(SUPPORTED_ACTIONS)
 
-    if action not in ['list', 'sync', 'version_control', 'version']:
+    if action not in ['list', 'purge', 'sync', 'version_control',
+                      'version']:
         if len(args) == 2:
             raise optparse.OptParseError(ID_NOT_SPECIFIED)
         else:
@@ -251,6 +254,15 @@ def process(*args):
         if api.delete_token(token=object_id):
             print 'SUCCESS: Token %s deleted.' % (object_id,)
 
+    elif (object_type, action) == ('token', 'purge'):
+        batch_size = optional_arg(args, 2)
+        try:
+            count = api.purge_tokens(batch_size=batch_size)
+        except NotImplementedError:
+            raise optparse.OptParseError(PURGE_NOT_SUPPORTED %
+                                         ('expired tokens'))
+        print 'SUCCESS: %s expired tokens deleted.' % (count,)
+
     elif object_type == 'token':
         raise optparse.OptParseError(ACTION_NOT_SUPPORTED % ('tokens'))
 
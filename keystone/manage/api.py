@@ -3,6 +3,7 @@ import datetime
 import keystone.backends.api as db_api
 import keystone.backends.models as db_models
 import keystone.models as models
+from keystone import token as token_manager
 
 
 def add_user(name, password, tenant=None):
@@ -170,6 +171,12 @@ def delete_token(token):
     return db_api.TOKEN.delete(token)
 
 
+def purge_tokens(batch_size=None):
+    if batch_size:
+        return token_manager.purge_expired(int(batch_size))
+    return token_manager.purge_expired()
+
+
 def add_service(name, type, desc, owner_id):
     obj = db_models.Service()
     obj.name = name
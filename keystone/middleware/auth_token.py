@@ -47,6 +47,9 @@ HTTP_X_STORAGE_TOKEN
     The client token being passed in (legacy Rackspace use) to support
     swift/cloud files
 
+Signed tokens (issued when Keystone's token-format is 'signed') are checked
+against Keystone's signing certificate, and read, without calling Keystone.
+
 Used for communication between components
 ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
@@ -100,21 +103,36 @@ from datetime import datetime
 import eventlet
 from eventlet import wsgi
 import json
+import logging
 # memcache is imported in __init__ if memcache caching is configured
 import os
 from paste.deploy import loadapp
+import tempfile
 import time
 from urlparse import urlparse
 from webob.exc import HTTPUnauthorized
 from webob.exc import Request, Response
 import keystone.tools.tracer  # @UnusedImport # module runs on import
-from keystone.common.bufferedhttp import http_connect_raw as http_connect
+from keystone.common.bufferedhttp import http_request
+from keystone.common import signing
+from keystone.common.cache import LRUCache, SingleFlight
 
 
 PROTOCOL_NAME = "Token Authentication"
 # The time format of the 'expires' property of a token
 EXPIRE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
 MAX_CACHE_TIME = 86400
+# Default size of the in-process token cache when token caching is enabled
+TOKEN_CACHE_SIZE = 1000
+# Tokens revalidated per request when refreshing the in-process cache
+REFRESH_BATCH_SIZE = 100
+# Revocations fetched per request when polling Keystone for them
+REVOCATION_BATCH_SIZE = 1000
+# Most tokens, users and tenants remembered as revoked; past that, all the
+# claims cached before are revalidated
+REVOCATIONS_SIZE = 10000
+
+LOG = logging.getLogger('keystone.middleware.auth_token')
 
 
 def get_datetime(time_string):
@@ -201,6 +219,31 @@ class AuthProtocol(object):
         if self.memcache_hosts:
             if self.cache is None:
                 self.cache = "keystone.cache"
+        # In-process cache, checked before the shared cache. It is on by
+        # default whenever caching is configured; set token_cache_size = 0
+        # to disable it or to a positive number to use it on its own.
+        default_size = TOKEN_CACHE_SIZE if self.cache else 0
+        self.token_cache_size = int(conf.get('token_cache_size',
+                                             default_size))
+        if self.token_cache_size > 0:
+            self.token_cache = LRUCache(maxsize=self.token_cache_size)
+        # Every token_cache_refresh seconds, revalidate the tokens in the
+        # in-process cache with one call to Keystone per REFRESH_BATCH_SIZE
+        # tokens (needs the OS-KSVALIDATE extension). Off by default.
+        if self.token_cache is not None:
+            self.token_cache_refresh = int(conf.get('token_cache_refresh',
+                                                    0))
+        # Every revocation_poll_interval seconds, fetch the tokens, users and
+        # tenants revoked in Keystone since the last poll and evict what is
+        # cached about them (needs the OS-KSADM extension). Off by default.
+        self.revocation_poll_interval = int(conf.get(
+            'revocation_poll_interval', 0))
+        # Certificate that signed tokens are checked with (and the CA that
+        # issued it, if it is not self-signed). Fetched from Keystone into
+        # signing_dir if it is not configured.
+        self.signing_cert_file = conf.get('signing_cert_file')
+        self.signing_ca_file = conf.get('signing_ca_file')
+        self.signing_dir = conf.get('signing_dir')
 
     def __init__(self, app, conf):
         """ Common initialization code """
@@ -231,19 +274,42 @@ class AuthProtocol(object):
         self.service_url = None
         self.cache = None
         self.memcache_hosts = None
+        self.memcache_client = None
+        self.token_cache = None
+        self.token_cache_size = None
+        self.token_cache_refresh = 0
+        self.token_cache_refresher = None
+        self.signing_cert_file = None
+        self.signing_ca_file = None
+        self.signing_dir = None
+        self.signing_cert_fetch = True
+        self.revocation_poll_interval = 0
+        self.revocation_poller = None
+        # The id of the latest revocation seen, the id of the latest
+        # revocation of each token, user and tenant (with when it was seen),
+        # and the revocation before which all cached claims are stale
+        self.revocation_seq = 0
+        self.revocations = {}
+        self.revocation_floor = 0
+        # Concurrent validations of the same token share one call to
+        # Keystone; validations.coalesced counts the calls saved
+        self.validations = SingleFlight()
         self._init_protocol_common(app, conf)  # Applies to all protocols
         self._init_protocol(conf)  # Specific to this protocol
 
     def __call__(self, env, start_response):
         """ Handle incoming request. Authenticate. And send downstream. """
+        if self.token_cache_refresh and self.token_cache_refresher is None:
+            self.token_cache_refresher = eventlet.spawn(
+                self._refresh_token_cache_periodically)
+        if self.revocation_poll_interval and self.revocation_poller is None:
+            self.revocation_poller = eventlet.spawn(
+                self._poll_revocations_periodically)
+
         # Initialize caching client
         if self.memcache_hosts:
-            # This will only be used if the configuration calls for memcache
-            import memcache
-
             if env.get(self.cache, None) is None:
-                memcache_client = memcache.Client([self.memcache_hosts])
-                env[self.cache] = memcache_client
+                env[self.cache] = self._get_memcache_client()
 
         #Prep headers to forward request to local or remote downstream service
         proxy_headers = env.copy()
@@ -332,11 +398,33 @@ class AuthProtocol(object):
         """ decrypt or demac claims if necessary """
         return pclaims
 
+    def _get_memcache_client(self):
+        """ Return the memcache client shared by all requests """
+        if self.memcache_client is None:
+            # This will only be used if the configuration calls for memcache
+            import memcache
+
+            self.memcache_client = memcache.Client(
+                self.memcache_hosts.split(','))
+        return self.memcache_client
+
+    def _token_cache_put(self, key, claims, expires, valid):
+        """ Put a claim into the in-process cache """
+        if self.token_cache is not None:
+            timeout = MAX_CACHE_TIME
+            if valid:
+                delta = expires - datetime.now()
+                timeout = min(delta.days * 86400 + delta.seconds, timeout)
+            self.token_cache.set(key, (claims, expires, valid), ttl=timeout)
+
     def _cache_put(self, env, token, claims, valid):
         """ Put a claim into the cache """
-        cache = self._cache(env)
+        key = 'tokens/%s' % (token)
+        if claims:
+            self._token_cache_put(key, claims,
+                                  get_datetime(claims['expires']), valid)
+        cache = self._cache(env, token)
         if (cache and claims):
-            key = 'tokens/%s' % (token)
             claims = self._protect_claims(token, claims)
             if "timeout" in cache.set.func_code.co_varnames:
                 # swift cache
@@ -356,21 +444,49 @@ class AuthProtocol(object):
     def _cache_get(self, env, token):
         """ Return claim and relevant information (expiration and validity)
         from cache """
-        cache = self._cache(env)
+        key = 'tokens/%s' % (token)
+        if self.token_cache is not None:
+            cached_claims = self.token_cache.get(key)
+            if cached_claims:
+                if not self._is_revoked(cached_claims):
+                    return cached_claims
+                self.token_cache.delete(key)
+        cache = self._cache(env, token)
         if cache:
-            key = 'tokens/%s' % (token)
             cached_claims = cache.get(key)
-            if cached_claims:
+            if cached_claims and not self._is_revoked(cached_claims):
                 claims, expires, valid = cached_claims
                 if valid:
                     if expires > datetime.now():
                         claims = self._unprotect_claims(token, claims)
+                if isinstance(expires, datetime):
+                    self._token_cache_put(key, claims, expires, valid)
                 return (claims, expires, valid)
         return None
 
-    def _cache(self, env):
-        """ Return a cache to use for token caching, or none """
-        if (self.cache is not None):
+    def _is_revoked(self, cached_claims):
+        """ Whether a token, its user or its tenant was revoked since its
+        claims were cached """
+        claims, _expires, valid = cached_claims
+        if not valid or not self.revocation_seq:
+            return False
+        seq = claims.get('revocation_seq', 0)
+        if seq < self.revocation_floor:
+            return True
+        for key in (('token', claims.get('token_id')),
+                    ('user', claims['user']['id']),
+                    ('tenant', claims['tenant']['id'])):
+            if self.revocations.get(key, (0, None))[0] > seq:
+                return True
+        return False
+
+    def _cache(self, env, token=None):
+        """ Return a cache to use for token caching, or none
+
+        Signed tokens are too long to be memcache keys, and are checked
+        without calling Keystone, so they are only cached in process.
+        """
+        if self.cache is not None and not signing.is_signed(token):
             return env.get(self.cache, None)
         return None
 
@@ -405,6 +521,72 @@ class AuthProtocol(object):
                 raise TokenExpired()
             return claims
 
+        if signing.is_signed(claims) and self._get_signing_cert_file():
+            return self.validations.do(claims, self._verify_signed_claims,
+                                       env, claims)
+        return self.validations.do(claims, self._validate_claims, env,
+                                   claims)
+
+    def _get_signing_cert_file(self):
+        """ Returns the file holding Keystone's signing certificate,
+        fetching it the first time if it is not configured. None if it
+        can't be had (signed tokens are then validated by Keystone). """
+        if self.signing_cert_file is None and self.signing_cert_fetch:
+            resp, data = http_request(self.auth_host, self.auth_port, 'GET',
+                                      '/v2.0/certificates/signing',
+                                      ssl=(self.auth_protocol == 'https'),
+                                      key_file=self.key_file,
+                                      cert_file=self.cert_file,
+                                      timeout=self.auth_timeout)
+            if resp.status == 404:
+                LOG.warning("Keystone does not publish a signing "
+                            "certificate, signed tokens will be validated "
+                            "by Keystone")
+                self.signing_cert_fetch = False
+            elif not str(resp.status).startswith('20'):
+                LOG.warning("Could not fetch the signing certificate "
+                            "(Keystone returned %s)" % resp.status)
+            else:
+                if self.signing_dir is None:
+                    self.signing_dir = tempfile.mkdtemp(
+                        prefix='keystone-signing-')
+                path = os.path.join(self.signing_dir, 'signing_cert.pem')
+                with open(path + '.tmp', 'w') as f:
+                    f.write(data)
+                os.rename(path + '.tmp', path)
+                self.signing_cert_file = path
+        return self.signing_cert_file
+
+    def _verify_signed_claims(self, env, claims):
+        """Check and read a signed token, and cache the outcome
+
+        Keystone is not asked about signed tokens, so the claims are
+        checked against every revocation remembered, not only those seen
+        since they were cached. If the token, its user or its tenant was
+        revoked (even if the token was issued after that), Keystone
+        validates the token instead.
+        """
+        try:
+            token_info = json.loads(signing.verify(claims,
+                                                   self.signing_cert_file,
+                                                   self.signing_ca_file))
+        except (signing.SigningError, ValueError) as e:
+            LOG.debug("Rejected a signed token: %s" % e)
+            self._cache_put(env, claims,
+                            claims={'expires':
+                            datetime.strftime(datetime.now(),
+                                              EXPIRE_TIME_FORMAT)},
+                            valid=False)
+            raise ValidationFailed()
+        verified_claims = self._get_verified_claims(token_info['access'])
+        verified_claims['revocation_seq'] = self.revocation_floor
+        if self._is_revoked((verified_claims, None, True)):
+            return self._validate_claims(env, claims)
+        return self._check_token_info(env, claims, token_info,
+                                      self.revocation_floor)
+
+    def _validate_claims(self, env, claims):
+        """Validate claims with Keystone and cache the outcome"""
         # Step 1: We need to auth with the keystone service, so get an
         # admin token
         #TODO(ziad): Need to properly implement this, where to store creds
@@ -415,6 +597,7 @@ class AuthProtocol(object):
         # Step 2: validate the user's token with the auth service
         # since this is a priviledged op,m we need to auth ourselves
         # by using an admin token
+        revocation_seq = self.revocation_seq
         headers = {"Content-type": "application/json",
                     "Accept": "application/json",
                     "X-Auth-Token": self.admin_token}
@@ -423,65 +606,207 @@ class AuthProtocol(object):
                     #Khaled's version uses creds to get a token
                     # "X-Auth-Token": admin_token}
                     # we're using a test token from the ini file for now
-        conn = http_connect(self.auth_host, self.auth_port, 'GET',
-                            '/v2.0/tokens/%s' % claims, headers=headers,
-                            ssl=(self.auth_protocol == 'https'),
-                            key_file=self.key_file, cert_file=self.cert_file,
-                            timeout=self.auth_timeout)
-        resp = conn.getresponse()
-        data = resp.read()
+        resp, data = http_request(self.auth_host, self.auth_port, 'GET',
+                                  '/v2.0/tokens/%s' % claims, headers=headers,
+                                  ssl=(self.auth_protocol == 'https'),
+                                  key_file=self.key_file,
+                                  cert_file=self.cert_file,
+                                  timeout=self.auth_timeout)
 
         if not str(resp.status).startswith('20'):
             # Cache it if there is a cache available
-            if self.cache:
-                self._cache_put(env, claims,
-                                claims={'expires':
-                                datetime.strftime(datetime.now(),
-                                                  EXPIRE_TIME_FORMAT)},
-                                valid=False)
+            self._cache_put(env, claims,
+                            claims={'expires':
+                            datetime.strftime(datetime.now(),
+                                              EXPIRE_TIME_FORMAT)},
+                            valid=False)
             # Keystone rejected claim
             raise ValidationFailed()
 
-        token_info = json.loads(data)
+        return self._check_token_info(env, claims, json.loads(data),
+                                      revocation_seq)
+
+    def _check_token_info(self, env, claims, token_info, revocation_seq):
+        """Extract the claims from a token validation, check that they have
+        not expired and cache them (as of revocation_seq, the latest
+        revocation seen before the validation)"""
+        verified_claims = self._get_verified_claims(token_info['access'])
+        verified_claims['revocation_seq'] = revocation_seq
+
+        expires = get_datetime(verified_claims['expires'])
+        if expires <= datetime.now():
+            # Cache it if there is a cache available (we also cached bad
+            # claims)
+            self._cache_put(env, claims, verified_claims, valid=False)
+            raise TokenExpired()
+
+        # Cache it if there is a cache available
+        self._cache_put(env, claims, verified_claims, valid=True)
+        return verified_claims
 
-        roles = [role['name'] for role in token_info[
-            "access"]["user"]["roles"]]
+    @staticmethod
+    def _get_verified_claims(access):
+        """ Extracts the claims to cache from a token validation """
+        roles = [role['name'] for role in access["user"]["roles"]]
 
         # in diablo, there were two ways to get tenant data
-        tenant = token_info['access']['token'].get('tenant')
+        tenant = access['token'].get('tenant')
         if tenant:
             # post diablo
             tenant_id = tenant['id']
             tenant_name = tenant['name']
         else:
             # diablo only
-            tenant_id = token_info['access']['user'].get('tenantId')
-            tenant_name = token_info['access']['user'].get('tenantName')
+            tenant_id = access['user'].get('tenantId')
+            tenant_name = access['user'].get('tenantName')
 
-        verified_claims = {
+        return {
+            'token_id': access['token'].get('id'),
             'user': {
-                'id': token_info['access']['user']['id'],
-                'name': token_info['access']['user']['name'],
+                'id': access['user']['id'],
+                'name': access['user']['name'],
             },
             'tenant': {
                 'id': tenant_id,
                 'name': tenant_name
             },
             'roles': roles,
-            'expires': token_info['access']['token']['expires']}
+            'expires': access['token']['expires']}
 
-        expires = get_datetime(verified_claims['expires'])
-        if expires <= datetime.now():
-            # Cache it if there is a cache available (we also cached bad
-            # claims)
-            if self.cache:
-                self._cache_put(env, claims, verified_claims, valid=False)
-            raise TokenExpired()
+    def _refresh_token_cache_periodically(self):
+        """ Calls refresh_token_cache every token_cache_refresh seconds """
+        while self.token_cache_refresh:
+            eventlet.sleep(self.token_cache_refresh)
+            try:
+                self.refresh_token_cache()
+            except Exception:
+                LOG.exception("Could not refresh the token cache")
 
-        # Cache it if there is a cache available
-        if self.cache:
-            self._cache_put(env, claims, verified_claims, valid=True)
-        return verified_claims
+    def refresh_token_cache(self):
+        """ Revalidates the tokens cached as valid in the in-process cache,
+        so that revoked tokens stop being accepted. Uses one call to
+        Keystone per REFRESH_BATCH_SIZE tokens.
+
+        Returns the number of tokens revalidated.
+        """
+        tokens = [key[len('tokens/'):] for (key, (_claims, _expires, valid))
+                  in self.token_cache.items() if valid]
+        env = {}
+        if self.memcache_hosts:
+            env[self.cache] = self._get_memcache_client()
+        headers = {"Content-type": "application/json",
+                   "Accept": "application/json",
+                   "X-Auth-Token": self.admin_token}
+        for i in range(0, len(tokens), REFRESH_BATCH_SIZE):
+            revocation_seq = self.revocation_seq
+            body = json.dumps({"tokens": [{"id": token} for token in
+                                          tokens[i:i + REFRESH_BATCH_SIZE]]})
+            resp, data = http_request(self.auth_host, self.auth_port, 'POST',
+                                      '/v2.0/tokens/validate',
+                                      headers=headers, body=body,
+                                      ssl=(self.auth_protocol == 'https'),
+                                      key_file=self.key_file,
+                                      cert_file=self.cert_file,
+                                      timeout=self.auth_timeout)
+            if resp.status == 404:
+                LOG.warning("Keystone can't validate tokens in bulk (the "
+                            "OS-KSVALIDATE extension is not enabled), "
+                            "no longer refreshing the token cache")
+                self.token_cache_refresh = 0
+                return i
+            if not str(resp.status).startswith('20'):
+                raise ValidationFailed("Keystone returned %s" % resp.status)
+
+            now = datetime.now()
+            for result in json.loads(data)['tokens']:
+                if 'access' in result:
+                    claims = self._get_verified_claims(result['access'])
+                    claims['revocation_seq'] = revocation_seq
+                    valid = get_datetime(claims['expires']) > now
+                else:
+                    claims = {'expires': datetime.strftime(now,
+                                                       EXPIRE_TIME_FORMAT)}
+                    valid = False
+                self._cache_put(env, result['id'], claims, valid)
+        return len(tokens)
+
+    def _poll_revocations_periodically(self):
+        """ Calls poll_revocations every revocation_poll_interval seconds """
+        while self.revocation_poll_interval:
+            try:
+                self.poll_revocations()
+            except Exception:
+                LOG.exception("Could not poll for revocations")
+            eventlet.sleep(self.revocation_poll_interval)
+
+    def poll_revocations(self):
+        """ Fetches the revocations recorded in Keystone since the last
+        poll, and evicts what is cached about the tokens, users and tenants
+        revoked.
+
+        Returns the number of revocations fetched.
+        """
+        headers = {"Accept": "application/json",
+                   "X-Auth-Token": self.admin_token}
+        total = 0
+        while True:
+            resp, data = http_request(self.auth_host, self.auth_port, 'GET',
+                                      '/v2.0/OS-KSADM/revocations',
+                                      headers=headers,
+                                      query_string='since=%s&limit=%s' %
+                                      (self.revocation_seq,
+                                       REVOCATION_BATCH_SIZE),
+                                      ssl=(self.auth_protocol == 'https'),
+                                      key_file=self.key_file,
+                                      cert_file=self.cert_file,
+                                      timeout=self.auth_timeout)
+            if resp.status == 404:
+                LOG.warning("Keystone does not list revocations (the "
+                            "OS-KSADM extension is not enabled), no longer "
+                            "polling for them")
+                self.revocation_poll_interval = 0
+                return total
+            if not str(resp.status).startswith('20'):
+                raise ValidationFailed("Keystone returned %s" % resp.status)
+
+            result = json.loads(data)
+            revocations = result['revocations']
+            self._revoke(revocations, result.get('revocations_truncated'))
+            total += len(revocations)
+            if len(revocations) < REVOCATION_BATCH_SIZE:
+                return total
+
+    def _revoke(self, revocations, truncated=False):
+        """ Remembers revocations, and evicts the claims they revoke from
+        the in-process cache (claims in the shared cache are checked when
+        they are read) """
+        now = time.time()
+        for revocation in revocations:
+            seq = revocation['id']
+            for (kind, attribute) in (('token', 'tokenId'),
+                                      ('user', 'userId'),
+                                      ('tenant', 'tenantId')):
+                if attribute in revocation:
+                    self.revocations[(kind, revocation[attribute])] = \
+                        (seq, now)
+            self.revocation_seq = max(self.revocation_seq, seq)
+
+        if len(self.revocations) > REVOCATIONS_SIZE:
+            # claims cached before these were seen have expired since
+            self.revocations = dict(
+                (key, (seq, seen)) for (key, (seq, seen))
+                in self.revocations.iteritems()
+                if now - seen < MAX_CACHE_TIME)
+        if truncated or len(self.revocations) > REVOCATIONS_SIZE:
+            # revocations were missed, or too many kept: tell nothing apart
+            # and revalidate everything cached
+            self.revocation_floor = self.revocation_seq
+            self.revocations.clear()
+
+        if revocations and self.token_cache is not None:
+            for (key, cached_claims) in self.token_cache.items():
+                if self._is_revoked(cached_claims):
+                    self.token_cache.delete(key)
 
     @staticmethod
     def _decorate_request(index, value, env, proxy_headers):
@@ -503,15 +828,13 @@ class AuthProtocol(object):
             req = Request(proxy_headers)
             parsed = urlparse(req.url)
 
-            conn = http_connect(self.service_host,
-                                self.service_port,
-                                req.method,
-                                parsed.path,
-                                proxy_headers,
-                                ssl=(self.service_protocol == 'https'),
-                                timeout=self.service_timeout)
-            resp = conn.getresponse()
-            data = resp.read()
+            resp, data = http_request(self.service_host,
+                                      self.service_port,
+                                      req.method,
+                                      parsed.path,
+                                      proxy_headers,
+                                      ssl=(self.service_protocol == 'https'),
+                                      timeout=self.service_timeout)
 
             #TODO(ziad): use a more sophisticated proxy
             # we are rewriting the headers now
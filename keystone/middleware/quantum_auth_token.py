@@ -68,13 +68,12 @@ HTTP_X_AUTHORIZATION
 
 """
 
-import httplib
 import json
 import logging
 from urlparse import urlparse
 from webob.exc import HTTPUnauthorized, Request, Response
 
-from keystone.common.bufferedhttp import http_connect_raw as http_connect
+from keystone.common.bufferedhttp import http_request
 
 PROTOCOL_NAME = "Token Authentication"
 LOG = logging.getLogger('quantum.common.authentication')
@@ -274,15 +273,12 @@ class AuthProtocol(object):
                     }
                    }
                   }
-        if self.auth_protocol == "http":
-            conn = httplib.HTTPConnection(self.auth_host, self.auth_port)
-        else:
-            conn = httplib.HTTPSConnection(self.auth_host, self.auth_port,
-                cert_file=self.cert_file)
-        conn.request("POST", self._build_token_uri(), json.dumps(params), \
-            headers=headers)
-        response = conn.getresponse()
-        data = response.read()
+        _response, data = http_request(self.auth_host, self.auth_port,
+                                       "POST", self._build_token_uri(),
+                                       headers=headers,
+                                       body=json.dumps(params),
+                                       ssl=(self.auth_protocol != "http"),
+                                       cert_file=self.cert_file)
         return data
 
     @staticmethod
@@ -322,14 +318,13 @@ class AuthProtocol(object):
         headers = {"Content-type": "application/json",
                     "Accept": "application/json",
                     "X-Auth-Token": self.admin_token}
-        conn = http_connect(self.auth_host, self.auth_port, 'GET',
-                            self._build_token_uri(claims), headers=headers,
-                            ssl=(self.auth_protocol == 'https'),
-                            key_file=self.key_file, cert_file=self.cert_file,
-                            timeout=self.auth_timeout)
-        resp = conn.getresponse()
-        # pylint: disable=E1103
-        conn.close()
+        resp, _data = http_request(self.auth_host, self.auth_port, 'GET',
+                                   self._build_token_uri(claims),
+                                   headers=headers,
+                                   ssl=(self.auth_protocol == 'https'),
+                                   key_file=self.key_file,
+                                   cert_file=self.cert_file,
+                                   timeout=self.auth_timeout)
 
         if not str(resp.status).startswith('20'):
             # Keystone rejected claim
@@ -358,16 +353,13 @@ class AuthProtocol(object):
         headers = {"Content-type": "application/json",
                     "Accept": "application/json",
                     "X-Auth-Token": self.admin_token}
-        conn = http_connect(self.auth_host, self.auth_port, 'GET',
-                            self._build_token_uri(self.claims),
-                            headers=headers,
-                            ssl=(self.auth_protocol == 'https'),
-                            key_file=self.key_file, cert_file=self.cert_file,
-                            timeout=self.auth_timeout)
-        resp = conn.getresponse()
-        data = resp.read()
-        # pylint: disable=E1103
-        conn.close()
+        resp, data = http_request(self.auth_host, self.auth_port, 'GET',
+                                  self._build_token_uri(self.claims),
+                                  headers=headers,
+                                  ssl=(self.auth_protocol == 'https'),
+                                  key_file=self.key_file,
+                                  cert_file=self.cert_file,
+                                  timeout=self.auth_timeout)
 
         if not str(resp.status).startswith('20'):
             raise LookupError('Unable to locate claims: %s' % resp.status)
@@ -427,14 +419,12 @@ class AuthProtocol(object):
             req = Request(self.proxy_headers)
             # pylint: disable=E1101
             parsed = urlparse(req.url)
-            conn = http_connect(self.service_host,
-                                self.service_port,
-                                req.method,
-                                parsed.path,
-                                self.proxy_headers,
-                                ssl=(self.service_protocol == 'https'))
-            resp = conn.getresponse()
-            data = resp.read()
+            resp, data = http_request(self.service_host,
+                                      self.service_port,
+                                      req.method,
+                                      parsed.path,
+                                      self.proxy_headers,
+                                      ssl=(self.service_protocol == 'https'))
             return Response(status=resp.status, body=data)(self.proxy_headers,
                                                            self.start_response)
 
@@ -19,7 +19,8 @@
 The models are used to hold Keystone 'business' objects and their validation,
 serialization, and backend interaction code.
 
-The models are based off of python's dict.
+The models are mappings with a fixed set of fields per model, stored in
+__slots__.
 
 The uses supported are:
     # can be initialized with static properties
@@ -33,8 +34,8 @@ The uses supported are:
     tenant = None
 
     # Acts as a dict
-    tenant is a dict
-    tenant.dict points to the data dict (i.e. tenant["tenant"])
+    id = tenant["id"]
+    tenant.to_dict() returns the data dict (i.e. {"tenant": {...}})
 
     # can be retrieved by static property
     tenant_by_name = Tenant.get(name='A1000')
@@ -62,35 +63,69 @@ The uses supported are:
             format is a list of attribute names(ex ['description'])
 """
 
+from collections import Mapping, MutableMapping
 import json
 
 from lxml import etree
 
+from keystone.common.xmlwriter import XMLWriter
 from keystone.utils import fault
 
 
-class Resource(dict):
+class ResourceType(type):
+    """ Gives each model a slot per attribute in its fields tuple
+
+    Fields are looked up in a frozenset, and subclasses that do not list
+    __slots__ themselves still get no per-instance __dict__ """
+
+    def __new__(mcs, name, bases, attrs):
+        if '__slots__' not in attrs:
+            inherited = set()
+            for base in bases:
+                inherited.update(getattr(base, 'fields', ()))
+            attrs['__slots__'] = tuple(field for field in
+                                       attrs.get('fields', ())
+                                       if field not in inherited)
+        cls = super(ResourceType, mcs).__new__(mcs, name, bases, attrs)
+        cls.field_set = frozenset(cls.fields)
+        return cls
+
+
+class Resource(object):
     """ Base class for models
 
-    Provides basic functionality that can be overridden """
+    Provides basic functionality that can be overridden
+
+    Contract attributes are listed in the fields tuple of each model and
+    stored in slots. Anything else (ex. Resource(blank=None) or
+    tenant['dynamic'] = 'test') goes into a dict that is only allocated
+    when needed. """
+    __metaclass__ = ResourceType
+    __slots__ = ('_extra',)
+
+    # attributes that can be used as attributes. Example:
+    #    tenant.id  - here id is a contract attribute
+    fields = ()
 
     def __init__(self, *args, **kw):
         """ Initialize object
         kwargs contain static properties
         """
-        super(Resource, self).__init__(*args, **kw)
-        # attributes that can be used as attributes. Example:
-        #    tenant.id  - here id is a contract attribute
-        # initialize dynamically (to prevent recursion on __setattr__)
-        super(Resource, self).__setattr__("contract_attributes", [])
-        # set statically for references
-        self.contract_attributes = []
-
-        if kw:
-            self.contract_attributes.extend(kw.keys())
-            for name, value in kw.iteritems():
+        object.__setattr__(self, '_extra', None)
+        if args:
+            self.update(*args)
+        field_set = self.field_set
+        for name, value in kw.iteritems():
+            if name in field_set:
+                object.__setattr__(self, name, value)
+            else:
                 self[name] = value
 
+    @property
+    def contract_attributes(self):
+        """ Fields of the model, followed by the other attributes set """
+        return list(self.fields) + list(self._extra or ())
+
     #
     # model properties
     #
@@ -101,11 +136,14 @@ class Resource(dict):
         """ Supports reading contract attributes (ex. tenant.id)
 
         This should only be called if the original call did not match
-        an attribute (Python's rules)"""
-        if name in self.contract_attributes:
-            if name in self:
-                return self[name]
+        an attribute (Python's rules): for fields, when they were never set"""
+        if name == '_extra':
+            # not set yet, when unpickling
+            raise AttributeError(name)
+        elif name in self.field_set:
             return None
+        elif self._extra is not None and name in self._extra:
+            return self._extra[name]
         elif name == 'desc':
             # We need to maintain this compatibility with this nasty attribute
             # until we're done refactoring
@@ -117,37 +155,148 @@ class Resource(dict):
     def __setattr__(self, name, value):
         """ Supports setting contract attributes (ex. tenant.name = 'A1')
 
-        This should only be called if the original call did not match
-        an attribute (Python's rules)."""
-        if name in self.contract_attributes:
+        Setting an attribute to None leaves it unchanged."""
+        if name in self.field_set or \
+                (self._extra is not None and name in self._extra):
             if value is not None:
                 self[name] = value
-        elif name == 'contract_attributes':
-            # Allow someone to set that
-            super(Resource, self).__setattr__(name, value)
         else:
             raise AttributeError("'%s' not found on object of class '%s'" % \
                                  (name, self.__class__.__name__))
 
     def __getitem__(self, name):
-        if name in self.contract_attributes:
-            if super(Resource, self).__contains__(name):
-                return super(Resource, self).__getitem__(name)
-            return None
+        if name in self.field_set:
+            return getattr(self, name)
+        elif self._extra is not None and name in self._extra:
+            return self._extra[name]
         elif name == 'desc':
             # We need to maintain this compatibility with this nasty attribute
             # until we're done refactoring
             return self.description
-        else:
-            return super(Resource, self).__getitem__(name)
+        raise KeyError(name)
 
     def __setitem__(self, name, value):
-        super(Resource, self).__setitem__(name, value)
+        if name in self.field_set:
+            object.__setattr__(self, name, value)
+        elif self._extra is None:
+            object.__setattr__(self, '_extra', {name: value})
+        else:
+            self._extra[name] = value
+
+    def __delitem__(self, name):
+        if name in self.field_set:
+            try:
+                object.__delattr__(self, name)
+            except AttributeError:
+                raise KeyError(name)
+        elif self._extra is not None:
+            del self._extra[name]
+        else:
+            raise KeyError(name)
 
     def __contains__(self, key):
-        if key in self.contract_attributes:
-            return True
-        return super(Resource, self).__contains__(key)
+        return key in self.field_set or \
+            (self._extra is not None and key in self._extra)
+
+    def __iter__(self):
+        return self.copy().iterkeys()
+
+    def __len__(self):
+        return len(self.copy())
+
+    #
+    # dict methods (the collections ABCs would add a __dict__ per instance)
+    #
+    def iterkeys(self):
+        return self.copy().iterkeys()
+
+    def itervalues(self):
+        return self.copy().itervalues()
+
+    def iteritems(self):
+        return self.copy().iteritems()
+
+    def keys(self):
+        return self.copy().keys()
+
+    def values(self):
+        return self.copy().values()
+
+    def items(self):
+        return self.copy().items()
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def setdefault(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            self[name] = default
+            return default
+
+    def pop(self, name, *default):
+        try:
+            value = self[name]
+            del self[name]
+            return value
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+
+    def update(self, *args, **kw):
+        for other in args + (kw,):
+            if hasattr(other, 'keys'):
+                for name in other.keys():
+                    self[name] = other[name]
+            else:
+                for (name, value) in other:
+                    self[name] = value
+
+    def clear(self):
+        for name in self.keys():
+            del self[name]
+
+    def copy(self):
+        """ Returns the attributes set as a dict: the fields that were set,
+        and the other attributes """
+        result = {}
+        get = object.__getattribute__
+        for name in self.fields:
+            try:
+                result[name] = get(self, name)
+            except AttributeError:
+                pass
+        if self._extra is not None:
+            result.update(self._extra)
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.copy() == dict(other.items())
+
+    def __ne__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return not self == other
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return self.copy()
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_extra', None)
+        for name, value in state.iteritems():
+            self[name] = value
+
+    def __repr__(self):
+        return repr(self.copy())
 
     #
     # Validation calls
@@ -278,9 +427,9 @@ class Resource(dict):
             if 'tags' in hints:
                 tags = hints['tags']
 
-        dom = self.to_dom(tags=tags)
-        Resource.write_dict_to_xml(self, dom, tags=tags)
-        return etree.tostring(dom)
+        writer = XMLWriter()
+        self.write_xml(writer, tags=tags)
+        return writer.getvalue()
 
     def to_dom(self, xmlns=None, tags=None):
         """ Serializes object to XML objec
@@ -289,14 +438,44 @@ class Resource(dict):
         :param tags: accepts a list of attribute names that should go into XML
         tags instead of attributes
         """
+        writer = XMLWriter()
+        self.write_xml(writer, xmlns=xmlns, tags=tags)
+        return etree.fromstring(writer.getvalue())
+
+    def write_xml(self, writer, xmlns=None, tags=None):
+        """ Writes object as XML with an XMLWriter, as to_dom() would build
+        it
+        :param xmlns: accepts an optional namespace for XML
+        :param tags: accepts a list of attribute names that should go into XML
+        tags instead of attributes
+        """
+        writer.start(self.__class__.__name__.lower())
+        if xmlns:
+            writer.attribute("xmlns", xmlns)
+        Resource.write_dict_to_writer(self, writer, tags)
+        writer.end()
+
+    @staticmethod
+    def write_dict_to_writer(dict_object, writer, tags=None):
+        """ Writes the attributes, then the elements, that
+        write_dict_to_xml() would add for a dict to an empty element """
         if tags is None:
             tags = []
-        if xmlns:
-            dom = etree.Element(self.__class__.__name__.lower(), xmlns=xmlns)
-        else:
-            dom = etree.Element(self.__class__.__name__.lower())
-        Resource.write_dict_to_xml(self, dom, tags)
-        return dom
+        items = dict_object.items()
+        for name, value in items:
+            if isinstance(value, dict) or name in tags or value is None:
+                continue
+            elif isinstance(value, bool):
+                writer.attribute(name, str(value).lower())
+            else:
+                writer.attribute(name, str(value))
+        for name, value in items:
+            if isinstance(value, dict):
+                writer.start(name)
+                Resource.write_dict_to_writer(value, writer)
+                writer.end()
+            elif name in tags:
+                writer.element(name, text=str(value))
 
     @classmethod
     def from_json(cls, json_str, hints=None):
@@ -387,8 +566,13 @@ class Resource(dict):
         return cls(*args, **kw)
 
 
+MutableMapping.register(Resource)
+
+
 class Service(Resource):
     """ Service model """
+    fields = ('id', 'type', 'name', 'description')
+
     def __init__(self, id=None, type=None, name=None, description=None,
                  *args, **kw):
         super(Service, self).__init__(id=id, type=type, name=name,
@@ -405,6 +589,8 @@ class Service(Resource):
 
 class Tenant(Resource):
     """ Tenant model """
+    fields = ('id', 'name', 'description', 'enabled')
+
     # pylint: disable=E0203,C0103
     def __init__(self, id=None, name=None, description=None, enabled=None,
                  *args, **kw):
@@ -425,13 +611,13 @@ class Tenant(Resource):
             hints['tags'] = ["description"]
         return super(Tenant, cls).from_xml(xml_str, hints=hints)
 
-    def to_dom(self, xmlns=None, tags=None):
+    def write_xml(self, writer, xmlns=None, tags=None):
         if tags is None:
             tags = ["description"]
         if xmlns is None:
             xmlns = "http://docs.openstack.org/identity/api/v2.0"
 
-        return super(Tenant, self).to_dom(xmlns=xmlns, tags=tags)
+        super(Tenant, self).write_xml(writer, xmlns=xmlns, tags=tags)
 
     def to_xml(self, hints=None):
         if hints is None:
@@ -454,6 +640,8 @@ class User(Resource):
         disabled by configuration. When enabled, any authentication call
         without a tenant gets authenticated to this tenant.
     """
+    fields = ('id', 'password', 'name', 'tenant_id', 'email', 'enabled')
+
     # pylint: disable=R0913
     def __init__(self, id=None, password=None, name=None,
                  tenant_id=None,
@@ -466,6 +654,10 @@ class User(Resource):
 
 class EndpointTemplate(Resource):
     """ EndpointTemplate model """
+    fields = ('id', 'region', 'name', 'type', 'public_url', 'admin_url',
+              'internal_url', 'enabled', 'is_global', 'version_id',
+              'version_list', 'version_info')
+
     # pylint: disable=R0913
     def __init__(self, id=None, region=None, name=None, type=None,
                  public_url=None, admin_url=None,
@@ -482,6 +674,10 @@ class EndpointTemplate(Resource):
 
 class Endpoint(Resource):
     """ Endpoint model """
+    fields = ('id', 'tenant_id', 'region', 'name', 'type', 'public_url',
+              'admin_url', 'internal_url', 'version_id', 'version_list',
+              'version_info')
+
     # pylint: disable=R0913
     def __init__(self, id=None, tenant_id=None, region=None, name=None,
                  type=None, public_url=None, admin_url=None,
@@ -498,6 +694,8 @@ class Endpoint(Resource):
 
 class Role(Resource):
     """ Role model """
+    fields = ('id', 'name', 'description', 'service_id', 'tenant_id')
+
     def __init__(self, id=None, name=None, description=None, service_id=None,
                  tenant_id=None, *args, **kw):
         super(Role, self).__init__(id=id, name=name, description=description,
@@ -507,14 +705,29 @@ class Role(Resource):
 
 class Token(Resource):
     """ Token model """
+    fields = ('id', 'user_id', 'expires', 'tenant_id')
+
     def __init__(self, id=None, user_id=None, expires=None, tenant_id=None,
             *args, **kw):
         super(Token, self).__init__(id=id, user_id=user_id, expires=expires,
                                     tenant_id=tenant_id, *args, **kw)
 
 
+class Revocation(Resource):
+    """ Revocation event model """
+    fields = ('id', 'token_id', 'user_id', 'tenant_id', 'created')
+
+    def __init__(self, id=None, token_id=None, user_id=None, tenant_id=None,
+            created=None, *args, **kw):
+        super(Revocation, self).__init__(id=id, token_id=token_id,
+                                         user_id=user_id, tenant_id=tenant_id,
+                                         created=created, *args, **kw)
+
+
 class UserRoleAssociation(Resource):
     """ Role Grant model """
+    fields = ('user_id', 'role_id', 'tenant_id')
+
     def __init__(self, user_id=None, role_id=None, tenant_id=None,
                  *args, **kw):
         super(UserRoleAssociation, self).__init__(user_id=user_id,
@@ -523,6 +736,8 @@ class UserRoleAssociation(Resource):
 
 
 class Credentials(Resource):
+    fields = ('id', 'user_id', 'tenant_id', 'type', 'key', 'secret')
+
     # pylint: disable=R0913
     def __init__(self, id=None, user_id=None, tenant_id=None, type=None,
             key=None, secret=None, *args, **kw):
@@ -54,6 +54,9 @@ class AdminApi(wsgi.Router):
                         controller=auth_controller,
                         action="endpoints",
                         conditions=dict(method=["GET"]))
+        mapper.connect("/certificates/signing", controller=auth_controller,
+                        action="get_signing_certificate",
+                        conditions=dict(method=["GET"]))
 
         # Tenant Operations
         tenant_controller = TenantController(options)
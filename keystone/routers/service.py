@@ -40,6 +40,9 @@ class ServiceApi(wsgi.Router):
         mapper.connect("/ec2tokens", controller=auth_controller,
                        action="authenticate_ec2",
                        conditions=dict(method=["POST"]))
+        mapper.connect("/certificates/signing", controller=auth_controller,
+                       action="get_signing_certificate",
+                       conditions=dict(method=["GET"]))
         tenant_controller = TenantController(options, True)
         mapper.connect("/tenants",
                         controller=tenant_controller,
@@ -161,6 +161,9 @@ class Server():
 
         self.key = "%s-%s:%s" % (self.name, host, port)
 
+        # Number of worker processes to fork (0 serves from this process)
+        workers = int(self.options.get('workers') or conf.get('workers', 0))
+
         # Safely get SSL options
         service_ssl = conf.get('service_ssl', False)
         service_ssl = service_ssl in [True, "True", "1"]
@@ -173,14 +176,14 @@ class Server():
             keyfile = conf.get('keyfile')
             ca_certs = conf.get('ca_certs')
 
-            self.server = wsgi.SslServer()
+            self.server = wsgi.SslServer(workers=workers)
             self.server.start(app, port, host,
                          certfile=certfile, keyfile=keyfile,
                          ca_certs=ca_certs,
                          cert_required=cert_required,
                          key=self.key)
         else:
-            self.server = wsgi.Server()
+            self.server = wsgi.Server(workers=workers)
             self.server.start(app, port, host,
                               key="%s-%s:%s" % (self.config, host, port))
 
@@ -191,6 +194,22 @@ class Server():
         if wait:
             self.server.wait()
 
+    def wait(self, *others):
+        """Waits (blocks) for the server, and any others started with
+        wait=False, to terminate
+
+        If the servers were configured with workers, one set of worker
+        processes is forked to serve them all.
+        """
+        servers = [s.server for s in (self,) + others
+                   if s.server is not None]
+        forking = [s for s in servers if s.workers]
+        if forking:
+            wsgi.Workers(forking, max(s.workers for s in forking)).run()
+        for server in servers:
+            if not server.workers:
+                server.wait()
+
     def stop(self):
         """Stops the Keystone server
 
@@ -260,6 +260,16 @@ class ApiTestCase(RestfulTestCase):
         return self.admin_request(method='HEAD',
             path='/tokens/%s?belongsTo=%s' % (token_id, tenant_id), **kwargs)
 
+    def post_tokens_validate(self, **kwargs):
+        """POST /tokens/validate"""
+        return self.admin_request(method='POST',
+            path='/tokens/validate', **kwargs)
+
+    def get_revocations(self, since=0, **kwargs):
+        """GET /OS-KSADM/revocations?since={since}"""
+        return self.admin_request(method='GET',
+            path='/OS-KSADM/revocations?since=%s' % (since,), **kwargs)
+
     def delete_token(self, token_id, **kwargs):
         """DELETE /tokens/{token_id}"""
         return self.admin_request(method='DELETE',
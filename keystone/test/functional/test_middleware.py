@@ -1,5 +1,7 @@
 import unittest2 as unittest
 
+from webob import Request
+
 import keystone.common.exception
 from keystone.test.functional import common
 
@@ -18,6 +20,74 @@ class TestAuthTokenMiddleware(common.MiddlewareTestCase):
         super(TestAuthTokenMiddleware, self).setUp(auth_token)
 
 
+class TestAuthTokenMiddlewareTokenCache(common.MiddlewareTestCase):
+    """
+    Tests for Keystone WSGI middleware: Auth Token with in-process cache
+    """
+
+    def setUp(self):
+        super(TestAuthTokenMiddlewareTokenCache, self).setUp(auth_token)
+        # Rebuild the middleware now that we have a valid admin token
+        settings = {'delay_auth_decision': '0',
+                'auth_host': '127.0.0.1',
+                'auth_port': '35357',
+                'auth_protocol': 'http',
+                'auth_uri': 'http://localhost:35357/',
+                'admin_token': self.admin_token,
+                'token_cache_size': '10'}
+        cert_file = common.isSsl()
+        if cert_file:
+            settings['auth_protocol'] = 'https'
+            settings['certfile'] = cert_file
+            settings['auth_uri'] = 'https://localhost:35357/'
+        self.test_middleware = \
+            auth_token.filter_factory(settings)(common.HeaderApp())
+
+    def test_token_cache_hit(self):
+        for _i in range(2):
+            resp = Request.blank('/',
+                headers={'X-Auth-Token': self.user_token}) \
+                .get_response(self.test_middleware)
+            self.assertEquals(resp.status_int, 200)
+        stats = self.test_middleware.token_cache.stats()
+        self.assertEquals(stats['size'], 1)
+        self.assertEquals(stats['hits'], 1)
+
+    def test_refresh_token_cache(self):
+        def status():
+            return Request.blank('/',
+                headers={'X-Auth-Token': self.user_token}) \
+                .get_response(self.test_middleware).status_int
+
+        self.assertEquals(status(), 200)
+        self.assertEquals(self.test_middleware.refresh_token_cache(), 1)
+        self.assertEquals(status(), 200)
+
+        # the cached validation outlives the token until the next refresh
+        self.remove_token(self.user_token)
+        self.assertEquals(status(), 200)
+        self.assertEquals(self.test_middleware.refresh_token_cache(), 1)
+        self.assertEquals(status(), 401)
+        self.assertEquals(self.test_middleware.refresh_token_cache(), 0)
+
+    def test_poll_revocations(self):
+        def status():
+            return Request.blank('/',
+                headers={'X-Auth-Token': self.user_token}) \
+                .get_response(self.test_middleware).status_int
+
+        # catch up with the revocations recorded by other tests
+        self.test_middleware.poll_revocations()
+        self.assertEquals(status(), 200)
+        self.assertEquals(self.test_middleware.poll_revocations(), 0)
+
+        self.disable_user(self.user['id'])
+        self.assertEquals(status(), 200)
+        self.assertEquals(self.test_middleware.poll_revocations(), 1)
+        self.assertEquals(self.test_middleware.token_cache.stats()['size'], 0)
+        self.assertEquals(status(), 401)
+
+
 #
 #   Glance
 #
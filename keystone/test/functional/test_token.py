@@ -90,6 +90,106 @@ class ValidateToken(common.FunctionalTestCase):
             'Accept': 'application/xml'})
 
 
+class ValidateTokens(common.FunctionalTestCase):
+    def setUp(self, *args, **kwargs):
+        super(ValidateTokens, self).setUp(*args, **kwargs)
+
+        self.tenant = self.create_tenant().json['tenant']
+        self.user = self.create_user_with_known_password(
+            tenant_id=self.tenant['id']).json['user']
+        self.role = self.create_role().json['role']
+        self.grant_role_to_user(self.user['id'], self.role['id'],
+            self.tenant['id'])
+        self.token = self.authenticate(self.user['name'],
+            self.user['password'], self.tenant['id']).json['access']['token']
+        self.missing = common.unique_str()
+
+    def test_validate_tokens(self):
+        r = self.post_tokens_validate(as_json={"tokens": [
+            {"id": self.token['id'], "belongsTo": self.tenant['id']},
+            {"id": self.missing},
+            {"id": self.token['id'], "belongsTo": common.unique_str()}]})
+
+        (valid, missing, elsewhere) = r.json['tokens']
+        self.assertEqual(valid['id'], self.token['id'])
+        self.assertEqual(valid['access']['user']['id'], self.user['id'])
+        self.assertEqual(valid['access']['user']['roles'][0]['id'],
+            self.role['id'])
+        self.assertEqual(valid['access'],
+            self.get_token_belongsto(self.token['id'],
+                self.tenant['id']).json['access'])
+        self.assertEqual(missing['id'], self.missing)
+        self.assertEqual(missing['itemNotFound']['code'], '404')
+        self.assertEqual(elsewhere['unauthorized']['code'], '401')
+
+    def test_validate_tokens_xml(self):
+        r = self.post_tokens_validate(as_xml='<tokens xmlns="%s">'
+            '<token id="%s"/><token id="%s"/></tokens>' % (self.xmlns,
+                self.token['id'], self.missing),
+            headers={'Content-Type': 'application/xml',
+                     'Accept': 'application/xml'})
+
+        self.assertEqual(r.xml.tag, '{%s}tokens' % self.xmlns)
+        (valid, missing) = r.xml.findall('{%s}token' % self.xmlns)
+        self.assertEqual(valid.get('id'), self.token['id'])
+        user = valid.find('{%s}access/{%s}user' % (self.xmlns, self.xmlns))
+        self.assertEqual(user.get('id'), self.user['id'])
+        self.assertIsNotNone(missing.find('{%s}itemNotFound' % self.xmlns))
+
+    def test_validate_tokens_using_disabled_token(self):
+        self.admin_token = self.disabled_admin_token
+        self.post_tokens_validate(as_json={"tokens": []}, assert_status=403)
+
+    def test_validate_tokens_bad_request(self):
+        self.post_tokens_validate(as_json={"token": []}, assert_status=400)
+
+
+class TokenRevocations(common.FunctionalTestCase):
+    def setUp(self, *args, **kwargs):
+        super(TokenRevocations, self).setUp(*args, **kwargs)
+        self.tenant = self.create_tenant().json['tenant']
+        self.user = self.create_user_with_known_password(
+            tenant_id=self.tenant['id']).json['user']
+        self.token = self.authenticate(self.user['name'],
+            self.user['password'], self.tenant['id']).json['access']['token']
+
+        # skip the revocations recorded by other tests
+        self.since = 0
+        revocations = self.get_revocations().json['revocations']
+        while revocations:
+            self.since = revocations[-1]['id']
+            revocations = self.get_revocations(
+                self.since).json['revocations']
+
+    def test_revoke_token(self):
+        self.remove_token(self.token['id'])
+        (revocation,) = self.get_revocations(self.since).json['revocations']
+        self.assertGreater(revocation['id'], self.since)
+        self.assertEqual(revocation['tokenId'], self.token['id'])
+        self.assertNotIn('userId', revocation)
+        self.assertEqual(
+            self.get_revocations(revocation['id']).json['revocations'], [])
+
+    def test_disable_user(self):
+        self.disable_user(self.user['id'])
+        (revocation,) = self.get_revocations(self.since).json['revocations']
+        self.assertEqual(revocation['userId'], self.user['id'])
+
+    def test_revocations_xml(self):
+        self.remove_token(self.token['id'])
+        r = self.get_revocations(self.since, assert_status=200, headers={
+            'Accept': 'application/xml'})
+        (revocation,) = r.xml.findall('{%s}revocation' % self.xmlns_ksadm)
+        self.assertEqual(revocation.get('tokenId'), self.token['id'])
+
+    def test_revocations_using_disabled_token(self):
+        self.admin_token = self.disabled_admin_token
+        self.get_revocations(assert_status=403)
+
+    def test_revocations_bad_request(self):
+        self.get_revocations('latest', assert_status=400)
+
+
 class CheckToken(common.FunctionalTestCase):
     def setUp(self, *args, **kwargs):
         super(CheckToken, self).setUp(*args, **kwargs)